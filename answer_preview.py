@@ -0,0 +1,135 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from columnar import head_rows, numeric_summary, result_len
+from tokens import count_tokens
+from tracing import current_span, traced
+
+# Cevap prompt'una giden sonuç önizlemesi. Sabit "ilk 10 satır" yerine:
+# - bytea/resim kolonları (picture, photo) atılır, uzun metinler (notes, description) kısaltılır
+# - satır sayısı token bütçesine sığana kadar azaltılır (tiktoken, yoksa len/4)
+# - gösterilmeyen satırlar için tüm sonuç üzerinden satır sayısı ve sayısal özet eklenir
+
+# Değerine bakmadan atılan kolonlar (Northwind: categories.picture, employees.photo)
+BINARY_COLUMNS = {"picture", "photo", "photo_path", "image", "thumbnail"}
+# Her zaman kısaltılan serbest metin kolonları
+LONG_TEXT_COLUMNS = {"notes", "description", "comment", "comments"}
+
+
+def get_answer_preview_token_budget() -> int:
+    """
+    Önizleme + özet için token bütçesi (ANSWER_PREVIEW_TOKEN_BUDGET, varsayılan 800; 0 = sınırsız).
+    """
+    try:
+        return int(os.getenv("ANSWER_PREVIEW_TOKEN_BUDGET", "800"))
+    except ValueError:
+        return 800
+
+
+def get_preview_text_max_chars() -> int:
+    try:
+        return int(os.getenv("PREVIEW_TEXT_MAX_CHARS", "60"))
+    except ValueError:
+        return 60
+
+
+@dataclass
+class AnswerPreview:
+    text: str                 # prompt'a giden tablo
+    summary: str              # tüm sonuç üzerinden satır sayısı + sayısal özet (boş olabilir)
+    rows_shown: int
+    total_rows: int
+    tokens: int
+    dropped_columns: List[str] = field(default_factory=list)
+
+
+def _is_binary(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview))
+
+
+def _shorten(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars - 1].rstrip() + "…"
+    return value
+
+
+def _render(columns: Sequence[str], rows: Sequence[Tuple[Any, ...]]) -> str:
+    try:
+        from tabulate import tabulate
+        return tabulate(rows, headers=list(columns), tablefmt="github")
+    except Exception:
+        lines = [" | ".join(columns)]
+        lines.extend(" | ".join(str(x) for x in r) for r in rows)
+        return "\n".join(lines)
+
+
+def format_numeric_summary(columns: Sequence[str], rows: Any) -> str:
+    """
+    Tüm satırlar üzerinden sayısal kolon özeti (toplam, min, maks, ortalama, en yüksek 3).
+    """
+    try:
+        summary = numeric_summary(columns, rows)
+    except Exception:
+        return ""
+    lines = []
+    for col, s in summary.items():
+        line = f"- {col}: toplam={s['sum']:.2f}, min={s['min']}, maks={s['max']}, ortalama={s['mean']:.2f}"
+        if s.get("top"):
+            line += "; en yüksek: " + ", ".join(f"{label} ({value})" for label, value in s["top"])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+@traced("answer_preview")
+def build_answer_preview(columns: List[str], rows: Any, max_rows: int = 10, budget: Optional[int] = None,
+                         text_max_chars: Optional[int] = None) -> AnswerPreview:
+    """
+    Cevap prompt'u için önizleme tablosu ve özet üretir.
+    Satırlar ilk max_rows'tan başlayarak bütçeye sığana kadar azaltılır (en az 1 satır kalır).
+    Özet yalnızca gösterilmeyen satır varsa eklenir ve bütçeye dahildir.
+    """
+    budget = get_answer_preview_token_budget() if budget is None else budget
+    text_max_chars = text_max_chars or get_preview_text_max_chars()
+    total = result_len(rows)
+    if total == 0:
+        return AnswerPreview(text="(sonuç yok)", summary="", rows_shown=0, total_rows=0, tokens=0)
+
+    head = head_rows(rows, max_rows)
+    keep = [i for i, c in enumerate(columns)
+            if str(c).lower() not in BINARY_COLUMNS and not any(_is_binary(r[i]) for r in head)]
+    dropped = [str(columns[i]) for i in range(len(columns)) if i not in keep]
+    kept_columns = [columns[i] for i in keep]
+    long_text = {j for j, i in enumerate(keep) if str(columns[i]).lower() in LONG_TEXT_COLUMNS}
+    cleaned = [
+        tuple(_shorten(r[i], max(8, text_max_chars // 2) if j in long_text else text_max_chars)
+              for j, i in enumerate(keep))
+        for r in head
+    ]
+
+    note = f"\n(atlanan kolonlar: {', '.join(dropped)})" if dropped else ""
+    shown = len(cleaned)
+    text = _render(kept_columns, cleaned) + note
+    numeric_lines: Optional[str] = None
+
+    def _summary() -> str:
+        # Sayısal özet tüm sonuç üzerinden bir kez hesaplanır; yalnızca gizli satır varsa eklenir
+        nonlocal numeric_lines
+        if shown >= total:
+            return ""
+        if numeric_lines is None:
+            numeric_lines = format_numeric_summary(columns, rows)
+        header = f"- satır sayısı: {total} (önizlemede {shown})"
+        return f"{header}\n{numeric_lines}" if numeric_lines else header
+
+    summary = _summary()
+    if budget > 0:
+        while shown > 1 and count_tokens(text) + count_tokens(summary) > budget:
+            shown -= 1
+            text = _render(kept_columns, cleaned[:shown]) + note
+            summary = _summary()
+
+    tokens = count_tokens(text) + count_tokens(summary)
+    current_span().update(rows_shown=shown, total_rows=total, preview_tokens=tokens, dropped_columns=len(dropped))
+    return AnswerPreview(text=text, summary=summary, rows_shown=shown, total_rows=total, tokens=tokens,
+                         dropped_columns=dropped)
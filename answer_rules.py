@@ -0,0 +1,278 @@
+import re
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from columnar import head_rows, result_len
+from fuzzy_index import normalize_name
+from tracing import current_span
+
+# LLM'e ikinci kez gitmeden cevaplanabilen soru/sonuç kalıpları.
+# Her kural soru kalıbı (ASCII'ye indirilmiş soru üzerinde regex) + sonuç şekli ile eşleşir ve
+# Türkçe cevabı şablondan üretir. Kayıt sırası önceliktir; ilk eşleşen kural kazanır.
+
+# Sonuç şekilleri
+EMPTY = "empty"              # satır yok
+COUNT = "count"              # tek hücre, kolon adı count/sayı/adet
+SCALAR = "scalar"            # tek satır, tek kolon
+SINGLE_ROW = "single_row"    # tek satır, birden çok kolon
+NAME_VALUE_LIST = "name_value_list"  # iki kolon: metin + sayı
+ROWS = "rows"                # diğer çok satırlı sonuçlar
+
+# Cevapta listelenecek azami satır (önizleme ile aynı)
+MAX_LIST_ROWS = 10
+
+_COUNT_COLUMN_RE = re.compile(r"^(count|.*_count|count_.*|sayi|adet|toplam_sayi|.*_sayisi)$")
+_NAME_COLUMNS = ("product_name", "company_name", "category_name", "contact_name", "name", "ship_name")
+_PRICE_COLUMNS = ("unit_price", "price", "fiyat")
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+# "kaç" sorusu sayım değil ölçü soruyorsa (kaç lira, kaç günde, kaç yaşında) sayım kuralı uygulanmaz
+_NON_COUNT_RE = re.compile(
+    r"\bortalama\b|\bkac\s+(?:lira|tl|para|kurus|dolar|euro|gun|hafta|ay|yil|saat|dakika|saniye|yas|"
+    r"kilo|kg|gram|litre|metre|yuzde|derece)(?:de|da|te|ta|dir|dur|lik|luk|inda|unda)?\b"
+)
+# Sayım kolonu yoksa soru "kaç <isim> var" kalıbında olmalı ("kaç farklı müşteri var" dahil)
+_KAC_VAR_RE = re.compile(r"\bkac\s+\w+(?:\s+\w+)?\s+var\b")
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def is_integral(value: Any) -> bool:
+    # count(*) int döner; tamsayı kolon toplamları Decimal olabilir (ondalıksız olmalı)
+    if isinstance(value, Decimal):
+        return value.is_finite() and value == value.to_integral_value()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def format_number(value: Any) -> str:
+    """
+    Türkçe sayı biçimi: binlik ayraç nokta, ondalık ayraç virgül (1234567.5 -> 1.234.567,50).
+    Tamsayılar ondalıksız yazılır; sayı olmayan değerler olduğu gibi döner.
+    """
+    if not is_number(value):
+        return str(value)
+    if isinstance(value, int):
+        text = f"{value:,}"
+    else:
+        text = f"{float(value):,.2f}"
+    return text.replace(",", "\x00").replace(".", ",").replace("\x00", ".")
+
+
+def result_shape(columns: Sequence[str], rows: Sequence[Tuple[Any, ...]]) -> str:
+    if not rows:
+        return EMPTY
+    if len(rows) == 1 and len(columns) == 1:
+        return COUNT if _COUNT_COLUMN_RE.match(str(columns[0]).lower()) and is_number(rows[0][0]) else SCALAR
+    if len(rows) == 1:
+        return SINGLE_ROW
+    if len(columns) == 2 and not is_number(rows[0][0]) and is_number(rows[0][1]):
+        return NAME_VALUE_LIST
+    return ROWS
+
+
+def _column_index(columns: Sequence[str], names: Sequence[str]) -> Optional[int]:
+    lowered = [str(c).lower() for c in columns]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    return None
+
+
+@dataclass
+class AnswerContext:
+    question: str          # kullanıcının sorusu (orijinal)
+    normalized: str        # ASCII'ye indirilmiş soru ("kaç ürün" -> "kac urun")
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]  # en fazla MAX_LIST_ROWS satır
+    total_rows: int
+    shape: str
+
+
+@dataclass
+class AnswerRule:
+    """
+    pattern: normalize edilmiş soruda aranan regex (None = her soru)
+    shapes: kuralın kabul ettiği sonuç şekilleri
+    render: cevap metni ya da None (kural yine de uygulanamıyorsa)
+    """
+    name: str
+    pattern: Optional["re.Pattern[str]"]
+    shapes: Tuple[str, ...]
+    render: Callable[[AnswerContext], Optional[str]]
+
+    def matches(self, ctx: AnswerContext) -> bool:
+        if ctx.shape not in self.shapes:
+            return False
+        return self.pattern is None or bool(self.pattern.search(ctx.normalized))
+
+
+class AnswerRuleRegistry:
+    """
+    Kural listesi + kapsama sayaçları (kaç sorunun LLM'e gitmeden cevaplandığı).
+    """
+
+    def __init__(self):
+        self.rules: List[AnswerRule] = []
+        self.attempts = 0
+        self.hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, pattern: Optional[str], shapes: Sequence[str]):
+        """
+        Dekoratör: @registry.register("stok", r"\\bstok", (SCALAR, SINGLE_ROW))
+        """
+        def _decorator(render: Callable[[AnswerContext], Optional[str]]):
+            compiled = re.compile(pattern) if pattern else None
+            self.rules.append(AnswerRule(name, compiled, tuple(shapes), render))
+            return render
+        return _decorator
+
+    def answer(self, question: str, columns: List[str], rows: Any) -> Optional[str]:
+        """
+        İlk eşleşen kuralın cevabını döndürür; hiçbiri uymazsa None (LLM ile cevaplanır).
+        """
+        head = head_rows(rows, MAX_LIST_ROWS)
+        ctx = AnswerContext(
+            question=question,
+            normalized=normalize_name(question),
+            columns=[str(c) for c in (columns or [])],
+            rows=head,
+            total_rows=result_len(rows),
+            shape=result_shape(columns or [], head),
+        )
+        rule_name = None
+        text = None
+        for rule in self.rules:
+            if not rule.matches(ctx):
+                continue
+            try:
+                text = rule.render(ctx)
+            except Exception:
+                text = None
+            if text is not None:
+                rule_name = rule.name
+                break
+        with self._lock:
+            self.attempts += 1
+            if rule_name is not None:
+                self.hits[rule_name] = self.hits.get(rule_name, 0) + 1
+        current_span().update(answer_rule=rule_name, result_shape=ctx.shape)
+        return text
+
+    def coverage(self) -> float:
+        with self._lock:
+            return sum(self.hits.values()) / self.attempts if self.attempts else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "attempts": self.attempts,
+                "hits": hits,
+                "coverage": round(hits / self.attempts, 3) if self.attempts else 0.0,
+                "by_rule": dict(self.hits),
+            }
+
+
+_registry = AnswerRuleRegistry()
+
+
+def get_answer_rules() -> AnswerRuleRegistry:
+    return _registry
+
+
+def answer_with_rules(question: str, columns: List[str], rows: Any) -> Optional[str]:
+    return _registry.answer(question, columns, rows)
+
+
+def _list_lines(ctx: AnswerContext, name_idx: int, value_idx: Optional[int], value_label: str = "",
+                sep: str = " — ") -> List[str]:
+    lines = []
+    for r in ctx.rows:
+        if value_idx is None:
+            lines.append(f"- {r[name_idx]}")
+        else:
+            lines.append(f"- {r[name_idx]}{sep}{value_label}{format_number(r[value_idx])}")
+    if ctx.total_rows > len(ctx.rows):
+        lines.append(f"(toplam {format_number(ctx.total_rows)} kayıttan ilk {len(ctx.rows)} tanesi)")
+    return lines
+
+
+# --- Kurallar (kayıt sırası = öncelik) ---
+
+@_registry.register("stock", r"\bstok", (EMPTY, SCALAR, SINGLE_ROW, NAME_VALUE_LIST))
+def _stock(ctx: AnswerContext) -> Optional[str]:
+    stock_idx = _column_index(ctx.columns, ("units_in_stock",))
+    if stock_idx is None:
+        return None
+    if ctx.shape == EMPTY:
+        return "Bu ürüne ait stok bulunamadı."
+    name_idx = _column_index(ctx.columns, _NAME_COLUMNS)
+    if ctx.shape == SCALAR:
+        return f"Stokta {format_number(ctx.rows[0][0])} adet var."
+    if ctx.shape == SINGLE_ROW:
+        row = ctx.rows[0]
+        if name_idx is None:
+            return f"Stokta {format_number(row[stock_idx])} adet var."
+        return f"{row[name_idx]} ürününden stokta {format_number(row[stock_idx])} adet var."
+    if name_idx is None:
+        return None
+    return "Stok durumu:\n" + "\n".join(_list_lines(ctx, name_idx, stock_idx, sep=": "))
+
+
+@_registry.register("price", r"\bfiyat", (SCALAR, SINGLE_ROW))
+def _price(ctx: AnswerContext) -> Optional[str]:
+    price_idx = _column_index(ctx.columns, _PRICE_COLUMNS)
+    if price_idx is None:
+        return None
+    row = ctx.rows[0]
+    name_idx = _column_index(ctx.columns, _NAME_COLUMNS)
+    if name_idx is None or ctx.shape == SCALAR:
+        return f"Fiyatı {format_number(row[price_idx])}."
+    return f"{row[name_idx]} ürününün fiyatı {format_number(row[price_idx])}."
+
+
+@_registry.register("random_products", r"\brastgele\b.*\burun", (SINGLE_ROW, NAME_VALUE_LIST, ROWS, SCALAR))
+def _random_products(ctx: AnswerContext) -> Optional[str]:
+    name_idx = _column_index(ctx.columns, ("product_name", "name"))
+    if name_idx is None:
+        return None
+    price_idx = _column_index(ctx.columns, _PRICE_COLUMNS)
+    return "Rastgele seçilen ürünler:\n" + "\n".join(_list_lines(ctx, name_idx, price_idx, "Fiyat: "))
+
+
+@_registry.register("count", r"\bkac\b|\bsayisi\b|\badedi\b", (COUNT, SCALAR))
+def _count(ctx: AnswerContext) -> Optional[str]:
+    value = ctx.rows[0][0]
+    if not is_integral(value) or _NON_COUNT_RE.search(ctx.normalized):
+        return None
+    if ctx.shape != COUNT and not _KAC_VAR_RE.search(ctx.normalized):
+        return None
+    value = int(value)
+    # "kaç müşteri var" -> "Toplam 91 müşteri var."; isim bulunamazsa genel kalıp
+    m = re.search(r"\bkaç\s+(\w+)", ctx.question.translate(_TR_LOWER).lower())
+    if m and m.group(1) not in ("tane", "adet", "kişi", "farklı"):
+        return f"Toplam {format_number(value)} {m.group(1)} var."
+    return f"Toplam: {format_number(value)}."
+
+
+@_registry.register("ranking", r"\ben (cok|fazla|yuksek|az|dusuk|pahali|ucuz)\b|\bilk \d+\b|\btop \d+\b",
+                    (NAME_VALUE_LIST,))
+def _ranking(ctx: AnswerContext) -> Optional[str]:
+    lines = [f"{i}. {r[0]} — {format_number(r[1])}" for i, r in enumerate(ctx.rows, start=1)]
+    if ctx.total_rows > len(ctx.rows):
+        lines.append(f"(toplam {format_number(ctx.total_rows)} kayıttan ilk {len(ctx.rows)} tanesi)")
+    return "\n".join(lines)
+
+
+@_registry.register("aggregate", r"\b(toplam|ortalama|ortalamasi|en yuksek|en dusuk)\b", (SCALAR,))
+def _aggregate(ctx: AnswerContext) -> Optional[str]:
+    value = ctx.rows[0][0]
+    if not is_number(value):
+        return None
+    label = re.search(r"\b(toplam|ortalama|en yuksek|en dusuk)", ctx.normalized).group(1)
+    labels = {"toplam": "Toplam", "ortalama": "Ortalama", "en yuksek": "En yüksek değer", "en dusuk": "En düşük değer"}
+    return f"{labels[label]}: {format_number(value)}."
@@ -0,0 +1,305 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from answer_preview import build_answer_preview
+from cost_gate import gate_generated_sql_async
+from db import execute_select_async
+from fallback import build_combined_fallback_sql, split_combined_result
+from llm import build_sql_prompt, build_answer_prompt, ask_llm_async, astream_llm
+from fuzzy_index import get_fuzzy_index
+from pipeline import (
+    SIMILAR_PRODUCTS_SQL,
+    build_fallback_sqls,
+    deterministic_answer,
+    extract_search_terms,
+    is_cacheable_sql,
+    needs_product_fallback,
+    postprocess_generated_sql,
+    preview_rows,
+    similar_products_params,
+)
+from sql_cache import SqlCache
+from speculative import is_ambiguous_question, is_speculative_enabled, run_speculative_async, start_answer_prewarm
+from sql_templates import learn_template, run_template_async
+from tracing import span, traced
+
+# ask_llm_async ile aynı imza: (messages, temperature=..., mode=...) -> str
+AskFn = Callable[..., Awaitable[str]]
+# astream_llm ile aynı imza: (messages, temperature=...) -> token'ların async iterator'ı
+StreamFn = Callable[..., AsyncIterator[str]]
+
+
+async def generate_sql_async(context_rules: str, schema_text: str, question: str,
+                             ask: Optional[AskFn] = None,
+                             sql_cache: Optional[SqlCache] = None) -> Tuple[str, bool]:
+    """
+    Soru için SQL üretir. Dönüş: (sql, cache_hit)
+    """
+    if sql_cache is not None:
+        try:
+            cached_sql = await asyncio.to_thread(sql_cache.get, question, schema_text)
+        except Exception:
+            cached_sql = None
+        if cached_sql:
+            return cached_sql, True
+
+    ask = ask or ask_llm_async
+    sql_messages = build_sql_prompt(context_rules, schema_text, question)
+    sql_query = await ask(sql_messages, temperature=0.0, mode="sql")
+    return postprocess_generated_sql(sql_query, schema_text), False
+
+
+@traced("find_similar_products")
+async def find_similar_products_async(engine: AsyncEngine, search_term: str) -> List[str]:
+    index = get_fuzzy_index()
+    if index is not None:
+        return [name for name, _score in index.search(search_term, column="product_name", limit=10)]
+    try:
+        columns, rows = await execute_select_async(
+            engine, SIMILAR_PRODUCTS_SQL, timeout_seconds=5, params=similar_products_params(search_term)
+        )
+        return [row[0] for row in rows] if rows else []
+    except Exception:
+        return []
+
+
+async def _suggest_async(engine: AsyncEngine, question: str, sql_query: Optional[str] = None) -> List[str]:
+    for term in extract_search_terms(question, sql_query):
+        suggestions = await find_similar_products_async(engine, term)
+        if suggestions:
+            return suggestions
+    return []
+
+
+async def execute_with_fallbacks_async(engine: AsyncEngine, sql_query: str, question: str
+                                       ) -> Tuple[str, List[str], List[Tuple[Any, ...]], List[str]]:
+    """
+    SQL'i çalıştırır; boş ürün sorgularında fallback adaylarını tek birleşik sorguda dener,
+    benzer ürün önerilerini de eşzamanlı olarak toplar.
+    Dönüş: (çalışan_sql, kolonlar, satırlar, öneriler)
+    """
+    columns, rows = await execute_select_async(engine, sql_query)
+    if not needs_product_fallback(sql_query, rows):
+        return sql_query, columns, rows, []
+
+    attempts = build_fallback_sqls(sql_query)
+    suggestion_task = asyncio.create_task(_suggest_async(engine, question, sql_query))
+
+    if attempts:
+        with span("fallback", strategy="combined", candidates=len(attempts)) as sp:
+            winner = None
+            try:
+                combined = build_combined_fallback_sql([sql for _name, sql in attempts])
+                winner, columns2, rows2 = split_combined_result(*await execute_select_async(engine, combined))
+            except Exception as e:
+                sp.set("combined_error", str(e))
+                for i, (_name, retry_sql) in enumerate(attempts):
+                    try:
+                        columns2, rows2 = await execute_select_async(engine, retry_sql)
+                    except Exception:
+                        continue
+                    if rows2:
+                        winner = i
+                        break
+            sp.set("winner", attempts[winner][0] if winner is not None else None)
+        if winner is not None:
+            columns, rows, sql_query = columns2, rows2, attempts[winner][1]
+
+    if rows:
+        suggestion_task.cancel()
+        return sql_query, columns, rows, []
+    try:
+        suggestions = await suggestion_task
+    except Exception:
+        suggestions = []
+    return sql_query, columns, rows, suggestions
+
+
+async def _execute_stage_async(engine: AsyncEngine, context_rules: str, schema_text: str, question: str,
+                               ask: AskFn, sql_cache: Optional[SqlCache], timings: Dict[str, float],
+                               t0: float) -> Dict[str, Any]:
+    """
+    Şablon / cache / LLM ile SQL'i bulur ve çalıştırır (cevap adımından önceki her şey).
+    """
+    # Bilinen bir soru kalıbıysa şablon LLM'siz çalıştırılır
+    template_result = await run_template_async(engine, question, schema_text)
+    if template_result is not None:
+        sql_query, columns, rows = template_result
+        cache_hit = False
+        suggestions: List[str] = []
+        t2 = time.perf_counter()
+        timings["generate_ms"] = 0.0
+        timings["execute_ms"] = (t2 - t0) * 1000
+    else:
+        speculative = is_speculative_enabled() and is_ambiguous_question(question)
+        cached_sql = None
+        if speculative and sql_cache is not None:
+            try:
+                cached_sql = await asyncio.to_thread(sql_cache.get, question, schema_text)
+            except Exception:
+                cached_sql = None
+        if speculative and not cached_sql:
+            # Aday SQL'ler eşzamanlı üretilip çalıştırılır; üretim süresi execute_ms'e dahildir
+            cache_hit = False
+            t1 = time.perf_counter()
+            timings["generate_ms"] = 0.0
+            sql_query, columns, rows, suggestions = await run_speculative_async(
+                engine, context_rules, schema_text, question, ask=ask
+            )
+        else:
+            if cached_sql:
+                sql_query, cache_hit = cached_sql, True
+            else:
+                sql_query, cache_hit = await generate_sql_async(context_rules, schema_text, question, ask=ask,
+                                                                sql_cache=sql_cache)
+                if not cache_hit:
+                    # Pahalı plan: yeniden yazım ya da gerekçeyle yeniden üretim (COST_GATE_ENABLED)
+                    sql_query = await gate_generated_sql_async(engine, context_rules, schema_text, question,
+                                                               sql_query, ask or ask_llm_async)
+            t1 = time.perf_counter()
+            timings["generate_ms"] = (t1 - t0) * 1000
+
+            # Cevap adımı hazırlığı arka planda; beklenmez
+            start_answer_prewarm(schema_text, question, sql_query)
+            sql_query, columns, rows, suggestions = await execute_with_fallbacks_async(engine, sql_query, question)
+        t2 = time.perf_counter()
+        timings["execute_ms"] = (t2 - t1) * 1000
+
+        if not cache_hit and is_cacheable_sql(sql_query, rows):
+            if sql_cache is not None:
+                try:
+                    await asyncio.to_thread(sql_cache.put, question, schema_text, sql_query)
+                except Exception:
+                    pass
+            await asyncio.to_thread(learn_template, question, schema_text, sql_query)
+
+    return {
+        "sql": sql_query,
+        "cache_hit": cache_hit,
+        "template_hit": template_result is not None,
+        "columns": columns,
+        "rows": rows,
+        "suggestions": suggestions,
+    }
+
+
+def _answer_step(context_rules: str, schema_text: str, question: str, stage: Dict[str, Any],
+                 preview_limit: int) -> Tuple[Optional[str], Optional[List[Any]]]:
+    """
+    Kural tabanlı cevap varsa (cevap, None), yoksa (None, cevap_prompt'u) döndürür.
+    """
+    columns, rows = stage["columns"], stage["rows"]
+    final_answer = deterministic_answer(question, columns, rows)
+    if final_answer is not None:
+        return final_answer, None
+    # Prompt'a token bütçesine sığan önizleme + tüm sonuç üzerinden özet gider
+    prompt_preview = build_answer_preview(columns, rows, max_rows=preview_limit)
+    return None, build_answer_prompt(
+        context_rules=context_rules,
+        schema_text=schema_text,
+        sql_query=stage["sql"],
+        raw_rows_preview=prompt_preview.text,
+        columns=columns,
+        user_question=question,
+        numeric_summary=prompt_preview.summary,
+    )
+
+
+def _result_payload(question: str, stage: Dict[str, Any], preview_limit: int) -> Dict[str, Any]:
+    rows = stage["rows"]
+    return {
+        "question": question,
+        "sql": stage["sql"],
+        "cache_hit": stage["cache_hit"],
+        "template_hit": stage["template_hit"],
+        "columns": stage["columns"],
+        "row_count": len(rows),
+        "rows": [list(r) for r in rows[:preview_limit]],
+    }
+
+
+@traced("run_question")
+async def answer_question_async(engine: AsyncEngine, context_rules: str, schema_text: str, question: str,
+                                ask: Optional[AskFn] = None,
+                                sql_cache: Optional[SqlCache] = None,
+                                preview_limit: int = 10) -> Dict[str, Any]:
+    """
+    Üret -> çalıştır -> cevapla akışının asyncio sürümü. Her aşamanın süresi (ms) timings'te döner.
+    """
+    ask = ask or ask_llm_async
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    stage = await _execute_stage_async(engine, context_rules, schema_text, question, ask, sql_cache, timings, t0)
+    t2 = time.perf_counter()
+
+    final_answer, answer_messages = _answer_step(context_rules, schema_text, question, stage, preview_limit)
+    if answer_messages is not None:
+        try:
+            final_answer = await ask(answer_messages, temperature=0.1, mode="answer")
+        except Exception:
+            final_answer = None
+    t3 = time.perf_counter()
+    timings["answer_ms"] = (t3 - t2) * 1000
+    timings["total_ms"] = (t3 - t0) * 1000
+
+    result = _result_payload(question, stage, preview_limit)
+    result.update(
+        answer=final_answer or preview_rows(stage["columns"], stage["rows"], max_rows=preview_limit),
+        suggestions=stage["suggestions"][:5],
+        timings=timings,
+    )
+    return result
+
+
+async def stream_question_async(engine: AsyncEngine, context_rules: str, schema_text: str, question: str,
+                                ask: Optional[AskFn] = None,
+                                stream: Optional[StreamFn] = None,
+                                sql_cache: Optional[SqlCache] = None,
+                                preview_limit: int = 10) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    answer_question_async'in akış sürümü; (olay, veri) çiftleri üretir:
+      ("meta", sql/kolonlar/satırlar), ("token", {"text": ...}) x N, ("done", {"answer", "suggestions", "timings"})
+    Cevap token'ları LLM'den geldikçe iletilir (astream_llm). ask verilip stream verilmezse
+    (ör. test stub'ı) cevap tek parça halinde tek bir token olayı olarak gelir.
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    with span("run_question", stream=True):
+        stage = await _execute_stage_async(engine, context_rules, schema_text, question,
+                                           ask or ask_llm_async, sql_cache, timings, t0)
+        final_answer, answer_messages = _answer_step(context_rules, schema_text, question, stage, preview_limit)
+    t2 = time.perf_counter()
+    yield "meta", _result_payload(question, stage, preview_limit)
+
+    if answer_messages is None:
+        timings["ttft_ms"] = (time.perf_counter() - t2) * 1000
+        yield "token", {"text": final_answer}
+    else:
+        parts: List[str] = []
+        try:
+            if stream is None and ask is not None:
+                text = await ask(answer_messages, temperature=0.1, mode="answer")
+                timings["ttft_ms"] = (time.perf_counter() - t2) * 1000
+                parts.append(text)
+                yield "token", {"text": text}
+            else:
+                async for token in (stream or astream_llm)(answer_messages, temperature=0.1):
+                    if not parts:
+                        timings["ttft_ms"] = (time.perf_counter() - t2) * 1000
+                    parts.append(token)
+                    yield "token", {"text": token}
+        except Exception as e:
+            # İlk token'dan önceki hatalar astream_llm içinde yeniden denenir; buraya gelen hata kesindir
+            yield "error", {"error": str(e), "partial": bool(parts)}
+        final_answer = "".join(parts) or None
+        if final_answer is None:
+            fallback_text = preview_rows(stage["columns"], stage["rows"], max_rows=preview_limit)
+            yield "token", {"text": fallback_text}
+            final_answer = fallback_text
+    t3 = time.perf_counter()
+    timings["answer_ms"] = (t3 - t2) * 1000
+    timings["total_ms"] = (t3 - t0) * 1000
+    yield "done", {"answer": final_answer, "suggestions": stage["suggestions"][:5], "timings": timings}
@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from env import load_env
+
+from context_loader import load_context_and_schema
+from db import create_db_engine
+from fuzzy_index import build_fuzzy_index, is_fuzzy_index_enabled
+from llm import DEFAULT_MODEL
+from llm_scheduler import BATCH, llm_lane
+from pipeline import run_question
+from sql_cache import get_sql_cache
+
+load_env()
+
+# JSONL satırlarında soru metninin aranacağı alanlar (öncelik sırasıyla)
+QUESTION_KEYS = ("question", "soru", "text", "title")
+ID_KEYS = ("id", "request_id", "question_id")
+
+
+def get_batch_workers() -> int:
+    try:
+        return int(os.getenv("BATCH_WORKERS", "8"))
+    except ValueError:
+        return 8
+
+
+def iter_questions(path: str) -> Iterator[Tuple[int, Optional[str], str]]:
+    """
+    JSONL dosyasındaki soruları (satır_no, id, soru) olarak üretir.
+    Boş/bozuk satırlar ve soru alanı olmayan kayıtlar atlanır.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[batch] {line_no}. satır JSON değil, atlandı.", file=sys.stderr)
+                continue
+            if isinstance(record, str):
+                question, qid = record, None
+            else:
+                question = next((record[k] for k in QUESTION_KEYS if record.get(k)), None)
+                qid = next((str(record[k]) for k in ID_KEYS if record.get(k) is not None), None)
+            if not question:
+                print(f"[batch] {line_no}. satırda soru alanı yok, atlandı.", file=sys.stderr)
+                continue
+            yield line_no, qid, str(question).strip()
+
+
+def _run_one(engine, context_rules: str, schema_text: str, sql_cache,
+             line_no: int, qid: Optional[str], question: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        # Toplu sorular LLM kuyruğunda etkileşimli isteklerin arkasında bekler
+        with llm_lane(BATCH):
+            result = run_question(engine, context_rules, schema_text, question, sql_cache=sql_cache)
+    except Exception as e:
+        result = {
+            "question": question,
+            "error": str(e),
+            "timings": {"total_ms": (time.perf_counter() - started) * 1000},
+        }
+    result["line"] = line_no
+    result["id"] = qid
+    return result
+
+
+def run_batch(input_path: str, output_path: str, workers: Optional[int] = None,
+              context_file: str = "context.md") -> Dict[str, Any]:
+    """
+    JSONL sorularını sınırlı bir thread havuzuyla çalıştırır ve sonuçları tamamlandıkça JSONL'e yazar.
+    Aynı anda en fazla workers*2 soru kuyrukta tutulur; böylece büyük dosyalar belleğe yığılmaz.
+    """
+    workers = max(1, workers or get_batch_workers())
+    context_rules, schema_text = load_context_and_schema(context_file)
+    engine = create_db_engine()
+    if is_fuzzy_index_enabled():
+        # Tüm sorular aynı indeksi kullanacağı için çalıştırmadan önce senkron kurulur
+        try:
+            build_fuzzy_index(engine)
+        except Exception as e:
+            print(f"[batch] bulanık indeks kurulamadı, öneriler veritabanından gelecek: {e}", file=sys.stderr)
+    try:
+        sql_cache = get_sql_cache(namespace=DEFAULT_MODEL)
+    except Exception:
+        sql_cache = None
+
+    summary = {"total": 0, "ok": 0, "failed": 0}
+    started = time.perf_counter()
+    pending: Set[Future] = set()
+
+    def _drain(out, return_when) -> None:
+        nonlocal pending
+        done, pending = wait(pending, return_when=return_when)
+        for fut in done:
+            result = fut.result()
+            summary["failed" if "error" in result else "ok"] += 1
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+
+    try:
+        with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+            for line_no, qid, question in iter_questions(input_path):
+                summary["total"] += 1
+                pending.add(pool.submit(_run_one, engine, context_rules, schema_text, sql_cache,
+                                        line_no, qid, question))
+                if len(pending) >= workers * 2:
+                    _drain(out, FIRST_COMPLETED)
+            while pending:
+                _drain(out, FIRST_COMPLETED)
+    finally:
+        engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["questions_per_s"] = round(summary["total"] / elapsed, 3) if elapsed > 0 else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONL soru dosyasını toplu çalıştırır.")
+    parser.add_argument("input", help="Girdi JSONL (her satırda 'question' alanı)")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="Çıktı JSONL yolu")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Eşzamanlı işçi sayısı (varsayılan BATCH_WORKERS veya 8)")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input, args.output, workers=args.workers)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
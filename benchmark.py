@@ -0,0 +1,188 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from env import load_env
+from tabulate import tabulate
+
+load_env()
+
+# Sabit soru korpusu: stub LLM kurallarıyla (llm_stub.DEFAULT_SQL_RULES) eşleşen tipik sorular
+DEFAULT_CORPUS = [
+    "Chai stokta ne kadar var",
+    "Chang stokta kaç tane var",
+    "Tofu fiyatı nedir",
+    "rastgele 3 ürün göster",
+    "rastgele 5 ürün listele",
+    "en çok satan 5 ürünü listele",
+    "kaç müşteri var",
+    "kaç sipariş verilmiş",
+    "kategori bazında ürün sayısı",
+    "pahalı ürünler hangileri",
+    "olmayanurun stokta ne kadar var",
+    "ürünleri listele",
+]
+
+STAGES = ["sql_prompt", "llm_sql", "postprocess", "execute", "answer_preview", "answer_prompt", "llm_answer",
+          "total"]
+
+# --no-db modunda execute aşaması yerine kullanılan sabit sonuç
+_CANNED_RESULT: Tuple[List[str], List[Tuple[Any, ...]]] = (
+    ["product_name", "unit_price"],
+    [("Chai", 18.0), ("Chang", 19.0), ("Aniseed Syrup", 10.0)],
+)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank yüzdelik (pct: 0-100).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = (time.perf_counter() - start) * 1000
+
+
+def run_one(engine, context_rules: str, schema_text: str, question: str) -> Dict[str, float]:
+    """
+    Tek soruyu aşama aşama çalıştırır ve her aşamanın süresini (ms) döndürür.
+    """
+    from llm import build_sql_prompt, build_answer_prompt, ask_llm
+    from fallback import execute_with_fallbacks
+    from answer_preview import build_answer_preview
+    from pipeline import deterministic_answer, postprocess_generated_sql
+
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    messages = _timed(timings, "sql_prompt", build_sql_prompt, context_rules, schema_text, question)
+    raw_sql = _timed(timings, "llm_sql", ask_llm, messages, temperature=0.0, mode="sql")
+    sql_query = _timed(timings, "postprocess", postprocess_generated_sql, raw_sql, schema_text)
+
+    def _execute() -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        if engine is None:
+            return _CANNED_RESULT
+        _sql, columns, rows, _strategy, _suggestions = execute_with_fallbacks(engine, sql_query, question)
+        return columns, rows
+
+    columns, rows = _timed(timings, "execute", _execute)
+
+    if deterministic_answer(question, columns, rows) is None:
+        preview = _timed(timings, "answer_preview", build_answer_preview, columns, rows, max_rows=10)
+        answer_messages = _timed(
+            timings, "answer_prompt", build_answer_prompt,
+            context_rules=context_rules, schema_text=schema_text, sql_query=sql_query,
+            raw_rows_preview=preview.text, columns=columns, user_question=question,
+            numeric_summary=preview.summary,
+        )
+        _timed(timings, "llm_answer", ask_llm, answer_messages, temperature=0.1, mode="answer")
+
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def run_benchmark(questions: List[str], iterations: int = 5, concurrency: int = 1,
+                  use_db: bool = True, context_file: str = "context.md") -> Dict[str, Any]:
+    from context_loader import load_context_and_schema
+    from db import create_db_engine
+
+    context_rules, schema_text = load_context_and_schema(context_file)
+    engine = create_db_engine() if use_db else None
+
+    workload = [q for _ in range(iterations) for q in questions]
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors = 0
+
+    def _task(question: str) -> Optional[Dict[str, float]]:
+        try:
+            return run_one(engine, context_rules, schema_text, question)
+        except Exception as e:
+            print(f"[benchmark] '{question}' hata: {e}", file=sys.stderr)
+            return None
+
+    # Isınma: bağlantı havuzu ve istemci kurulumu ölçüme girmesin
+    if questions:
+        _task(questions[0])
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for timings in pool.map(_task, workload):
+                if timings is None:
+                    errors += 1
+                    continue
+                for stage, ms in timings.items():
+                    samples.setdefault(stage, []).append(ms)
+    finally:
+        if engine is not None:
+            engine.dispose()
+    elapsed = time.perf_counter() - started
+
+    stages = {
+        stage: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+        for stage, values in samples.items()
+    }
+    return {
+        "questions": len(workload),
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(len(workload) / elapsed, 3) if elapsed > 0 else 0.0,
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uçtan uca gecikme benchmark'ı (varsayılan: stub LLM)")
+    parser.add_argument("--corpus", help="JSONL soru dosyası (varsayılan: yerleşik korpus)")
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--backend", default="stub", help="LLM backend (stub/openrouter)")
+    parser.add_argument("--no-db", action="store_true", help="execute_select yerine sabit sonuç kullan")
+    parser.add_argument("--json", action="store_true", help="Sonucu JSON olarak yazdır")
+    args = parser.parse_args()
+
+    # Cache hit'leri ölçümü bozmasın
+    os.environ.setdefault("SQL_CACHE_ENABLED", "false")
+    from llm import set_llm_backend
+    set_llm_backend(args.backend)
+
+    if args.corpus:
+        from batch import iter_questions
+        questions = [q for _line, _qid, q in iter_questions(args.corpus)]
+    else:
+        questions = list(DEFAULT_CORPUS)
+
+    report = run_benchmark(questions, iterations=args.iterations, concurrency=args.concurrency,
+                           use_db=not args.no_db)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    rows = [[stage, s["count"], s["p50_ms"], s["p95_ms"], s["p99_ms"]] for stage, s in report["stages"].items()]
+    print(tabulate(rows, headers=["aşama", "adet", "p50 ms", "p95 ms", "p99 ms"], tablefmt="github"))
+    print(f"\n{report['questions']} soru, {report['errors']} hata, {report['elapsed_s']} sn, "
+          f"{report['throughput_qps']} soru/sn (eşzamanlılık={report['concurrency']})")
+
+
+if __name__ == "__main__":
+    main()
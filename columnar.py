@@ -0,0 +1,115 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# execute_select(result_format="pandas"|"arrow") için kolon bazlı sonuç yardımcıları.
+# pandas requirements.txt'te sabit; pyarrow opsiyoneldir ve yalnızca "arrow" istenirse import edilir.
+
+RESULT_FORMATS = ("rows", "pandas", "arrow")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError("result_format='arrow' için pyarrow kurulu olmalı (pip install pyarrow).") from e
+    return pa
+
+
+def is_frame(data: Any) -> bool:
+    """
+    pandas DataFrame veya pyarrow Table mı? (paketleri import etmeden kontrol eder)
+    """
+    module = type(data).__module__
+    return module.startswith("pandas") or module.startswith("pyarrow")
+
+
+def frame_from_batches(columns: List[str], batches, result_format: str) -> Any:
+    """
+    Cursor'dan gelen satır parçalarını (fetchmany) tek tek kolon bazlı yapıya çevirir;
+    tüm satırlar önce tek bir Python listesinde biriktirilmez.
+    """
+    if result_format == "pandas":
+        import pandas as pd
+        frames = [pd.DataFrame.from_records(batch, columns=columns) for batch in batches]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if result_format == "arrow":
+        pa = _require_pyarrow()
+        record_batches = [
+            pa.RecordBatch.from_arrays([pa.array(list(col)) for col in zip(*batch)], names=columns)
+            for batch in batches if batch
+        ]
+        if not record_batches:
+            return pa.table({c: pa.array([], type=pa.null()) for c in columns})
+        return pa.Table.from_batches(record_batches)
+    raise ValueError(f"Bilinmeyen result_format: {result_format} ({', '.join(RESULT_FORMATS)})")
+
+
+def to_pandas(data: Any, columns: Optional[List[str]] = None):
+    import pandas as pd
+    if type(data).__module__.startswith("pandas"):
+        return data
+    if type(data).__module__.startswith("pyarrow"):
+        return data.to_pandas()
+    return pd.DataFrame.from_records(list(data), columns=columns)
+
+
+def result_len(data: Any) -> int:
+    if is_frame(data):
+        return data.num_rows if hasattr(data, "num_rows") else len(data)
+    return len(data)
+
+
+def head_rows(data: Any, n: int) -> List[Tuple[Any, ...]]:
+    """
+    İlk n satırı tuple listesi olarak döndürür (satır listesi, DataFrame veya Arrow Table).
+    """
+    if not is_frame(data):
+        return list(data[:n])
+    if hasattr(data, "num_rows"):
+        sliced = data.slice(0, n).to_pylist()
+        return [tuple(r.values()) for r in sliced]
+    return list(data.head(n).itertuples(index=False, name=None))
+
+
+def numeric_summary(columns: Sequence[str], data: Any, top_n: int = 3) -> Dict[str, Dict[str, Any]]:
+    """
+    Sayısal kolonlar için tüm sonuç üzerinde vektörel toplam/min/maks/ortalama ve en büyük top_n değer.
+    top_n değerleri varsa ilk metin kolonuyla etiketlenir.
+    """
+    if result_len(data) == 0:
+        return {}
+    df = to_pandas(data, list(columns))
+    # PostgreSQL numeric kolonları Decimal olarak gelir (pandas'ta object); sayıya çevir
+    decimal_cols = [c for c in df.columns
+                    if df[c].dtype == object and isinstance(next(iter(df[c].dropna()), None), Decimal)]
+    if decimal_cols:
+        df = df.copy()
+        for c in decimal_cols:
+            df[c] = df[c].astype(float)
+    numeric = df.select_dtypes(include="number")
+    # id kolonlarının toplamı anlamsız
+    numeric = numeric[[c for c in numeric.columns if not str(c).lower().endswith("_id")]]
+    if numeric.empty:
+        return {}
+    label_cols = [c for c in df.columns if c not in numeric.columns and df[c].dtype == object]
+    label = label_cols[0] if label_cols else None
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    for col in numeric.columns:
+        # Ayrı ayrı indirgeme: tamsayı kolonların min/maks'ı float'a yükseltilmesin
+        series = numeric[col]
+        entry: Dict[str, Any] = {
+            "sum": _py(series.sum()), "min": _py(series.min()), "max": _py(series.max()), "mean": _py(series.mean()),
+        }
+        if label is not None and len(df) > 1:
+            top = df.nlargest(top_n, col)[[label, col]]
+            entry["top"] = [(_py(r[0]), _py(r[1])) for r in top.itertuples(index=False, name=None)]
+        summary[str(col)] = entry
+    return summary
+
+
+def _py(value: Any) -> Any:
+    # numpy skalerlerini düz Python tipine çevir (json/format için)
+    return value.item() if hasattr(value, "item") else value
@@ -1,15 +1,21 @@
 from pathlib import Path
-from typing import Tuple, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
 import os
+import threading
+import time
 
 from sqlalchemy import create_engine, text as sqtext
 from sqlalchemy.engine import Engine
-from dotenv import load_dotenv
+from env import load_env
 
-load_dotenv()
+from tracing import current_span, traced
 
+load_env()
 
-def load_context_and_schema(context_file: str = "context.md") -> Tuple[str, str]:
+
+@traced("load_context_and_schema")
+def load_context_and_schema(context_file: str = "context.md", engine: Optional[Engine] = None) -> Tuple[str, str]:
     """
     Öncelik sırası:
     1) Canlı veritabanından Northwind benzeri tablo/kolon şemasını çıkar ve döndür.
@@ -19,12 +25,14 @@ def load_context_and_schema(context_file: str = "context.md") -> Tuple[str, str]
     bölümlerini okuyup döndür.
 
     Dönen şema metni, LLM'e verilecek özet/insan-okur biçimli bir tablo+kolon listesi olarak tasarlanır.
+    Canlı şema fingerprint'i değişmedikçe diskteki cache'ten gelir (bkz. extract_live_schema).
     """
     # Önce DB'den otomatik şema çıkarmayı dene
     try:
-        schema_text = extract_live_schema()
+        schema_text = extract_live_schema(engine)
         rules_text = extract_rules_from_file(context_file)
         if schema_text.strip():
+            current_span().update(source="live", schema_chars=len(schema_text))
             return rules_text, schema_text
     except Exception:
         # Sessiz geç ve dosyadan devam et
@@ -51,6 +59,7 @@ def load_context_and_schema(context_file: str = "context.md") -> Tuple[str, str]
     if not schema:
         raise ValueError("Şema bölümü bulunamadı veya boş.")
 
+    current_span().update(source="file", schema_chars=len(schema))
     return rules, schema
 
 
@@ -85,48 +94,215 @@ def extract_rules_from_file(context_file: str) -> str:
     return rules.strip()
 
 
-def extract_live_schema() -> str:
+# Fingerprint: public şemadaki tablo/kolon/tip tanımlarının özeti. Tek ve ucuz bir katalog sorgusudur;
+# değişmediği sürece şema diskteki cache'ten okunur.
+SCHEMA_FINGERPRINT_SQL = """
+SELECT md5(coalesce(string_agg(
+           c.relname || '.' || a.attname || ':' || a.atttypid::text || ':' || a.attnum::text,
+           ',' ORDER BY c.relname, a.attnum), ''))
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid
+WHERE n.nspname = 'public'
+  AND c.relkind IN ('r', 'p', 'v', 'm')
+  AND a.attnum > 0
+  AND NOT a.attisdropped
+"""
+
+# Tüm tabloların kolonları tek sorguda (tablo başına sorgu yerine)
+SCHEMA_COLUMNS_SQL = """
+SELECT c.table_name, c.column_name, c.data_type
+FROM information_schema.columns c
+JOIN information_schema.tables t
+  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+WHERE c.table_schema = 'public'
+ORDER BY c.table_name, c.ordinal_position
+"""
+
+DESIRED_TABLES = [
+    "customers", "orders", "orderdetails", "order_details",
+    "products", "suppliers", "categories", "employees", "shippers",
+    "customer_customer_demo", "customer_demographics",
+    "employee_territories", "region", "territories", "us_states",
+]
+
+_schema_engine: Optional[Engine] = None
+_schema_lock = threading.Lock()
+_current: Dict[str, Any] = {"fingerprint": None, "schema_text": None}
+_refresher: Optional["SchemaRefresher"] = None
+
+
+def get_schema_cache_path() -> str:
+    return os.getenv("SCHEMA_CACHE_PATH", ".schema_cache.json")
+
+
+def get_schema_refresh_seconds() -> int:
+    try:
+        return int(os.getenv("SCHEMA_REFRESH_SECONDS", "300"))
+    except ValueError:
+        return 300
+
+
+def _get_schema_engine() -> Engine:
+    # Şema okuma için süreç boyunca tek, küçük bir engine (her çağrıda yeni engine kurulmaz)
+    global _schema_engine
+    with _schema_lock:
+        if _schema_engine is None:
+            db_url = os.getenv("DATABASE_URL")
+            if not db_url:
+                raise RuntimeError("DATABASE_URL tanımlı değil.")
+            _schema_engine = create_engine(db_url, future=True, pool_size=1, max_overflow=1, pool_pre_ping=True)
+        return _schema_engine
+
+
+def get_schema_fingerprint() -> Optional[str]:
     """
-    PostgreSQL 'public' şemasındaki Northwind çekirdek tablolarını ve kolonlarını listeler.
-    DATABASE_URL üzerinden bağlanır.
+    Son yüklenen canlı şemanın fingerprint'i (dosyadan okunduysa None).
+    Şemaya bağlı cache'ler için geçersiz kılma anahtarı olarak kullanılabilir.
     """
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        raise RuntimeError("DATABASE_URL tanımlı değil.")
+    return _current["fingerprint"]
+
 
-    engine = create_engine(db_url, future=True)
+def current_schema_text() -> Optional[str]:
+    """
+    Arka plan yenileyicinin gördüğü en güncel şema metni.
+    """
+    return _current["schema_text"]
 
-    desired_tables = [
-        "customers", "orders", "orderdetails", "order_details",
-        "products", "suppliers", "categories", "employees", "shippers",
-        "customer_customer_demo", "customer_demographics",
-        "employee_territories", "region", "territories", "us_states",
-    ]
 
+def fetch_schema_fingerprint(engine: Optional[Engine] = None) -> str:
+    engine = engine or _get_schema_engine()
     with engine.connect() as conn:
-        # Var olan tabloları çek
-        rows = conn.execute(sqtext("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-            ORDER BY 1
-        """)).fetchall()
-
-        existing = set(r[0].lower() for r in rows)
-        present = [t for t in desired_tables if t in existing]
-        if not present:
-            present = sorted(existing)
-
-        lines: List[str] = []
-        lines.append("Northwind (canlı şemadan çıkarım) - public şema")
-        for t in present:
-            cols = conn.execute(sqtext("""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_schema = 'public' AND table_name = :t
-                ORDER BY ordinal_position
-            """), {"t": t}).fetchall()
-            col_str = ", ".join(f"{c[0]} ({c[1]})" for c in cols) if cols else "(kolon yok)"
-            lines.append(f"- {t}: {col_str}")
-
-        return "\n".join(lines)
+        return conn.execute(sqtext(SCHEMA_FINGERPRINT_SQL)).scalar() or ""
+
+
+def _read_schema_cache(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not data.get("fingerprint") or not data.get("schema_text"):
+        return None
+    return data
+
+
+def _write_schema_cache(path: str, data: Dict[str, Any]) -> None:
+    # Yarım yazılmış dosya okunmasın diye geçici dosya + rename
+    tmp = f"{path}.tmp"
+    try:
+        Path(tmp).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _format_schema(columns_by_table: Dict[str, List[Tuple[str, str]]]) -> str:
+    present = [t for t in DESIRED_TABLES if t in columns_by_table]
+    if not present:
+        present = sorted(columns_by_table)
+
+    lines: List[str] = []
+    lines.append("Northwind (canlı şemadan çıkarım) - public şema")
+    for t in present:
+        cols = columns_by_table.get(t) or []
+        col_str = ", ".join(f"{c[0]} ({c[1]})" for c in cols) if cols else "(kolon yok)"
+        lines.append(f"- {t}: {col_str}")
+    return "\n".join(lines)
+
+
+def _introspect_schema(engine: Engine) -> Tuple[str, Dict[str, List[Tuple[str, str]]]]:
+    columns_by_table: Dict[str, List[Tuple[str, str]]] = {}
+    with engine.connect() as conn:
+        for table, column, data_type in conn.execute(sqtext(SCHEMA_COLUMNS_SQL)):
+            columns_by_table.setdefault(table.lower(), []).append((column, data_type))
+    return _format_schema(columns_by_table), columns_by_table
+
+
+@traced("extract_live_schema")
+def extract_live_schema(engine: Optional[Engine] = None, use_cache: bool = True) -> str:
+    """
+    PostgreSQL 'public' şemasındaki Northwind çekirdek tablolarını ve kolonlarını listeler.
+    DATABASE_URL üzerinden bağlanır (engine verilirse o kullanılır).
+
+    Önce katalog fingerprint'i okunur; diskteki cache (SCHEMA_CACHE_PATH) aynı fingerprint'e
+    sahipse şema oradan döner, değilse tek bir information_schema sorgusuyla yeniden çıkarılır.
+    """
+    engine = engine or _get_schema_engine()
+    path = get_schema_cache_path()
+    fingerprint = fetch_schema_fingerprint(engine)
+
+    cached = _read_schema_cache(path) if use_cache else None
+    if cached and cached["fingerprint"] == fingerprint:
+        schema_text = cached["schema_text"]
+        current_span().set("schema_cache_hit", True)
+    else:
+        schema_text, columns_by_table = _introspect_schema(engine)
+        current_span().set("schema_cache_hit", False)
+        if use_cache:
+            _write_schema_cache(path, {
+                "fingerprint": fingerprint,
+                "created_at": time.time(),
+                "schema_text": schema_text,
+                "tables": columns_by_table,
+            })
+
+    _current["fingerprint"], _current["schema_text"] = fingerprint, schema_text
+    current_span().set("fingerprint", fingerprint)
+    return schema_text
+
+
+class SchemaRefresher:
+    """
+    Uzun süre çalışan süreçlerde fingerprint'i aralıklarla kontrol eden arka plan thread'i.
+    Şema değiştiğinde yeniden çıkarır ve on_change(schema_text, fingerprint) çağırır.
+    """
+
+    def __init__(self, interval_seconds: Optional[int] = None,
+                 on_change: Optional[Callable[[str, str], None]] = None,
+                 engine: Optional[Engine] = None):
+        self.interval_seconds = interval_seconds or get_schema_refresh_seconds()
+        self.on_change = on_change
+        self.engine = engine
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="schema-refresher", daemon=True)
+
+    def start(self) -> "SchemaRefresher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check_once(self) -> bool:
+        """
+        Fingerprint değiştiyse şemayı yeniler; değişiklik olduysa True döner.
+        """
+        fingerprint = fetch_schema_fingerprint(self.engine)
+        if fingerprint == _current["fingerprint"]:
+            return False
+        schema_text = extract_live_schema(self.engine)
+        if self.on_change is not None:
+            self.on_change(schema_text, fingerprint)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check_once()
+            except Exception:
+                # DB geçici olarak erişilemezse mevcut şemayla devam et
+                continue
+
+
+def start_schema_refresher(on_change: Optional[Callable[[str, str], None]] = None,
+                           interval_seconds: Optional[int] = None) -> Optional[SchemaRefresher]:
+    """
+    Süreç başına tek yenileyici başlatır (şema dosyadan yüklendiyse veya SCHEMA_REFRESH_SECONDS<=0 ise başlatmaz).
+    """
+    global _refresher
+    if _current["fingerprint"] is None or (interval_seconds or get_schema_refresh_seconds()) <= 0:
+        return None
+    with _schema_lock:
+        if _refresher is None:
+            _refresher = SchemaRefresher(interval_seconds=interval_seconds, on_change=on_change).start()
+        return _refresher
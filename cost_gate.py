@@ -0,0 +1,367 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from env import load_env
+
+from db import explain_query, explain_query_async, get_row_limit_default
+from sql_guard import guard_select, parse_sql, sql_fingerprint
+from tracing import current_span, traced
+
+load_env()
+
+# LLM'in ürettiği SQL için EXPLAIN tabanlı ön kontrol (COST_GATE_ENABLED=true).
+# Sorgu çalıştırılmadan EXPLAIN (FORMAT JSON) ile planlanır; plan SQL parmak izine (boşluk/yorum hariç birebir SQL; literal'ler dahil) göre önbelleklenir.
+# Kök düğümün tahmini maliyeti (LIMIT'i zaten hesaba katar) ya da kök/JOIN/aggregate çıktısının tahmini
+# satır sayısı sınırı aşarsa (LIMIT altındaki taramalar tüm tablonun tahminini taşır, sayılmaz):
+#   1) ORDER BY random() içeren tek tablolu sorgularda tablo TABLESAMPLE SYSTEM ile örneklenir
+#   2) dıştaki LIMIT COST_GATE_REWRITE_LIMIT'e indirilir
+# Yeniden yazım da sınırı aşıyorsa sorgu reddedilir ve gerekçe (plan özeti) yeniden üretim prompt'una eklenir.
+# Böylece pahalı bir JOIN statement_timeout dolana kadar paylaşılan veritabanını meşgul etmez.
+
+_RANDOM_ORDER_RE = re.compile(r"\border\s+by\s+random\s*\(\s*\)", re.IGNORECASE)
+_JOIN_RE = re.compile(r"\bjoin\b", re.IGNORECASE)
+_TABLE_ALIAS_TAIL = r"(?:\s+(?:as\s+)?(?!(?:where|order|limit|group|having|offset|fetch|window|tablesample)\b)[a-z_]\w*)?"
+
+# Satır sınırının uygulandığı ara düğümler (kök her zaman dahil)
+_ROW_CAPPED_NODES = {"Nested Loop", "Hash Join", "Merge Join", "Aggregate"}
+
+# Örneklemede hedeflenen satır sayısı: LIMIT'in bu katı (filtreden sonra yeterli satır kalsın)
+SAMPLE_ROWS_FACTOR = 20
+
+
+def is_cost_gate_enabled() -> bool:
+    return os.getenv("COST_GATE_ENABLED", "false").lower() == "true"
+
+
+def get_cost_gate_max_cost() -> float:
+    """
+    İzin verilen azami tahmini plan maliyeti (COST_GATE_MAX_COST, PostgreSQL maliyet birimi; varsayılan 50000).
+    """
+    try:
+        return float(os.getenv("COST_GATE_MAX_COST", "50000"))
+    except ValueError:
+        return 50000.0
+
+
+def get_cost_gate_max_rows() -> int:
+    """
+    Kök çıktısında ve JOIN/aggregate düğümlerinde izin verilen azami tahmini satır (COST_GATE_MAX_ROWS,
+    varsayılan 1000000). Taramalar sayılmaz: LIMIT altındaki Seq Scan tüm tablonun tahminini raporlar.
+    """
+    try:
+        return int(os.getenv("COST_GATE_MAX_ROWS", "1000000"))
+    except ValueError:
+        return 1000000
+
+
+def get_cost_gate_rewrite_limit() -> int:
+    try:
+        return int(os.getenv("COST_GATE_REWRITE_LIMIT", "100"))
+    except ValueError:
+        return 100
+
+
+def get_cost_gate_max_regenerations() -> int:
+    try:
+        return int(os.getenv("COST_GATE_MAX_REGENERATIONS", "1"))
+    except ValueError:
+        return 1
+
+
+def get_plan_cache_max_entries() -> int:
+    try:
+        return int(os.getenv("COST_GATE_PLAN_CACHE_SIZE", "512"))
+    except ValueError:
+        return 512
+
+
+def get_plan_cache_ttl_seconds() -> int:
+    try:
+        return int(os.getenv("COST_GATE_PLAN_TTL_SECONDS", "600"))
+    except ValueError:
+        return 600
+
+
+class CostGateError(ValueError):
+    """
+    Maliyet sınırını aşan ve yeniden üretimle de düzelmeyen SQL.
+    """
+
+
+@dataclass
+class PlanEstimate:
+    total_cost: float
+    root_rows: int
+    max_rows: int                      # kök ve JOIN/aggregate düğümlerinin en büyük tahmini satırı
+    heavy_nodes: List[str] = field(default_factory=list)   # gerekçe için en ağır düğümler
+    relation_rows: Dict[str, int] = field(default_factory=dict)  # tablo -> tarama tahmini satırı
+    cartesian: bool = False            # koşulsuz Nested Loop (eksik JOIN koşulu)
+
+
+@dataclass
+class CostDecision:
+    sql: str
+    action: str                        # "ok" | "rewritten" | "rejected"
+    estimate: Optional[PlanEstimate]
+    reason: Optional[str] = None
+    rewrite: Optional[str] = None      # "tablesample" | "limit"
+
+
+def _walk(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans") or ():
+        yield from _walk(child)
+
+
+def summarize_plan(plan: Dict[str, Any]) -> PlanEstimate:
+    nodes = list(_walk(plan))
+    relation_rows: Dict[str, int] = {}
+    cartesian = False
+    for node in nodes:
+        rel = node.get("Relation Name")
+        if rel and node.get("Node Type", "").endswith("Scan"):
+            relation_rows[rel.lower()] = max(relation_rows.get(rel.lower(), 0), int(node.get("Plan Rows", 0)))
+        if node.get("Node Type") == "Nested Loop" and not node.get("Join Filter") and len(node.get("Plans") or ()) == 2 \
+                and not any(c.get("Index Cond") or c.get("Recheck Cond") for c in _walk(node["Plans"][1])):
+            cartesian = True
+    heaviest = sorted(nodes, key=lambda n: n.get("Plan Rows", 0), reverse=True)[:3]
+    heavy_nodes = []
+    for node in heaviest:
+        label = node.get("Node Type", "?")
+        if node.get("Relation Name"):
+            label += f" {node['Relation Name']}"
+        heavy_nodes.append(f"{label} (~{int(node.get('Plan Rows', 0))} satır, maliyet {node.get('Total Cost', 0):.0f})")
+    return PlanEstimate(
+        total_cost=float(plan.get("Total Cost", 0.0)),
+        root_rows=int(plan.get("Plan Rows", 0)),
+        max_rows=max(int(n.get("Plan Rows", 0)) for n in nodes
+                     if n is plan or n.get("Node Type") in _ROW_CAPPED_NODES),
+        heavy_nodes=heavy_nodes,
+        relation_rows=relation_rows,
+        cartesian=cartesian,
+    )
+
+
+class PlanCache:
+    """
+    SQL parmak izi -> PlanEstimate; LRU + TTL (istatistikler değişince planlar da değişir).
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else get_plan_cache_max_entries()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else get_plan_cache_ttl_seconds()
+        self._entries: "OrderedDict[str, Tuple[PlanEstimate, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[PlanEstimate]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or (self.ttl_seconds > 0 and time.time() - item[1] > self.ttl_seconds):
+                self._entries.pop(key, None)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return item[0]
+
+    def put(self, key: str, estimate: PlanEstimate) -> None:
+        with self._lock:
+            self._entries[key] = (estimate, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_plan_cache = PlanCache()
+
+
+def get_plan_cache() -> PlanCache:
+    return _plan_cache
+
+
+def _over_limits(estimate: PlanEstimate) -> bool:
+    return estimate.total_cost > get_cost_gate_max_cost() or estimate.max_rows > get_cost_gate_max_rows()
+
+
+def _reason(estimate: PlanEstimate) -> str:
+    lines = [
+        f"- Tahmini maliyet: {estimate.total_cost:.0f} (sınır {get_cost_gate_max_cost():.0f})",
+        f"- En büyük ara sonuç: ~{estimate.max_rows} satır (sınır {get_cost_gate_max_rows()})",
+    ]
+    if estimate.cartesian:
+        lines.append("- Koşulsuz iç içe döngü: JOIN koşulu eksik olabilir (kartezyen çarpım)")
+    if estimate.heavy_nodes:
+        lines.append("- En ağır adımlar: " + "; ".join(estimate.heavy_nodes))
+    return "\n".join(lines)
+
+
+def _tablesample_rewrite(sql: str, estimate: PlanEstimate, limit: int) -> Optional[str]:
+    """
+    Tek tablolu "ORDER BY random() LIMIT n" sorgusunda tabloyu TABLESAMPLE SYSTEM ile örnekler.
+    Örneklem içinde ORDER BY random() korunur (sıralama artık yalnızca örneklem satırları üzerinde).
+    """
+    parsed = parse_sql(sql)
+    if not _RANDOM_ORDER_RE.search(sql) or len(parsed.tables) != 1 or _JOIN_RE.search(sql) \
+            or re.search(r"\btablesample\b", sql, re.IGNORECASE):
+        return None
+    table = next(iter(parsed.tables))
+    table_rows = estimate.relation_rows.get(table)
+    if not table_rows:
+        return None
+    percent = min(100.0, 100.0 * limit * SAMPLE_ROWS_FACTOR / table_rows)
+    if percent >= 100.0:
+        return None
+    percent = max(0.01, math.ceil(percent * 100) / 100)
+    m = re.search(rf'\bfrom\s+(?:"?\w+"?\.)?"?{re.escape(table)}"?{_TABLE_ALIAS_TAIL}', sql, re.IGNORECASE)
+    if m is None:
+        return None
+    return f"{sql[:m.end()]} TABLESAMPLE SYSTEM ({percent:g}){sql[m.end():]}"
+
+
+def _rewrites(sql: str, estimate: PlanEstimate) -> List[Tuple[str, str]]:
+    row_limit = get_row_limit_default()
+    parsed = parse_sql(sql)
+    current_limit = parsed.limit or row_limit
+    tight = min(get_cost_gate_rewrite_limit(), current_limit)
+    candidates: List[Tuple[str, str]] = []
+    sampled = _tablesample_rewrite(sql, estimate, current_limit)
+    if sampled is not None:
+        candidates.append(("tablesample", sampled))
+    if tight < current_limit:
+        candidates.append(("limit", guard_select(sql, tight)))
+    return candidates
+
+
+def _decide(sql: str, estimate: PlanEstimate, rewritten: List[Tuple[str, str, PlanEstimate]]) -> CostDecision:
+    if not _over_limits(estimate):
+        return CostDecision(sql=sql, action="ok", estimate=estimate)
+    for name, new_sql, new_estimate in rewritten:
+        if not _over_limits(new_estimate):
+            return CostDecision(sql=new_sql, action="rewritten", estimate=new_estimate, rewrite=name)
+    return CostDecision(sql=sql, action="rejected", estimate=estimate, reason=_reason(estimate))
+
+
+def _record(decision: CostDecision, cache_hit: bool) -> None:
+    estimate = decision.estimate
+    current_span().update(
+        action=decision.action, rewrite=decision.rewrite, cache_hit=cache_hit,
+        total_cost=round(estimate.total_cost, 1) if estimate else None,
+        max_plan_rows=estimate.max_rows if estimate else None,
+    )
+
+
+def _estimate(engine, sql: str) -> Tuple[PlanEstimate, bool]:
+    key = sql_fingerprint(sql)
+    cached = _plan_cache.get(key)
+    if cached is not None:
+        return cached, True
+    estimate = summarize_plan(explain_query(engine, sql))
+    _plan_cache.put(key, estimate)
+    return estimate, False
+
+
+async def _estimate_async(engine, sql: str) -> Tuple[PlanEstimate, bool]:
+    key = sql_fingerprint(sql)
+    cached = _plan_cache.get(key)
+    if cached is not None:
+        return cached, True
+    estimate = summarize_plan(await explain_query_async(engine, sql))
+    _plan_cache.put(key, estimate)
+    return estimate, False
+
+
+@traced("cost_gate")
+def check_query_cost(engine, sql: str) -> CostDecision:
+    """
+    SQL'i EXPLAIN ile değerlendirir: sınır içindeyse "ok", bir yeniden yazım sınıra sokuyorsa
+    "rewritten" (decision.sql yeni SQL), değilse "rejected" (decision.reason plan özeti).
+    """
+    estimate, cache_hit = _estimate(engine, sql)
+    rewritten: List[Tuple[str, str, PlanEstimate]] = []
+    if _over_limits(estimate):
+        for name, new_sql in _rewrites(sql, estimate):
+            new_estimate, _ = _estimate(engine, new_sql)
+            rewritten.append((name, new_sql, new_estimate))
+            if not _over_limits(new_estimate):
+                break
+    decision = _decide(sql, estimate, rewritten)
+    _record(decision, cache_hit)
+    return decision
+
+
+@traced("cost_gate")
+async def check_query_cost_async(engine, sql: str) -> CostDecision:
+    estimate, cache_hit = await _estimate_async(engine, sql)
+    rewritten: List[Tuple[str, str, PlanEstimate]] = []
+    if _over_limits(estimate):
+        for name, new_sql in _rewrites(sql, estimate):
+            new_estimate, _ = await _estimate_async(engine, new_sql)
+            rewritten.append((name, new_sql, new_estimate))
+            if not _over_limits(new_estimate):
+                break
+    decision = _decide(sql, estimate, rewritten)
+    _record(decision, cache_hit)
+    return decision
+
+
+def gate_generated_sql(engine, context_rules: str, schema_text: str, question: str, sql_query: str,
+                       ask: Callable[..., str]) -> str:
+    """
+    Üretilen SQL'i maliyet kapısından geçirir; reddedilirse gerekçeyle en fazla
+    COST_GATE_MAX_REGENERATIONS kez yeniden ürettirir. Kapı kapalıysa SQL aynen döner.
+    EXPLAIN çalışmazsa (izin, sözdizimi) karar execute_select'e bırakılır.
+    """
+    if not is_cost_gate_enabled():
+        return sql_query
+    from llm import build_sql_regeneration_prompt
+    from pipeline import postprocess_generated_sql
+
+    for attempt in range(get_cost_gate_max_regenerations() + 1):
+        try:
+            decision = check_query_cost(engine, sql_query)
+        except Exception:
+            return sql_query
+        if decision.action != "rejected":
+            return decision.sql
+        if attempt == get_cost_gate_max_regenerations():
+            break
+        messages = build_sql_regeneration_prompt(context_rules, schema_text, question, sql_query, decision.reason)
+        sql_query = postprocess_generated_sql(ask(messages, temperature=0.0, mode="sql"), schema_text)
+    raise CostGateError(f"Sorgu maliyet sınırını aşıyor:\n{decision.reason}")
+
+
+async def gate_generated_sql_async(engine, context_rules: str, schema_text: str, question: str, sql_query: str,
+                                   ask: Callable[..., Awaitable[str]]) -> str:
+    if not is_cost_gate_enabled():
+        return sql_query
+    from llm import build_sql_regeneration_prompt
+    from pipeline import postprocess_generated_sql
+
+    for attempt in range(get_cost_gate_max_regenerations() + 1):
+        try:
+            decision = await check_query_cost_async(engine, sql_query)
+        except Exception:
+            return sql_query
+        if decision.action != "rejected":
+            return decision.sql
+        if attempt == get_cost_gate_max_regenerations():
+            break
+        messages = build_sql_regeneration_prompt(context_rules, schema_text, question, sql_query, decision.reason)
+        sql_query = postprocess_generated_sql(await ask(messages, temperature=0.0, mode="sql"), schema_text)
+    raise CostGateError(f"Sorgu maliyet sınırını aşıyor:\n{decision.reason}")
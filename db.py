@@ -1,13 +1,22 @@
+import hashlib
+import json
 import os
+import re
 from contextlib import contextmanager
-from typing import Any, List, Tuple, Optional
+from typing import Any, Dict, Iterator, List, Tuple, Optional
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine, Result
 from sqlalchemy.exc import SQLAlchemyError
-from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from env import load_env
 
-load_dotenv()
+from columnar import RESULT_FORMATS, frame_from_batches, result_len
+from result_cache import get_result_cache
+from sql_guard import guard_select, parse_sql
+from tracing import current_span, traced
+
+load_env()
 
 
 def get_database_url() -> str:
@@ -17,6 +26,18 @@ def get_database_url() -> str:
     return url
 
 
+def get_async_database_url() -> str:
+    """
+    DATABASE_URL'i async sürücüye (psycopg 3) çevirir.
+    Örn: postgresql+psycopg2://... -> postgresql+psycopg://...
+    """
+    url = get_database_url()
+    for prefix in ("postgresql+psycopg2://", "postgresql+psycopg://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
 def get_query_timeout_seconds() -> int:
     try:
         return int(os.getenv("QUERY_TIMEOUT_SECONDS", "10"))
@@ -31,18 +52,84 @@ def get_row_limit_default() -> int:
         return 1000
 
 
+def get_pool_settings() -> Dict[str, Any]:
+    """
+    Bağlantı havuzu ayarları (env): DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE (sn, -1 = kapalı), DB_POOL_PRE_PING.
+    """
+    def _int(name: str, default: int) -> int:
+        try:
+            return int(os.getenv(name, str(default)))
+        except ValueError:
+            return default
+
+    return {
+        "pool_size": _int("DB_POOL_SIZE", 5),
+        "max_overflow": _int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
+# Bağlantı kaydında (pool ConnectionRecord.info) oturumun varsayılan statement_timeout'u tutulur
+SESSION_TIMEOUT_KEY = "statement_timeout_ms"
+
+
+def _default_timeout_ms() -> int:
+    return max(1, int(get_query_timeout_seconds() * 1000))
+
+
+def _install_session_defaults(sync_engine: Engine) -> None:
+    """
+    Her fiziksel bağlantı açıldığında oturum varsayılanlarını bir kez uygular (pool "connect" olayı).
+    Böylece sorgu başına SET round-trip'i gerekmez.
+    """
+    timeout_ms = _default_timeout_ms()
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET statement_timeout = {timeout_ms}")
+        finally:
+            cursor.close()
+        # psycopg2/psycopg autocommit kapalıyken SET açık bir transaction başlatır; kalıcı olması için commit
+        dbapi_connection.commit()
+        connection_record.info[SESSION_TIMEOUT_KEY] = timeout_ms
+
+
+def _timeout_statement(conn_info: Dict[str, Any], timeout_ms: int) -> Optional[str]:
+    """
+    Sorgu varsayılandan farklı bir timeout istiyorsa aynı transaction içinde SET LOCAL döndürür.
+    SET LOCAL transaction sonunda geri alınır; havuzdaki bağlantıya sızmaz.
+    """
+    if conn_info.get(SESSION_TIMEOUT_KEY) == timeout_ms:
+        return None
+    return f"SET LOCAL statement_timeout = {timeout_ms}"
+
+
 def create_db_engine(echo: bool = False) -> Engine:
     url = get_database_url()
-    # Pool ayarları: makul defaultlar
+    # Pool ayarları env'den (get_pool_settings); oturum varsayılanları bağlantı açılışında uygulanır
     engine = create_engine(
         url,
         echo=echo,
-        pool_size=5,
-        max_overflow=10,
-        pool_timeout=30,
-        pool_pre_ping=True,
         future=True,
+        **get_pool_settings(),
+    )
+    _install_session_defaults(engine)
+    return engine
+
+
+def create_async_db_engine(echo: bool = False) -> AsyncEngine:
+    url = get_async_database_url()
+    engine = create_async_engine(
+        url,
+        echo=echo,
+        **get_pool_settings(),
     )
+    _install_session_defaults(engine.sync_engine)
     return engine
 
 
@@ -56,57 +143,379 @@ def db_connect(engine: Engine):
 
 
 def is_select_query(sql: str) -> bool:
-    # Basit guard: sadece SELECT ile başlamalı (WITH ... SELECT de olabilir)
-    stripped = sql.strip().lower()
-    return stripped.startswith("select") or stripped.startswith("with")
+    # Ayrıştırılmış SQL guard'ı: tek ifade, SELECT/WITH/VALUES ile başlar, hiçbir yerde yazma işlemi yok
+    return parse_sql(sql).ok
 
 
 def enforce_limit(sql: str, limit: int) -> str:
     """
-    Eğer sorguda zaten LIMIT varsa ekleme yapma.
-    Basit bir yaklaşımla son SELECT/ORDER BY/...) sonrasındaki LIMIT var mı kontrol eder.
-    Not: WITH ... SELECT gibi durumlarda da çalışır.
+    Dıştaki sorguya LIMIT ekler; varsa limit'e indirir (alt sorgulardaki LIMIT'lere dokunmaz).
+    Geçersiz/güvensiz SQL için UnsafeSqlError (ValueError).
     """
-    # Noktalı virgülü şimdilik temizle
-    trimmed = sql.strip().rstrip(";")
-    low = trimmed.lower()
+    return guard_select(sql, limit)
 
-    # LIMIT var mı? (regex kullanmadan basit kontrol: ' limit ' ya da satır sonlarında)
-    if " limit " in low or low.endswith(" limit") or low.endswith(" limit;"):
-        return trimmed + ";"  # orijinalin sonuna tekrar ; ekle
 
-    # ORDER BY ... LIMIT X; gibi iç içe alt sorgulardaki limitleri yakalamak zor olabilir.
-    # Pratik çözüm: Tüm metin içinde 'limit' anahtar kelimesi varsa ekleme yapma.
-    if "limit" in low:
-        return trimmed + ";"
-
-    # LIMIT yoksa ekle
-    return f"{trimmed} LIMIT {limit};"
+def get_stream_batch_size() -> int:
+    try:
+        return int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+    except ValueError:
+        return 1000
 
 
-def execute_select(engine: Engine, sql: str, timeout_seconds: Optional[int] = None) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+def _prepare_select(sql: str, timeout_seconds: Optional[int], limit: Optional[int] = None) -> Tuple[str, int]:
     """
-    Sadece SELECT çalıştırır, LIMIT ve statement_timeout uygular.
-    Dönüş: (kolon_isimleri, satırlar)
+    SELECT guard + LIMIT uygular; (güvenli_sql, timeout_ms) döndürür.
     """
-    if not is_select_query(sql):
-        raise ValueError("Sadece SELECT sorguları çalıştırılabilir.")
-
-    limit = get_row_limit_default()
-    safe_sql = enforce_limit(sql, limit)
+    limit = limit or get_row_limit_default()
+    # UnsafeSqlError (ValueError): çoklu ifade, yazma işlemi, FOR UPDATE vb.
+    safe_sql = guard_select(sql, limit)
+    current_span().set("tables", sorted(parse_sql(sql).tables))
 
     timeout = timeout_seconds if timeout_seconds is not None else get_query_timeout_seconds()
     # PostgreSQL statement_timeout (ms cinsinden)
     timeout_ms = max(1, int(timeout * 1000))
+    return safe_sql, timeout_ms
+
+
+def _db_key(engine) -> str:
+    # Sync ve async engine aynı veritabanında aynı cache anahtarını kullansın (sürücü adı hariç)
+    url = engine.url
+    return f"{url.host}:{url.port}/{url.database}"
+
+
+def _result_cache_for(safe_sql: str, use_cache: bool):
+    if not use_cache:
+        return None
+    cache = get_result_cache()
+    if cache is None or not cache.is_cacheable(safe_sql):
+        return None
+    return cache
+
+
+@traced("execute_select")
+def execute_select(engine: Engine, sql: str, timeout_seconds: Optional[int] = None,
+                   params: Optional[Dict[str, Any]] = None,
+                   use_cache: bool = True,
+                   max_rows: Optional[int] = None,
+                   result_format: str = "rows") -> Tuple[List[str], Any]:
+    """
+    Sadece SELECT çalıştırır, LIMIT ve statement_timeout uygular.
+    params verilirse bind parametresi olarak gönderilir (:isim).
+    Deterministik sorguların sonucu result_cache'ten döner (use_cache=False ile atlanır).
+    max_rows verilirse sunucu taraflı cursor ile yalnızca ilk max_rows satır çekilir.
+    result_format="pandas"/"arrow" ile satırlar cursor'dan STREAM_BATCH_SIZE'lık parçalarla
+    DataFrame/Arrow Table'a dönüştürülür (bu sonuçlar cache'lenmez).
+    Dönüş: (kolon_isimleri, satırlar | DataFrame | Table)
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Bilinmeyen result_format: {result_format}")
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds)
+    current_span().update(sql=safe_sql, timeout_ms=timeout_ms, result_format=result_format)
+
+    cache = _result_cache_for(safe_sql, use_cache and result_format == "rows")
+    if cache is not None:
+        cache.poll(engine)
+        # Kısmi (max_rows) sonuçlar tam sonuçlarla aynı anahtarı paylaşmasın
+        cache_params = dict(params or {}, _max_rows=max_rows) if max_rows is not None else params
+        cache_key = cache.make_key(_db_key(engine), safe_sql, cache_params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            current_span().update(rows=len(cached[1]), result_cache_hit=True)
+            return cached
 
     try:
         with db_connect(engine) as conn:
-            # statement_timeout'u session seviyesinde ayarla
-            conn.execute(text(f"SET statement_timeout = {timeout_ms}"))
-            result: Result = conn.execute(text(safe_sql))
-            rows = result.fetchall()
+            # Varsayılandan farklı timeout yalnızca bu transaction için (SET LOCAL)
+            timeout_sql = _timeout_statement(conn.info, timeout_ms)
+            if timeout_sql:
+                conn.execute(text(timeout_sql))
+            if max_rows is not None:
+                # Önizleme yeterliyse kalan satırlar sunucudan hiç çekilmez
+                conn.execution_options(stream_results=True, yield_per=max(1, max_rows))
+            elif result_format != "rows":
+                conn.execution_options(stream_results=True, yield_per=get_stream_batch_size())
+            result: Result = conn.execute(text(safe_sql), params or {})
             keys = list(result.keys())
-            return keys, [tuple(r) for r in rows]
+            if result_format != "rows":
+                batch_size = max_rows or get_stream_batch_size()
+                batches = [result.fetchmany(max_rows)] if max_rows is not None else iter(
+                    lambda: result.fetchmany(batch_size), []
+                )
+                frame = frame_from_batches(keys, batches, result_format)
+                current_span().set("rows", result_len(frame))
+                return keys, frame
+            if max_rows is not None:
+                rows = [tuple(r) for r in result.fetchmany(max_rows)]
+                result.close()
+            else:
+                # fetchall + ikinci liste kopyası yerine satırlar tek geçişte tuple'a çevrilir
+                rows = [tuple(r) for r in result]
+            current_span().set("rows", len(rows))
     except SQLAlchemyError as e:
         # Daha okunaklı hata
         raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+
+    if cache is not None:
+        cache.put(cache_key, safe_sql, keys, rows)
+    return keys, rows
+
+
+@traced("execute_select")
+async def execute_select_async(engine: AsyncEngine, sql: str, timeout_seconds: Optional[int] = None,
+                               params: Optional[Dict[str, Any]] = None,
+                               use_cache: bool = True) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """
+    execute_select'in asyncio karşılığı (psycopg 3 async sürücüsü ile).
+    Dönüş: (kolon_isimleri, satırlar)
+    """
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds)
+    current_span().update(sql=safe_sql, timeout_ms=timeout_ms)
+
+    cache = _result_cache_for(safe_sql, use_cache)
+    if cache is not None:
+        await cache.poll_async(engine)
+        cache_key = cache.make_key(_db_key(engine), safe_sql, params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            current_span().update(rows=len(cached[1]), result_cache_hit=True)
+            return cached
+
+    try:
+        async with engine.connect() as conn:
+            timeout_sql = _timeout_statement(conn.sync_connection.info, timeout_ms)
+            if timeout_sql:
+                await conn.execute(text(timeout_sql))
+            result = await conn.execute(text(safe_sql), params or {})
+            rows = result.fetchall()
+            keys = list(result.keys())
+            current_span().set("rows", len(rows))
+            rows = [tuple(r) for r in rows]
+    except SQLAlchemyError as e:
+        raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+
+    if cache is not None:
+        cache.put(cache_key, safe_sql, keys, rows)
+    return keys, rows
+
+
+def _plan_root(value: Any) -> Dict[str, Any]:
+    # EXPLAIN (FORMAT JSON) tek hücre döndürür: [{"Plan": {...}}] (sürücüye göre str ya da list)
+    data = json.loads(value) if isinstance(value, (str, bytes)) else value
+    return data[0]["Plan"]
+
+
+@traced("explain")
+def explain_query(engine: Engine, sql: str, timeout_seconds: Optional[int] = None,
+                  limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Sorguyu çalıştırmadan EXPLAIN (FORMAT JSON) ile planlar; kök plan düğümünü döndürür.
+    SQL, execute_select ile aynı guard + LIMIT'ten geçer (plan çalışacak sorgunun planıdır).
+    """
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds, limit=limit)
+    try:
+        with db_connect(engine) as conn:
+            timeout_sql = _timeout_statement(conn.info, timeout_ms)
+            if timeout_sql:
+                conn.execute(text(timeout_sql))
+            value = conn.execute(text("EXPLAIN (FORMAT JSON) " + safe_sql.rstrip().rstrip(";"))).scalar()
+    except SQLAlchemyError as e:
+        raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+    return _plan_root(value)
+
+
+@traced("explain")
+async def explain_query_async(engine: AsyncEngine, sql: str, timeout_seconds: Optional[int] = None,
+                              limit: Optional[int] = None) -> Dict[str, Any]:
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds, limit=limit)
+    try:
+        async with engine.connect() as conn:
+            timeout_sql = _timeout_statement(conn.sync_connection.info, timeout_ms)
+            if timeout_sql:
+                await conn.execute(text(timeout_sql))
+            value = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + safe_sql.rstrip().rstrip(";")))).scalar()
+    except SQLAlchemyError as e:
+        raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+    return _plan_root(value)
+
+
+# Bağlantı kaydında bu fiziksel bağlantıda PREPARE edilmiş ifadelerin adları tutulur
+PREPARED_STATEMENTS_KEY = "prepared_statements"
+_BIND_RE = re.compile(r"'(?:[^']|'')*'|(?<!:):(\w+)")
+
+
+def _to_positional(sql: str) -> Tuple[str, List[str]]:
+    """
+    :isim bind parametrelerini PREPARE için $1, $2 ... biçimine çevirir (literal'lere dokunmaz).
+    Dönüş: (sql, parametre_sırası)
+    """
+    order: List[str] = []
+
+    def _replace(m: "re.Match[str]") -> str:
+        name = m.group(1)
+        if name is None:
+            return m.group(0)
+        if name not in order:
+            order.append(name)
+        return f"${order.index(name) + 1}"
+
+    return _BIND_RE.sub(_replace, sql), order
+
+
+@traced("execute_prepared")
+def execute_prepared(engine: Engine, sql: str, params: Dict[str, Any], timeout_seconds: Optional[int] = None,
+                     use_cache: bool = True) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """
+    Parametreli bir SELECT'i sunucu taraflı hazır ifade (PREPARE/EXECUTE) olarak çalıştırır.
+    İfade her fiziksel bağlantıda bir kez hazırlanır; sonraki çağrılar yalnızca EXECUTE gönderir
+    ve PostgreSQL planlamayı atlayabilir. Parametre tipleri çıkarılamazsa sorgu normal bind
+    parametreleriyle çalıştırılır. Sonuç cache'i execute_select ile aynı anahtarları kullanır.
+    """
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds)
+    current_span().update(sql=safe_sql, timeout_ms=timeout_ms)
+
+    cache = _result_cache_for(safe_sql, use_cache)
+    if cache is not None:
+        cache.poll(engine)
+        cache_key = cache.make_key(_db_key(engine), safe_sql, params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            current_span().update(rows=len(cached[1]), result_cache_hit=True)
+            return cached
+
+    positional_sql, order = _to_positional(safe_sql.rstrip().rstrip(";"))
+    name = "nl2sql_" + hashlib.sha1(safe_sql.encode("utf-8")).hexdigest()[:16]
+    execute_sql = f"EXECUTE {name}({', '.join(':' + p for p in order)})" if order else f"EXECUTE {name}"
+    try:
+        with db_connect(engine) as conn:
+            prepared = conn.info.setdefault(PREPARED_STATEMENTS_KEY, set())
+            timeout_sql = _timeout_statement(conn.info, timeout_ms)
+            if timeout_sql:
+                conn.execute(text(timeout_sql))
+            if name not in prepared:
+                try:
+                    # exec_driver_sql: metindeki % ve :: ifadeleri sürücüye olduğu gibi gider
+                    with conn.begin_nested():
+                        conn.exec_driver_sql(f"PREPARE {name} AS {positional_sql}")
+                    prepared.add(name)
+                except SQLAlchemyError:
+                    prepared.discard(name)
+            result: Optional[Result] = None
+            if name in prepared:
+                try:
+                    result = conn.execute(text(execute_sql), params)
+                except SQLAlchemyError as e:
+                    # 26000: ifade bu oturumda yok (ör. sunucu tarafında DEALLOCATE ALL); düz sorguya dön
+                    if getattr(e.orig, "pgcode", None) != "26000":
+                        raise
+                    conn.rollback()
+                    prepared.discard(name)
+                    if timeout_sql:
+                        conn.execute(text(timeout_sql))
+            current_span().set("prepared", result is not None)
+            if result is None:
+                result = conn.execute(text(safe_sql), params)
+            keys = list(result.keys())
+            rows = [tuple(r) for r in result]
+            current_span().set("rows", len(rows))
+    except SQLAlchemyError as e:
+        raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+
+    if cache is not None:
+        cache.put(cache_key, safe_sql, keys, rows)
+    return keys, rows
+
+
+class StreamingResult:
+    """
+    Sunucu taraflı cursor üzerinden satır satır okunan sonuç.
+    - columns: kolon adları
+    - preview: ilk preview_size satır (bağlantı açılırken okunur)
+    - iter(): önizleme satırları + kalanlar; tüketildiğinde veya close() ile bağlantı bırakılır
+    Yalnızca önizleme gereken çağıranlar kalan satırları hiç çekmeden close() çağırabilir.
+    """
+
+    def __init__(self, conn, result: Result, preview_size: int, batch_size: int):
+        self._conn = conn
+        self._result = result
+        self.columns: List[str] = list(result.keys())
+        self.preview: List[Tuple[Any, ...]] = [tuple(r) for r in result.fetchmany(preview_size)] if preview_size > 0 else []
+        self.batch_size = batch_size
+        self.rows_fetched = len(self.preview)
+        self._consumed = False
+        self.exhausted = preview_size > 0 and len(self.preview) < preview_size
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        if self._consumed:
+            raise RuntimeError("StreamingResult yalnızca bir kez okunabilir.")
+        self._consumed = True
+        try:
+            yield from self.preview
+            if self.exhausted:
+                return
+            while True:
+                batch = self._result.fetchmany(self.batch_size)
+                if not batch:
+                    break
+                self.rows_fetched += len(batch)
+                for r in batch:
+                    yield tuple(r)
+            self.exhausted = True
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._result.close()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self) -> "StreamingResult":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@traced("stream_select")
+def stream_select(engine: Engine, sql: str, timeout_seconds: Optional[int] = None,
+                  params: Optional[Dict[str, Any]] = None, preview_size: int = 10,
+                  batch_size: Optional[int] = None, limit: Optional[int] = None) -> StreamingResult:
+    """
+    execute_select'in akış sürümü: sunucu taraflı cursor (stream_results + yield_per) ile
+    satırları batch_size'lık parçalar halinde çeker; tüm sonuç belleğe alınmaz.
+    limit verilirse ROW_LIMIT_DEFAULT yerine kullanılır (dışa aktarım için).
+    Sonuç cache'ini kullanmaz. Dönen nesne kapatılana/tüketilene kadar bir havuz bağlantısı tutar.
+    """
+    batch_size = batch_size or get_stream_batch_size()
+    safe_sql, timeout_ms = _prepare_select(sql, timeout_seconds, limit=limit)
+    current_span().update(sql=safe_sql, timeout_ms=timeout_ms, batch_size=batch_size)
+
+    conn = engine.connect()
+    try:
+        timeout_sql = _timeout_statement(conn.info, timeout_ms)
+        if timeout_sql:
+            conn.execute(text(timeout_sql))
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(safe_sql), params or {})
+        streaming = StreamingResult(conn, result, preview_size, batch_size)
+    except SQLAlchemyError as e:
+        conn.close()
+        raise RuntimeError(f"Veritabanı hatası: {str(e)}") from e
+    except Exception:
+        conn.close()
+        raise
+    current_span().set("rows", streaming.rows_fetched)
+    return streaming
+
+
+def fetch_preview(engine: Engine, sql: str, max_rows: int = 10, timeout_seconds: Optional[int] = None,
+                  params: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[Tuple[Any, ...]], bool]:
+    """
+    Yalnızca ilk max_rows satırı çeker ve cursor'ı kapatır.
+    Dönüş: (kolonlar, satırlar, daha_fazla_satır_var_mı)
+    """
+    with stream_select(engine, sql, timeout_seconds=timeout_seconds, params=params,
+                       preview_size=max_rows + 1, batch_size=max_rows + 1) as streaming:
+        rows = streaming.preview
+        return streaming.columns, rows[:max_rows], len(rows) > max_rows
@@ -0,0 +1,19 @@
+import threading
+
+# .env dosyası süreç başına bir kez okunur. Modüller import anında ortam değişkeni okuduğu için
+# (DEFAULT_MODEL vb.) her modül kendi başında load_env() çağırır; yalnızca ilk çağrı dosyayı okur.
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env() -> None:
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        _loaded = True
@@ -0,0 +1,117 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Any, Dict, Optional, TextIO
+
+from env import load_env
+
+from columnar import head_rows, is_frame, result_len, to_pandas
+from db import StreamingResult, create_db_engine, stream_select
+
+load_env()
+
+# Büyük sonuçları bellek şişirmeden dosyaya yazma: satırlar sunucu taraflı cursor'dan
+# STREAM_BATCH_SIZE'lık parçalar halinde gelir ve doğrudan CSV/JSONL'e akar.
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def get_export_row_limit() -> int:
+    """
+    Dışa aktarımda uygulanacak LIMIT (ROW_LIMIT_DEFAULT'tan bağımsız, varsayılan 1.000.000).
+    """
+    try:
+        return int(os.getenv("EXPORT_ROW_LIMIT", "1000000"))
+    except ValueError:
+        return 1000000
+
+
+def write_csv(streaming: StreamingResult, fh: TextIO) -> int:
+    writer = csv.writer(fh)
+    writer.writerow(streaming.columns)
+    count = 0
+    for row in streaming:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(streaming: StreamingResult, fh: TextIO) -> int:
+    columns = streaming.columns
+    count = 0
+    for row in streaming:
+        fh.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n")
+        count += 1
+    return count
+
+
+def export_query(engine, sql: str, output_path: str, fmt: Optional[str] = None,
+                 limit: Optional[int] = None, params: Optional[Dict[str, Any]] = None,
+                 timeout_seconds: Optional[int] = None) -> int:
+    """
+    SQL sonucunu akış halinde CSV veya JSONL dosyasına yazar; yazılan satır sayısını döndürür.
+    fmt verilmezse dosya uzantısından çıkarılır.
+    """
+    fmt = (fmt or os.path.splitext(output_path)[1].lstrip(".") or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Desteklenmeyen format: {fmt} (desteklenenler: {', '.join(EXPORT_FORMATS)})")
+
+    writer = write_csv if fmt == "csv" else write_jsonl
+    with stream_select(engine, sql, timeout_seconds=timeout_seconds, params=params, preview_size=0,
+                       limit=limit or get_export_row_limit()) as streaming:
+        with open(output_path, "w", encoding="utf-8", newline="") as fh:
+            return writer(streaming, fh)
+
+
+def export_result(columns, data: Any, output_path: str, fmt: Optional[str] = None) -> int:
+    """
+    Bellekteki bir sonucu (satır listesi, DataFrame veya Arrow Table) CSV/JSONL olarak yazar.
+    """
+    fmt = (fmt or os.path.splitext(output_path)[1].lstrip(".") or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Desteklenmeyen format: {fmt} (desteklenenler: {', '.join(EXPORT_FORMATS)})")
+    if is_frame(data):
+        df = to_pandas(data)
+        if fmt == "csv":
+            df.to_csv(output_path, index=False, encoding="utf-8")
+        else:
+            df.to_json(output_path, orient="records", lines=True, force_ascii=False, date_format="iso")
+        return result_len(data)
+
+    rows = head_rows(data, len(data))
+    with open(output_path, "w", encoding="utf-8", newline="") as fh:
+        if fmt == "csv":
+            writer = csv.writer(fh)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                fh.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SELECT sonucunu CSV/JSONL olarak akış halinde dışa aktar")
+    parser.add_argument("sql", help="Çalıştırılacak SELECT sorgusu")
+    parser.add_argument("-o", "--output", required=True, help="Çıktı dosyası (.csv / .jsonl)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Varsayılan: dosya uzantısı")
+    parser.add_argument("--limit", type=int, help="Azami satır (varsayılan: EXPORT_ROW_LIMIT)")
+    parser.add_argument("--timeout", type=int, help="statement_timeout (sn)")
+    args = parser.parse_args()
+
+    engine = create_db_engine()
+    try:
+        count = export_query(engine, args.sql, args.output, fmt=args.format, limit=args.limit,
+                             timeout_seconds=args.timeout)
+    except Exception as e:
+        print(f"Dışa aktarım başarısız: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        engine.dispose()
+    print(f"{count} satır yazıldı: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+from db import enforce_limit, execute_select, get_row_limit_default
+from pipeline import build_fallback_sqls, extract_search_terms, find_similar_products, needs_product_fallback
+from tracing import current_span, span, traced
+
+# Boş dönen ürün sorgusunun fallback adaylarını tek bir öncelikli sorguda birleştirir.
+# Her aday kendi sırasıyla (_fb_priority) etiketlenir; sunucu sadece sonuç veren en öncelikli
+# adayın satırlarını döndürür. Benzer ürün önerileri aynı anda ikinci bir havuz bağlantısında aranır.
+
+PRIORITY_COL = "_fb_priority"
+ROWNUM_COL = "_fb_rn"
+
+_suggestion_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fallback-suggest")
+
+
+def build_combined_fallback_sql(candidates: List[str], limit: Optional[int] = None) -> str:
+    """
+    Aday SQL'leri UNION ALL ile tek sorguda birleştirir; yalnızca en düşük önceliğe sahip
+    (ilk sonuç veren) adayın satırları döner.
+    """
+    limit = limit or get_row_limit_default()
+    branches = []
+    for i, sql in enumerate(candidates):
+        inner = enforce_limit(sql, limit).strip().rstrip(";")
+        branches.append(
+            f"SELECT {i} AS {PRIORITY_COL}, row_number() OVER () AS {ROWNUM_COL}, q{i}.* FROM ({inner}) AS q{i}"
+        )
+    union = "\nUNION ALL\n".join(branches)
+    return (
+        f"WITH fb AS (\n{union}\n)\n"
+        f"SELECT * FROM fb WHERE {PRIORITY_COL} = (SELECT min({PRIORITY_COL}) FROM fb) "
+        f"ORDER BY {ROWNUM_COL} LIMIT {limit}"
+    )
+
+
+def split_combined_result(columns: List[str], rows: List[Tuple[Any, ...]]
+                          ) -> Tuple[Optional[int], List[str], List[Tuple[Any, ...]]]:
+    """
+    Birleşik sorgu sonucundan öncelik/sıra kolonlarını ayıklar. Dönüş: (kazanan_index, kolonlar, satırlar)
+    """
+    if not rows:
+        return None, columns[2:], []
+    return rows[0][0], columns[2:], [tuple(r[2:]) for r in rows]
+
+
+def _suggest(engine, question: str, sql_query: Optional[str] = None) -> List[str]:
+    for term in extract_search_terms(question, sql_query):
+        similar = find_similar_products(engine, term)
+        if similar:
+            return similar
+    return []
+
+
+def _run_sequential(engine, attempts: List[Tuple[str, str]], max_rows: Optional[int] = None
+                    ) -> Tuple[Optional[int], List[str], List[Tuple[Any, ...]]]:
+    # Birleşik sorgu çalışmazsa (ör. adaylar arasında tip uyuşmazlığı) eski sıralı yola dön
+    for i, (strategy_name, retry_sql) in enumerate(attempts):
+        try:
+            with span("fallback", strategy=strategy_name):
+                columns, rows = execute_select(engine, retry_sql, max_rows=max_rows)
+        except Exception:
+            continue
+        if rows:
+            return i, columns, rows
+    return None, [], []
+
+
+@traced("execute_with_fallbacks")
+def execute_with_fallbacks(engine, sql_query: str, question: str, max_rows: Optional[int] = None
+                           ) -> Tuple[str, List[str], List[Tuple[Any, ...]], Optional[str], List[str]]:
+    """
+    SQL'i çalıştırır; ürün sorgusu boş dönerse tüm fallback adaylarını tek sorguda dener,
+    benzer ürün önerilerini de aynı anda başka bir havuz bağlantısında arar.
+    max_rows verilirse (yalnızca önizleme gerekiyorsa) en fazla o kadar satır çekilir.
+    Dönüş: (çalışan_sql, kolonlar, satırlar, kazanan_strateji, öneriler)
+    """
+    columns, rows = execute_select(engine, sql_query, max_rows=max_rows)
+    if not needs_product_fallback(sql_query, rows):
+        return sql_query, columns, rows, None, []
+
+    attempts = build_fallback_sqls(sql_query)
+    suggestion_future = (
+        _suggestion_pool.submit(_suggest, engine, question, sql_query)
+        if extract_search_terms(question, sql_query) else None
+    )
+
+    winner: Optional[int] = None
+    if attempts:
+        with span("fallback", strategy="combined", candidates=len(attempts)) as sp:
+            try:
+                combined = build_combined_fallback_sql([sql for _name, sql in attempts])
+                winner, columns2, rows2 = split_combined_result(*execute_select(engine, combined, max_rows=max_rows))
+            except Exception as e:
+                sp.set("combined_error", str(e))
+                winner, columns2, rows2 = _run_sequential(engine, attempts, max_rows=max_rows)
+            sp.set("winner", attempts[winner][0] if winner is not None else None)
+        if winner is not None:
+            columns, rows, sql_query = columns2, rows2, attempts[winner][1]
+
+    suggestions: List[str] = []
+    if suggestion_future is not None:
+        try:
+            suggestions = suggestion_future.result() if not rows else []
+        except Exception:
+            suggestions = []
+        if rows:
+            suggestion_future.cancel()
+    current_span().set("suggestions", len(suggestions))
+
+    strategy = attempts[winner][0] if winner is not None else None
+    return sql_query, columns, rows, strategy, suggestions
@@ -0,0 +1,276 @@
+import difflib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from env import load_env
+
+from tracing import current_span, traced
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+load_env()
+
+# Süreç içi bulanık isim indeksi: ürün/şirket/kategori adları trigram'lara bölünür,
+# aday isimler trigram örtüşmesiyle bulunur ve difflib benzerliğiyle sıralanır.
+# Öneriler Postgres'e gitmeden hesaplanır; aynı indeks üretilen SQL'deki literal'leri
+# veritabanındaki tam isimle değiştirmek için de kullanılır (= karşılaştırması btree index kullanabilsin).
+
+# kolon -> bu kolonun okunacağı tablolar
+ENTITY_SOURCES: Dict[str, Tuple[str, ...]] = {
+    "product_name": ("products",),
+    "company_name": ("customers", "suppliers", "shippers"),
+    "category_name": ("categories",),
+}
+
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+_TR_ASCII = str.maketrans({"ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u", "â": "a", "î": "i", "û": "u"})
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# product_name ILIKE '%chai%' / product_name = 'Chai' kalıpları (kolon adı ENTITY_SOURCES'tan)
+_LITERAL_RE = re.compile(
+    r"\b(?P<col>(?:\w+\.)?(?:" + "|".join(ENTITY_SOURCES) + r"))\s*(?P<op>=|ilike|like)\s*'(?P<val>(?:[^']|'')*)'",
+    re.IGNORECASE,
+)
+
+
+def get_fuzzy_index_ttl_seconds() -> int:
+    try:
+        return int(os.getenv("FUZZY_INDEX_TTL_SECONDS", "300"))
+    except ValueError:
+        return 300
+
+
+def is_fuzzy_index_enabled() -> bool:
+    return os.getenv("FUZZY_INDEX_ENABLED", "true").lower() == "true"
+
+
+def normalize_name(value: str) -> str:
+    """
+    Türkçe duyarlı sadeleştirme: I/İ dönüşümü, küçük harf, aksan/Türkçe karakterleri ASCII'ye indirme,
+    harf-rakam dışını tek boşluğa çevirme. ("ÇAY Şekeri" -> "cay sekeri")
+    """
+    s = unicodedata.normalize("NFC", value or "").translate(_TR_LOWER).lower().translate(_TR_ASCII)
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM_RE.sub(" ", s).strip()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """
+    kolon adı (product_name, company_name, ...) başına isim listesi ve trigram -> isim_id ters indeksi.
+    """
+
+    def __init__(self):
+        self._names: Dict[str, List[str]] = {}
+        self._normalized: Dict[str, List[str]] = {}
+        self._postings: Dict[str, Dict[str, List[int]]] = {}
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self, entries: Dict[str, List[str]]) -> None:
+        names: Dict[str, List[str]] = {}
+        normalized: Dict[str, List[str]] = {}
+        postings: Dict[str, Dict[str, List[int]]] = {}
+        for column, values in entries.items():
+            uniq = sorted(set(v for v in values if v))
+            norm = [normalize_name(v) for v in uniq]
+            post: Dict[str, List[int]] = defaultdict(list)
+            for i, n in enumerate(norm):
+                for g in trigrams(n):
+                    post[g].append(i)
+            names[column], normalized[column], postings[column] = uniq, norm, dict(post)
+        # Okuyucular eski indeksi kullanmaya devam eder; referanslar tek seferde değişir
+        with self._lock:
+            self._names, self._normalized, self._postings = names, normalized, postings
+            self.built_at = time.time()
+
+    def is_ready(self) -> bool:
+        return self.built_at > 0
+
+    def is_stale(self) -> bool:
+        ttl = get_fuzzy_index_ttl_seconds()
+        return ttl > 0 and time.time() - self.built_at > ttl
+
+    def size(self) -> Dict[str, int]:
+        return {column: len(values) for column, values in self._names.items()}
+
+    def search(self, term: str, column: str = "product_name", limit: int = 10,
+               min_score: float = 0.3) -> List[Tuple[str, float]]:
+        """
+        Terime en yakın isimleri (isim, skor 0..1) olarak döndürür.
+        Skor: difflib oranı; terimi alt dize olarak içeren isimlere ek puan verilir.
+        """
+        with self._lock:
+            names = self._names.get(column, [])
+            normalized = self._normalized.get(column, [])
+            postings = self._postings.get(column, {})
+        query = normalize_name(term)
+        if not query or not names:
+            return []
+
+        counts: Dict[int, int] = defaultdict(int)
+        for g in trigrams(query):
+            for i in postings.get(g, ()):
+                counts[i] += 1
+        # Trigram örtüşmesi en yüksek adaylar üzerinde pahalı benzerlik hesabı yapılır
+        candidates = sorted(counts, key=counts.get, reverse=True)[:max(limit * 5, 50)]
+
+        scored: List[Tuple[str, float]] = []
+        for i in candidates:
+            cand = normalized[i]
+            score = difflib.SequenceMatcher(None, query, cand).ratio()
+            if query == cand:
+                score = 1.0
+            elif query in cand.split() or cand.startswith(query):
+                score = max(score, 0.9)
+            elif query in cand:
+                score = max(score, 0.8)
+            if score >= min_score:
+                scored.append((names[i], round(score, 4)))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def containing(self, term: str, column: str = "product_name") -> List[str]:
+        # ILIKE '%term%' semantiğinin indeks üzerindeki karşılığı (Türkçe katlamalı)
+        query = normalize_name(term)
+        with self._lock:
+            names = self._names.get(column, [])
+            normalized = self._normalized.get(column, [])
+        return [names[i] for i, n in enumerate(normalized) if query and query in n]
+
+    def canonicalize(self, term: str, column: str = "product_name", min_score: float = 0.85) -> Optional[str]:
+        """
+        Terime karşılık gelen tek bir kayıtlı isim varsa onu döndürür (tam eşleşme veya yüksek skorlu yazım hatası).
+        """
+        hits = self.search(term, column=column, limit=2, min_score=min_score)
+        if not hits:
+            return None
+        if len(hits) > 1 and hits[0][1] == hits[1][1]:
+            return None
+        return hits[0][0]
+
+    @traced("fuzzy_rewrite_literals")
+    def rewrite_literals(self, sql: str) -> str:
+        """
+        Üretilen SQL'deki product_name/company_name/category_name literal'lerini kayıtlı tam isimle değiştirir:
+        - ILIKE '%chai%' yalnızca tek bir isimde geçiyorsa -> = 'Chai'
+        - hiçbir isimde geçmiyorsa ve yazım hatasına benzer tek aday varsa -> = 'Aday'
+        - = 'chai' -> = 'Chai' (kayıtlı yazım)
+        Belirsiz durumlarda SQL değiştirilmez.
+        """
+        rewrites = 0
+
+        def _replace(m: "re.Match[str]") -> str:
+            nonlocal rewrites
+            col, op, raw = m.group("col"), m.group("op").lower(), m.group("val").replace("''", "'")
+            column = col.split(".")[-1].lower()
+            term = raw.strip("%")
+            if not term or "%" in term or ("_" in term and op != "="):
+                return m.group(0)
+            if op == "=":
+                target = self.canonicalize(term, column=column)
+            else:
+                matches = self.containing(term, column=column)
+                if len(matches) == 1:
+                    target = matches[0]
+                elif not matches:
+                    target = self.canonicalize(term, column=column)
+                else:
+                    target = None
+            if not target:
+                return m.group(0)
+            rewrites += 1
+            return f"{col} = '" + target.replace("'", "''") + "'"
+
+        result = _LITERAL_RE.sub(_replace, sql)
+        current_span().set("rewrites", rewrites)
+        return result
+
+
+def load_entity_names(engine: "Engine") -> Dict[str, List[str]]:
+    """
+    ENTITY_SOURCES'taki mevcut tablo/kolonları tek sorguda okur.
+    """
+    from sqlalchemy import text
+
+    pairs = [(table, column) for column, tables in ENTITY_SOURCES.items() for table in tables]
+    with engine.connect() as conn:
+        existing = conn.execute(text("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND column_name = ANY(:columns)
+        """), {"columns": list(ENTITY_SOURCES)}).fetchall()
+        available = {(r[0], r[1]) for r in existing}
+        present = [(t, c) for t, c in pairs if (t, c) in available]
+        entries: Dict[str, List[str]] = {column: [] for column in ENTITY_SOURCES}
+        if not present:
+            return entries
+        union = " UNION ALL ".join(
+            f"SELECT '{c}' AS col, {c}::text AS name FROM {t} WHERE {c} IS NOT NULL" for t, c in present
+        )
+        for col, name in conn.execute(text(union)):
+            entries[col].append(name)
+    return entries
+
+
+_index = FuzzyIndex()
+_engine: Optional["Engine"] = None
+
+
+def get_fuzzy_index() -> Optional[FuzzyIndex]:
+    """
+    Hazır indeks varsa döndürür; TTL dolmuşsa arka planda yenilemeyi tetikler (eski indeks kullanılmaya devam eder).
+    """
+    if not is_fuzzy_index_enabled() or not _index.is_ready():
+        return None
+    if _engine is not None and _index.is_stale():
+        _refresh_in_background()
+    return _index
+
+
+@traced("fuzzy_index.build")
+def build_fuzzy_index(engine: "Engine") -> FuzzyIndex:
+    global _engine
+    _engine = engine
+    _index.load(load_entity_names(engine))
+    current_span().update(**{f"{k}_names": v for k, v in _index.size().items()})
+    return _index
+
+
+def _refresh_in_background() -> None:
+    with _index._lock:
+        if _index._refreshing:
+            return
+        _index._refreshing = True
+
+    def _run() -> None:
+        try:
+            build_fuzzy_index(_engine)
+        except Exception:
+            pass
+        finally:
+            _index._refreshing = False
+
+    threading.Thread(target=_run, name="fuzzy-index-refresh", daemon=True).start()
+
+
+def start_fuzzy_index(engine: "Engine") -> None:
+    """
+    İndeksi başlangıçta arka planda kurar; kurulana kadar öneriler veritabanından gelir.
+    """
+    global _engine
+    if not is_fuzzy_index_enabled():
+        return
+    _engine = engine
+    _refresh_in_background()
@@ -1,19 +1,34 @@
+import atexit
 import os
-from typing import Dict, Any, List
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Any, Iterator, List, Optional, Tuple
 
-from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_exponential
+from env import load_env
 
-# LangChain imports (OpenAI client via OpenRouter-compatible endpoint)
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
+from schema_selector import get_prompt_schema_token_budget, select_schema, tables_in_sql
+from llm_scheduler import get_llm_scheduler
+from tokens import count_message_tokens, count_tokens
+from tracing import current_span, finish_span, start_span, traced
 
-load_dotenv()
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_openai import ChatOpenAI
+
+load_env()
+
+# LangChain/httpx import'u ~1.5 sn sürer (langchain_openai tek başına çoğunluğu); CLI açılışını
+# bekletmemek için ilk istemci ya da prompt kurulurken yüklenir.
 
 DEFAULT_MODEL = os.getenv("OPENROUTER_MODEL", "deepseek/deepseek-chat")
 OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# Çağrı başına istenen azami cevap token'ı (dakikalık token kotası tahmini de bunu kullanır)
+MAX_OUTPUT_TOKENS = 128
+
 
 def _build_headers() -> Dict[str, str]:
     # OpenRouter is OpenAI-compatible with extra headers; basic usage works without extra headers
@@ -28,130 +43,181 @@ def _build_headers() -> Dict[str, str]:
     return headers
 
 
-def get_llm(temperature: float = 0.1) -> ChatOpenAI:
+def get_llm_pool_size() -> int:
+    """
+    Her base_url için açık tutulacak azami HTTP bağlantı sayısı (keep-alive havuzu).
+    """
+    try:
+        return int(os.getenv("LLM_HTTP_POOL_SIZE", "10"))
+    except ValueError:
+        return 10
+
+
+def get_llm_keepalive_seconds() -> float:
+    try:
+        return float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+    except ValueError:
+        return 60.0
+
+
+# Süreç ömrü boyunca yaşayan istemciler:
+# - _HTTP_CLIENTS: base_url başına bir httpx.Client/AsyncClient çifti (TLS + bağlantı havuzu paylaşılır)
+# - _LLM_CLIENTS: (model, temperature, base_url, headers) başına bir ChatOpenAI
+_HTTP_CLIENTS: Dict[str, Tuple["httpx.Client", "httpx.AsyncClient"]] = {}
+_LLM_CLIENTS: Dict[Tuple[Any, ...], "ChatOpenAI"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_http_clients(base_url: str) -> Tuple["httpx.Client", "httpx.AsyncClient"]:
+    clients = _HTTP_CLIENTS.get(base_url)
+    if clients is None:
+        import httpx
+
+        pool_size = get_llm_pool_size()
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=get_llm_keepalive_seconds(),
+        )
+        timeout = httpx.Timeout(60.0, connect=10.0)
+        clients = (
+            httpx.Client(limits=limits, timeout=timeout),
+            httpx.AsyncClient(limits=limits, timeout=timeout),
+        )
+        _HTTP_CLIENTS[base_url] = clients
+    return clients
+
+
+def _openrouter_llm(temperature: float = 0.1) -> "ChatOpenAI":
     """
     Returns a ChatOpenAI configured to talk to OpenRouter (DeepSeek or other OpenRouter models).
+    Aynı (model, temperature, base_url, headers) için süreç boyunca tek istemci döner;
+    alttaki HTTP bağlantıları keep-alive ile yeniden kullanılır.
     """
     if not OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY ortam değişkeni bulunamadı. .env dosyanızı kontrol edin.")
 
+    # LangChain imports (OpenAI client via OpenRouter-compatible endpoint)
+    from langchain_openai import ChatOpenAI
+
     # ChatOpenAI from langchain-openai supports base_url to override the endpoint
     # max_tokens'i küçük tutarak ücretsiz/limitli kredilere takılmayı azalt.
     # Deepseek free sürümler bazen boş içerik döndürebilir. Daha uyumlu bir model zorlayalım (gerekirse .env ile override edilir).
     model = DEFAULT_MODEL or "openai/gpt-3.5-turbo"
-    llm = ChatOpenAI(
-        api_key=OPENROUTER_API_KEY,
-        base_url=OPENROUTER_BASE_URL,
-        model=model,
-        temperature=temperature,
-        default_headers=_build_headers(),
-        max_tokens=256,
-    )
-    return llm
+    headers = _build_headers()
+    key = (model, float(temperature), OPENROUTER_BASE_URL, tuple(sorted(headers.items())))
+
+    with _CLIENTS_LOCK:
+        llm = _LLM_CLIENTS.get(key)
+        if llm is None:
+            http_client, http_async_client = _get_http_clients(OPENROUTER_BASE_URL)
+            llm = ChatOpenAI(
+                api_key=OPENROUTER_API_KEY,
+                base_url=OPENROUTER_BASE_URL,
+                model=model,
+                temperature=temperature,
+                default_headers=headers,
+                max_tokens=256,
+                # Yeniden deneme llm_scheduler'da yapılır; SDK'nın kendi retry'ı 429'ları katlamasın
+                max_retries=0,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _LLM_CLIENTS[key] = llm
+        return llm
+
+
+# Backend adı -> (temperature -> LangChain chat modeli) fabrikası.
+# "openrouter" gerçek sağlayıcıdır; "stub" (llm_stub.py) ağ kullanmayan deterministik test modelidir.
+_LLM_BACKENDS: Dict[str, Callable[[float], "BaseChatModel"]] = {"openrouter": _openrouter_llm}
+_active_backend: Optional[str] = None
 
 
-def _normalize_identifiers_in_text(text: str) -> str:
+def register_llm_backend(name: str, factory: Callable[[float], "BaseChatModel"]) -> None:
+    _LLM_BACKENDS[name] = factory
+
+
+def set_llm_backend(name: Optional[str]) -> None:
     """
-    Basit normalizasyon: 
-    - Türkçe karakterleri ASCII'ye indirger (ör: Ç->C, ç->c, Ğ->G, ğ->g, İ->I, ı->i, Ö->O, ö->o, Ş->S, ş->s, Ü->U, ü->u).
-    - Northwind benzeri alan ve tablo adlarını snake_case (PostgreSQL uyumlu) hale getirir.
-    - Büyük/küçük harf duyarsız tam eşleşmeler için bilineni listeler.
-    Not: Bu yaklaşım güvenli bir 'parser' değildir; yine de sık görülen üretimleri düzeltir.
+    Süreç içinde backend'i değiştirir; None verilirse LLM_BACKEND ortam değişkenine döner.
     """
-    # 1) Türkçe karakter normalizasyonu
-    turkish_map = str.maketrans({
-        "Ç": "C", "ç": "c",
-        "Ğ": "G", "ğ": "g",
-        "İ": "I", "I": "I",  # büyük I aynı kalsın
-        "ı": "i",
-        "Ö": "O", "ö": "o",
-        "Ş": "S", "ş": "s",
-        "Ü": "U", "ü": "u",
-    })
-    text = text.translate(turkish_map)
-
-    # 2) Bilinen kimlik normalizasyonları
-    replacements = {
-        # Tablolar
-        "Order_Details": "order_details",
-        "OrderDetails": "order_details",
-        "Products": "products",
-        "Orders": "orders",
-        "Customers": "customers",
-        "Suppliers": "suppliers",
-        "Categories": "categories",
-        "Employees": "employees",
-        "Shippers": "shippers",
-        # Ortak kolonlar
-        "ProductID": "product_id",
-        "ProductName": "product_name",
-        "SupplierID": "supplier_id",
-        "CategoryID": "category_id",
-        "QuantityPerUnit": "quantity_per_unit",
-        "UnitPrice": "unit_price",
-        "UnitsInStock": "units_in_stock",
-        "UnitsOnOrder": "units_on_order",
-        "ReorderLevel": "reorder_level",
-        "Discontinued": "discontinued",
-        "OrderID": "order_id",
-        "CustomerID": "customer_id",
-        "EmployeeID": "employee_id",
-        "OrderDate": "order_date",
-        "RequiredDate": "required_date",
-        "ShippedDate": "shipped_date",
-        "ShipVia": "ship_via",
-        "Freight": "freight",
-        "ShipName": "ship_name",
-        "ShipAddress": "ship_address",
-        "ShipCity": "ship_city",
-        "ShipRegion": "ship_region",
-        "ShipPostalCode": "ship_postal_code",
-        "ShipCountry": "ship_country",
-        "Unitprice": "unit_price",
-        "Quantity": "quantity",
-        "Discount": "discount",
-        "CompanyName": "company_name",
-        "ContactName": "contact_name",
-        "ContactTitle": "contact_title",
-        "Address": "address",
-        "City": "city",
-        "Region": "region",
-        "PostalCode": "postal_code",
-        "Phone": "phone",
-        "Fax": "fax",
-        "HomePage": "home_page",
-        "CategoryName": "category_name",
-        "Description": "description",
-        "Picture": "picture",
-        "LastName": "last_name",
-        "FirstName": "first_name",
-        "Title": "title",
-        "ReportsTo": "reports_to",
-        "BirthDate": "birth_date",
-        "HireDate": "hire_date",
-        "HomePhone": "home_phone",
-        "Extension": "extension",
-        "Notes": "notes",
-        "Photo": "photo",
-        "PhotoPath": "photo_path",
-        "ShipperID": "shipper_id",
-        # Fonksiyonlar
-        "RANDOM()": "random()",
-        "Random()": "random()",
-        "Random": "random",
-    }
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-    return text
+    global _active_backend
+    _active_backend = name
 
 
-def build_sql_prompt(context_rules: str, schema_text: str, user_question: str) -> List[Any]:
+def get_llm_backend() -> str:
+    return _active_backend or os.getenv("LLM_BACKEND", "openrouter").strip().lower()
+
+
+def get_llm(temperature: float = 0.1) -> "BaseChatModel":
     """
-    Constructs a system+human prompt to ask LLM to produce ONLY a valid PostgreSQL SELECT query.
-    The model must follow constraints from context.md.
+    Seçili backend'e (LLM_BACKEND veya set_llm_backend) göre chat modelini döndürür.
     """
-    # Kuralları ve şemayı olabildiğince kısa ve direkt ver
-    context_rules_short = context_rules.strip()
+    name = get_llm_backend()
+    if name == "stub" and name not in _LLM_BACKENDS:
+        import llm_stub  # noqa: F401  (kendini register_llm_backend ile kaydeder)
+    factory = _LLM_BACKENDS.get(name)
+    if factory is None:
+        raise RuntimeError(f"Bilinmeyen LLM_BACKEND: {name}")
+    return factory(temperature)
+
+
+def llm_client_stats() -> Dict[str, int]:
+    with _CLIENTS_LOCK:
+        return {
+            "llm_clients": len(_LLM_CLIENTS),
+            "http_pools": len(_HTTP_CLIENTS),
+            "pool_size": get_llm_pool_size(),
+        }
+
+
+def close_llm_clients() -> None:
+    """
+    Tüm LLM istemcilerini ve HTTP bağlantı havuzlarını kapatır (kapanışta çağrılır).
+    """
+    with _CLIENTS_LOCK:
+        http_clients = list(_HTTP_CLIENTS.values())
+        _HTTP_CLIENTS.clear()
+        _LLM_CLIENTS.clear()
+    for sync_client, async_client in http_clients:
+        try:
+            sync_client.close()
+        except Exception:
+            pass
+        try:
+            # Async istemci bir event loop'a bağlı olabilir; çalışan loop yoksa burada kapat
+            import asyncio
+            asyncio.run(async_client.aclose())
+        except Exception:
+            pass
+
+
+atexit.register(close_llm_clients)
+
+
+def prewarm_llm(temperature: float = 0.1) -> None:
+    """
+    İstemciyi oluşturur ve OpenRouter'a TCP/TLS bağlantısını önceden açar; böylece cevap çağrısı
+    bağlantı kurulumunu beklemez. Hatalar yok sayılır (asıl çağrı kendi hatasını verir).
+    """
+    try:
+        get_llm(temperature=temperature)
+        if get_llm_backend() == "openrouter":
+            http_client, _ = _get_http_clients(OPENROUTER_BASE_URL)
+            http_client.head(OPENROUTER_BASE_URL, timeout=5.0)
+    except Exception:
+        pass
+
+
+def prewarm_answer_prompt(schema_text: str, user_question: str, sql_query: str) -> None:
+    """
+    build_answer_prompt'un şema bölümünü (tablo seçimi + token sayımı) önceden hesaplayıp cache'e koyar.
+    """
+    if get_prompt_schema_token_budget() > 0:
+        _select_schema_cached(schema_text, user_question, tuple(tables_in_sql(sql_query)))
+
+
+def _compact_schema(schema_text: str) -> str:
     schema_lines = [line.strip() for line in schema_text.strip().splitlines() if line.strip()]
     schema_compact = []
     for ln in schema_lines:
@@ -159,7 +225,40 @@ def build_sql_prompt(context_rules: str, schema_text: str, user_question: str) -
             schema_compact.append(ln[:120] + " ...")
         else:
             schema_compact.append(ln)
-    schema_compact_text = "\n".join(schema_compact[:200])  # şema bilgisini artırdım
+    return "\n".join(schema_compact[:200])  # şema bilgisini artırdım
+
+
+@lru_cache(maxsize=64)
+def _select_schema_cached(schema_text: str, user_question: str, tables: Tuple[str, ...]):
+    # Spekülatif modda cevap prompt'unun şema bölümü SQL çalışırken önceden hesaplanır
+    return select_schema(schema_text, user_question, tables=list(tables) or None)
+
+
+def _schema_for_prompt(schema_text: str, user_question: str, tables: Optional[List[str]] = None) -> str:
+    """
+    PROMPT_SCHEMA_TOKEN_BUDGET > 0 ise soruyla ilgili tabloları bütçeye sığdırarak seçer
+    (bkz. schema_selector); 0 ise eski kırpılmış tam şema gönderilir.
+    """
+    if get_prompt_schema_token_budget() <= 0:
+        return _compact_schema(schema_text)
+    selection = _select_schema_cached(schema_text, user_question, tuple(tables or ()))
+    current_span().update(
+        schema_tokens=selection.tokens,
+        schema_tokens_full=selection.full_tokens,
+        schema_tables=",".join(selection.tables),
+    )
+    return selection.text
+
+
+@traced("build_sql_prompt")
+def build_sql_prompt(context_rules: str, schema_text: str, user_question: str) -> List[Any]:
+    """
+    Constructs a system+human prompt to ask LLM to produce ONLY a valid PostgreSQL SELECT query.
+    The model must follow constraints from context.md.
+    """
+    # Kuralları ve şemayı olabildiğince kısa ve direkt ver
+    context_rules_short = context_rules.strip()
+    schema_compact_text = _schema_for_prompt(schema_text, user_question)
 
     system = f"""Aşağıdaki kurallara SIKI sıkıya uyarak SADECE bir PostgreSQL SELECT sorgusu üret:
 - Şemadaki tablo/kolon adlarını AYNEN (snake_case) kullan.
@@ -179,24 +278,41 @@ def build_sql_prompt(context_rules: str, schema_text: str, user_question: str) -
     user = f"""Kullanıcı sorusu (Türkçe): {user_question}
 
 Tek satır SELECT yaz. Ürün adları için ILIKE kullan. Başına/sonuna hiçbir açıklama/kod bloğu ekleme."""
+    current_span().update(prompt_chars=len(system) + len(user), prompt_tokens_estimate=count_tokens(system) + count_tokens(user))
+    from langchain_core.messages import HumanMessage, SystemMessage
     return [SystemMessage(content=system), HumanMessage(content=user)]
 
 
-def build_answer_prompt(context_rules: str, schema_text: str, sql_query: str, raw_rows_preview: str, columns: List[str], user_question: str) -> List[Any]:
+def build_sql_regeneration_prompt(context_rules: str, schema_text: str, user_question: str, rejected_sql: str,
+                                  reason: str) -> List[Any]:
+    """
+    Maliyet kapısının reddettiği SQL'i ve ret gerekçesini (plan özeti) ekleyerek aynı soruyu yeniden sorar.
+    """
+    messages = build_sql_prompt(context_rules, schema_text, user_question)
+    feedback = f"""Bu sorgu veritabanında çalıştırılmadı çünkü çok pahalı:
+{reason}
+
+Aynı soruyu cevaplayan daha ucuz tek satır SELECT yaz:
+- JOIN koşullarını eksiksiz yaz (kartezyen çarpım olmasın), soruya gerekmeyen tabloları çıkar.
+- Gerekmedikçe tüm tabloyu sıralama; filtreyi (WHERE) ve LIMIT'i mümkün olduğunca erken uygula.
+- Rastgele seçimde ORDER BY random() yerine TABLESAMPLE SYSTEM (...) kullan."""
+    from langchain_core.messages import AIMessage, HumanMessage
+    return messages + [AIMessage(content=rejected_sql), HumanMessage(content=feedback)]
+
+
+@traced("build_answer_prompt")
+def build_answer_prompt(context_rules: str, schema_text: str, sql_query: str, raw_rows_preview: str, columns: List[str], user_question: str,
+                        numeric_summary: str = "") -> List[Any]:
     """
     Constructs a prompt to ask LLM to transform raw SQL results into a concise, Turkish answer.
+    numeric_summary: önizlemeye sığmayan sonuçlar için tüm satırlar üzerinden satır sayısı ve sayısal özet.
     """
     cols_fmt = ", ".join(columns) if columns else "(kolon yok)"
+    summary_section = f"\nSonuç özeti (tüm satırlar):\n{numeric_summary}\n" if numeric_summary else ""
     # Token tasarrufu için yine özet kullan
     context_rules_short = context_rules.strip()
-    schema_lines = [line.strip() for line in schema_text.strip().splitlines() if line.strip()]
-    schema_compact = []
-    for ln in schema_lines:
-        if len(ln) > 120:
-            schema_compact.append(ln[:120] + " ...")
-        else:
-            schema_compact.append(ln)
-    schema_compact_text = "\n".join(schema_compact[:200])
+    # Cevap için yalnızca SQL'in kullandığı tablolar (ve komşuları) yeterli
+    schema_compact_text = _schema_for_prompt(schema_text, user_question, tables=tables_in_sql(sql_query))
 
     system = f"""Sen bir veri analizi asistanısın. Görevlerin:
 - SQL sonucu gibi ham veriyi Türkçe, kısa ve anlaşılır final cevaba dönüştür.
@@ -217,30 +333,40 @@ Bağlam Kuralları (özet):
 Kolonlar: {cols_fmt}
 Önizleme (ilk satırlar):
 {raw_rows_preview}
-
+{summary_section}
 Lütfen Türkçe, kısa ve net nihai cevabı ver."""
+    current_span().update(prompt_chars=len(system) + len(user), prompt_tokens_estimate=count_tokens(system) + count_tokens(user))
+    from langchain_core.messages import HumanMessage, SystemMessage
     return [SystemMessage(content=system), HumanMessage(content=user)]
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=8))
-def ask_llm(messages: List[Any], temperature: float = 0.1, mode: str = "sql") -> str:
-    """
-    mode:
-      - "sql": SQL üretimi için agresif post-process ve 'select 1' fallback uygula.
-      - "answer": Doğal dil cevabı olduğu gibi döndür; SQL temizlemesi ve fallback yapma.
-    """
-    llm = get_llm(temperature=temperature)
-    # Bazı sağlayıcılarda max_tokens param adı desteklenmeyebilir; güvenli çağrı yap
-    try:
-        resp = llm.invoke(messages, max_tokens=128)  # daha kısa cevap zorlaması
-    except TypeError:
-        resp = llm.invoke(messages)
-    # İçeriği ayıkla
-    if isinstance(resp, AIMessage):
-        content = (resp.content or "").strip()
-    else:
-        content = str(getattr(resp, "content", "") or "").strip()
+def _token_usage(resp: Any) -> Dict[str, int]:
+    # LangChain sürümüne göre usage_metadata veya response_metadata["token_usage"] dolu olur
+    usage = getattr(resp, "usage_metadata", None) or {}
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+    meta = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+    if meta:
+        return {"prompt_tokens": meta.get("prompt_tokens", 0), "completion_tokens": meta.get("completion_tokens", 0)}
+    return {}
+
+
+def _request_cost(messages: List[Any]) -> int:
+    # Zamanlayıcının token kovası için tahmin: prompt (tiktoken) + azami cevap
+    return count_message_tokens(messages) + MAX_OUTPUT_TOKENS
+
+
+def _used_tokens(resp: Any) -> Optional[int]:
+    usage = _token_usage(resp)
+    return usage["prompt_tokens"] + usage["completion_tokens"] if usage else None
+
 
+def _response_content(resp: Any) -> str:
+    # İçeriği ayıkla (AIMessage ya da content alanı olan herhangi bir yanıt)
+    return str(getattr(resp, "content", "") or "").strip()
+
+
+def _postprocess_llm_output(content: str, mode: str) -> str:
     if mode == "answer":
         # Doğal dil cevabı aynen döndür (en fazla ufak backtick temizliği)
         return content
@@ -274,3 +400,173 @@ def ask_llm(messages: List[Any], temperature: float = 0.1, mode: str = "sql") ->
         selected = "select 1"
 
     return selected
+
+
+@traced("ask_llm")
+def ask_llm(messages: List[Any], temperature: float = 0.1, mode: str = "sql") -> str:
+    """
+    mode:
+      - "sql": SQL üretimi için agresif post-process ve 'select 1' fallback uygula.
+      - "answer": Doğal dil cevabı olduğu gibi döndür; SQL temizlemesi ve fallback yapma.
+    Çağrı paylaşılan zamanlayıcıdan geçer (hız sınırı, öncelik şeridi, Retry-After, devre kesici).
+    """
+    current_span().update(mode=mode, temperature=temperature)
+    llm = get_llm(temperature=temperature)
+
+    def _invoke() -> Any:
+        # Bazı sağlayıcılarda max_tokens param adı desteklenmeyebilir; güvenli çağrı yap
+        try:
+            return llm.invoke(messages, max_tokens=MAX_OUTPUT_TOKENS)  # daha kısa cevap zorlaması
+        except TypeError:
+            return llm.invoke(messages)
+
+    resp = get_llm_scheduler().call(_invoke, _request_cost(messages), usage=_used_tokens)
+    current_span().update(**_token_usage(resp))
+    return _postprocess_llm_output(_response_content(resp), mode)
+
+
+@traced("ask_llm")
+async def ask_llm_async(messages: List[Any], temperature: float = 0.1, mode: str = "sql") -> str:
+    """
+    ask_llm'in asyncio karşılığı (LangChain ainvoke). Aynı zamanlayıcı ve post-process kuralları geçerlidir.
+    """
+    current_span().update(mode=mode, temperature=temperature)
+    llm = get_llm(temperature=temperature)
+
+    async def _invoke() -> Any:
+        try:
+            return await llm.ainvoke(messages, max_tokens=MAX_OUTPUT_TOKENS)
+        except TypeError:
+            return await llm.ainvoke(messages)
+
+    resp = await get_llm_scheduler().call_async(_invoke, _request_cost(messages), usage=_used_tokens)
+    current_span().update(**_token_usage(resp))
+    return _postprocess_llm_output(_response_content(resp), mode)
+
+
+def is_answer_streaming_enabled() -> bool:
+    return os.getenv("ANSWER_STREAMING", "true").lower() == "true"
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else str(content or "")
+
+
+def _first_token(stream: Iterator[Any]) -> Optional[str]:
+    # Bazı sağlayıcılar önce boş (yalnızca rol bilgisi taşıyan) parça gönderir
+    for chunk in stream:
+        text = _chunk_text(chunk)
+        if text:
+            return text
+    return None
+
+
+def stream_llm(messages: List[Any], temperature: float = 0.1) -> Iterator[str]:
+    """
+    Cevap modunda token'ları geldikçe döndürür (LangChain stream).
+    Yeniden deneme yalnızca ilk token gelene kadar yapılır; sonrasındaki hata çağırana iletilir
+    (kullanıcı yarım cevabın tekrarını görmesin). Zamanlayıcı slotu akış bitene kadar tutulur.
+    ttft_ms span'e yazılır.
+    """
+    sp = start_span("ask_llm", mode="answer", temperature=temperature, stream=True)
+    started = time.perf_counter()
+    chunks = 0
+    scheduler = get_llm_scheduler()
+    permit = None
+    streamed: List[str] = []
+
+    def _open() -> Tuple[Iterator[Any], Optional[str]]:
+        try:
+            stream = iter(llm.stream(messages, max_tokens=MAX_OUTPUT_TOKENS))
+            return stream, _first_token(stream)
+        except TypeError:
+            stream = iter(llm.stream(messages))
+            return stream, _first_token(stream)
+
+    try:
+        llm = get_llm(temperature=temperature)
+        (stream, first), permit = scheduler.run(_open, _request_cost(messages))
+        sp.set("ttft_ms", round((time.perf_counter() - started) * 1000, 3))
+        if first is not None:
+            chunks += 1
+            streamed.append(first)
+            yield first
+        for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                chunks += 1
+                streamed.append(text)
+                yield text
+    except GeneratorExit:
+        # Çağıran akışı erken bıraktı (ör. istemci bağlantıyı kapattı)
+        if permit is not None:
+            scheduler.release(permit)
+        sp.update(chunks=chunks, abandoned=True)
+        finish_span(sp)
+        raise
+    except BaseException as e:
+        if permit is not None:
+            scheduler.release(permit, error=e)
+        sp.set("chunks", chunks)
+        finish_span(sp, e)
+        raise
+    scheduler.release(permit, used_tokens=count_message_tokens(messages) + count_tokens("".join(streamed)))
+    sp.set("chunks", chunks)
+    finish_span(sp)
+
+
+async def astream_llm(messages: List[Any], temperature: float = 0.1) -> AsyncIterator[str]:
+    """
+    stream_llm'in asyncio karşılığı (LangChain astream); aynı "yalnızca ilk token'a kadar retry" kuralı.
+    """
+    sp = start_span("ask_llm", mode="answer", temperature=temperature, stream=True)
+    started = time.perf_counter()
+    chunks = 0
+    scheduler = get_llm_scheduler()
+    permit = None
+    streamed: List[str] = []
+
+    async def _first(**kwargs: Any) -> Tuple[AsyncIterator[Any], Optional[str]]:
+        stream = llm.astream(messages, **kwargs).__aiter__()
+        async for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                return stream, text
+        return stream, None
+
+    async def _open() -> Tuple[AsyncIterator[Any], Optional[str]]:
+        try:
+            return await _first(max_tokens=MAX_OUTPUT_TOKENS)
+        except TypeError:
+            return await _first()
+
+    try:
+        llm = get_llm(temperature=temperature)
+        (stream, first), permit = await scheduler.run_async(_open, _request_cost(messages))
+        sp.set("ttft_ms", round((time.perf_counter() - started) * 1000, 3))
+        if first is not None:
+            chunks += 1
+            streamed.append(first)
+            yield first
+        async for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                chunks += 1
+                streamed.append(text)
+                yield text
+    except GeneratorExit:
+        if permit is not None:
+            scheduler.release(permit)
+        sp.update(chunks=chunks, abandoned=True)
+        finish_span(sp)
+        raise
+    except BaseException as e:
+        if permit is not None:
+            scheduler.release(permit, error=e)
+        sp.set("chunks", chunks)
+        finish_span(sp, e)
+        raise
+    scheduler.release(permit, used_tokens=count_message_tokens(messages) + count_tokens("".join(streamed)))
+    sp.set("chunks", chunks)
+    finish_span(sp)
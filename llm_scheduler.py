@@ -0,0 +1,638 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from env import load_env
+
+from tracing import current_span, span
+
+load_env()
+
+# LLM çağrıları için süreç genelinde paylaşılan zamanlayıcı (tüm thread'ler ve event loop'lar tek kuyruk):
+# - token bucket: dakikada istek (LLM_RATE_LIMIT_RPM) ve dakikada token (LLM_RATE_LIMIT_TPM, tiktoken ile sayılır).
+#   Kova eksiye düşebilir; sıradaki istek açık kapanana kadar bekler, böylece uzun vadede hız kotaya eşit kalır.
+# - öncelik şeritleri: "interactive" (CLI/servis) her zaman "batch"ten önce kabul edilir; batch en fazla
+#   LLM_MAX_CONCURRENCY - LLM_INTERACTIVE_RESERVED eşzamanlı çağrı tutabilir.
+# - 429: Retry-After (yoksa jitter'lı üstel bekleme) kadar TÜM kuyruk duraklatılır ve kovalar boşaltılır;
+#   duraklama bitince istekler aynı anda değil kova hızında sırayla devam eder. Yeniden denenen istek sırasını korur.
+# - devre kesici: sağlayıcı arızaları (5xx, bağlantı, zaman aşımı) üst üste LLM_BREAKER_FAILURES kez olursa
+#   devre LLM_BREAKER_RESET_SECONDS boyunca açılır ve çağrılar beklemeden LlmUnavailableError ile döner;
+#   süre dolunca tek bir deneme isteği geçer, başarılıysa devre kapanır.
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANE_RANK = {INTERACTIVE: 0, BATCH: 1}
+
+# Kuyrukta başta olmayan bekleyenlerin en uzun uyuma süresi (bildirim kaçarsa diye)
+_IDLE_WAIT_SECONDS = 0.5
+
+_lane: ContextVar[str] = ContextVar("llm_lane", default=INTERACTIVE)
+
+
+def get_llm_rate_limit_rpm() -> float:
+    """
+    Dakikada azami LLM isteği (LLM_RATE_LIMIT_RPM, varsayılan 0 = sınırsız).
+    """
+    try:
+        return float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+    except ValueError:
+        return 0.0
+
+
+def get_llm_rate_limit_tpm() -> float:
+    """
+    Dakikada azami token (prompt + cevap; LLM_RATE_LIMIT_TPM, varsayılan 0 = sınırsız).
+    """
+    try:
+        return float(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+    except ValueError:
+        return 0.0
+
+
+def get_llm_rate_burst_seconds() -> float:
+    """
+    Kovanın kaç saniyelik kotayı biriktirebileceği (LLM_RATE_BURST_SECONDS, varsayılan 2).
+    Küçük tutulur: dakikalık kota tek seferde harcanıp sonra beklenmez.
+    """
+    try:
+        return float(os.getenv("LLM_RATE_BURST_SECONDS", "2"))
+    except ValueError:
+        return 2.0
+
+
+def get_llm_max_concurrency() -> int:
+    """
+    Aynı anda sağlayıcıda bekleyen azami çağrı (LLM_MAX_CONCURRENCY, varsayılan LLM_HTTP_POOL_SIZE ya da 10).
+    """
+    try:
+        return int(os.getenv("LLM_MAX_CONCURRENCY") or os.getenv("LLM_HTTP_POOL_SIZE", "10"))
+    except ValueError:
+        return 10
+
+
+def get_llm_interactive_reserved() -> int:
+    try:
+        return int(os.getenv("LLM_INTERACTIVE_RESERVED", "1"))
+    except ValueError:
+        return 1
+
+
+def get_llm_max_attempts() -> int:
+    try:
+        return int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+    except ValueError:
+        return 3
+
+
+def get_llm_backoff_base_seconds() -> float:
+    try:
+        return float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    except ValueError:
+        return 1.0
+
+
+def get_llm_backoff_max_seconds() -> float:
+    try:
+        return float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+    except ValueError:
+        return 8.0
+
+
+def get_llm_breaker_failures() -> int:
+    try:
+        return int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    except ValueError:
+        return 5
+
+
+def get_llm_breaker_reset_seconds() -> float:
+    try:
+        return float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    except ValueError:
+        return 30.0
+
+
+def get_llm_queue_timeout_seconds() -> float:
+    """
+    Bir isteğin kuyrukta bekleyebileceği azami süre (LLM_QUEUE_TIMEOUT_SECONDS, varsayılan 120).
+    """
+    try:
+        return float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+    except ValueError:
+        return 120.0
+
+
+class LlmUnavailableError(RuntimeError):
+    """
+    Devre açık ya da istek kuyrukta zaman aşımına uğradı; sağlayıcıya gidilmedi.
+    """
+
+
+def current_llm_lane() -> str:
+    return _lane.get()
+
+
+@contextmanager
+def llm_lane(lane: str) -> Iterator[None]:
+    """
+    Bu blok içindeki LLM çağrılarının önceliği: with llm_lane(BATCH): ...
+    (contextvar; thread havuzuna gönderilen işler şeridi kendi içinde ayarlamalıdır.)
+    """
+    if lane not in LANE_RANK:
+        raise ValueError(f"Bilinmeyen LLM şeridi: {lane}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+# --- Hata sınıflandırma ---
+
+RATE_LIMITED = "rate_limited"   # 429: sağlayıcı ayakta, kota doldu
+UNAVAILABLE = "unavailable"     # 5xx, bağlantı, zaman aşımı: devre kesiciye sayılır
+FATAL = "fatal"                 # 4xx, yapılandırma hatası vb.: yeniden denenmez
+
+_TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceUnavailableError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout", "ReadError",
+    "RemoteProtocolError", "ServerDisconnectedError",
+}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_llm_error(exc: BaseException) -> str:
+    status = _status_code(exc)
+    if status == 429 or type(exc).__name__ == "RateLimitError":
+        return RATE_LIMITED
+    if status is not None:
+        return UNAVAILABLE if status >= 500 or status == 408 else FATAL
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return UNAVAILABLE
+    if type(exc).__name__ in _TRANSIENT_ERROR_NAMES:
+        return UNAVAILABLE
+    return FATAL
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Yanıttaki Retry-After (saniye ya da HTTP tarihi) / retry-after-ms başlığı; yoksa None.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    def _get(name: str) -> Optional[str]:
+        return headers.get(name) or headers.get(name.title())
+
+    value = _get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = _get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int, base: Optional[float] = None, cap: Optional[float] = None) -> float:
+    """
+    Jitter'lı üstel bekleme: üst sınırın yarısı sabit, yarısı rastgele (işçiler aynı anda geri dönmesin).
+    """
+    base = get_llm_backoff_base_seconds() if base is None else base
+    cap = get_llm_backoff_max_seconds() if cap is None else cap
+    ceiling = min(cap, base * (2 ** max(0, attempt - 1)))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class TokenBucket:
+    """
+    Dakikalık hızla dolan kova. consume() kovayı eksiye düşürebilir (büyük istek bir kez geçer,
+    sonrakiler borç kapanana kadar bekler). rate_per_minute <= 0 ise sınırsız.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float, min_capacity: float = 1.0):
+        self.rate = max(0.0, rate_per_minute) / 60.0
+        self.capacity = max(min_capacity, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.limited:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        if self.limited:
+            self._refill(now)
+            self.level -= amount
+
+    def adjust(self, delta: float) -> None:
+        # Tahmin ile gerçek kullanım arasındaki fark (pozitif = fazla harcandı)
+        if self.limited:
+            self.level = min(self.capacity, self.level - delta)
+
+    def drain(self, now: float) -> None:
+        if self.limited:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.reset_seconds - now)
+
+    def rejects(self, now: float) -> bool:
+        """
+        Durumu değiştirmeden: şu an yeni çağrı beklemeden reddedilir mi?
+        """
+        if self.state == self.OPEN:
+            return self.retry_in(now) > 0
+        return self.state == self.HALF_OPEN and self._probe_in_flight
+
+    def admit(self, now: float) -> bool:
+        if self.state == self.OPEN and self.retry_in(now) <= 0:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_abandoned(self) -> None:
+        # Çağrı sonuçlanmadan iptal edildi (CancelledError, Ctrl+C): sağlayıcı hakkında bilgi yok;
+        # durum değişmez, yalnızca deneme hakkı sonraki isteğe geçer
+        self._probe_in_flight = False
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = now
+            self._probe_in_flight = False
+
+
+def _usage_or_none(usage: Optional[Callable[[Any], Optional[int]]], result: Any) -> Optional[int]:
+    # Kullanım okunamazsa tahmin geçerli kalır; slot her durumda bırakılmalı
+    if usage is None:
+        return None
+    try:
+        return usage(result)
+    except Exception:
+        return None
+
+
+@dataclass
+class Permit:
+    lane: str
+    cost: int
+    seq: int                 # yeniden denemede kuyruk sırası korunur
+    queued_ms: float
+
+
+class LlmScheduler:
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, interactive_reserved: Optional[int] = None,
+                 breaker_failures: Optional[int] = None, breaker_reset_seconds: Optional[float] = None,
+                 burst_seconds: Optional[float] = None):
+        burst = get_llm_rate_burst_seconds() if burst_seconds is None else burst_seconds
+        self.requests = TokenBucket(get_llm_rate_limit_rpm() if rpm is None else rpm, burst)
+        self.tokens = TokenBucket(get_llm_rate_limit_tpm() if tpm is None else tpm, burst, min_capacity=1000.0)
+        self.max_concurrency = max(1, max_concurrency or get_llm_max_concurrency())
+        reserved = get_llm_interactive_reserved() if interactive_reserved is None else interactive_reserved
+        self.batch_max_concurrency = max(1, self.max_concurrency - max(0, reserved))
+        self.breaker = CircuitBreaker(
+            get_llm_breaker_failures() if breaker_failures is None else breaker_failures,
+            get_llm_breaker_reset_seconds() if breaker_reset_seconds is None else breaker_reset_seconds,
+        )
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue: List[Tuple[int, int]] = []          # (şerit sırası, seq) min-heap
+        self._seq = itertools.count()
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._in_flight = {lane: 0 for lane in LANE_RANK}
+        self._paused_until = 0.0
+        self._consecutive_rate_limits = 0
+        self._stats = {"admitted": 0, "rate_limited": 0, "unavailable": 0, "rejected": 0, "abandoned": 0,
+                       "queued_ms": 0.0}
+
+    # --- kuyruk ---
+
+    def _notify_locked(self) -> None:
+        self._cond.notify_all()
+        for loop, event in list(self._async_waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop kapanmış
+                self._async_waiters.discard((loop, event))
+
+    def _enqueue_locked(self, lane: str, seq: Optional[int], now: float) -> Tuple[int, int]:
+        if self.breaker.rejects(now):
+            self._stats["rejected"] += 1
+            raise LlmUnavailableError(
+                f"LLM sağlayıcısı yanıt vermiyor; devre kesici açık ({self.breaker.retry_in(now):.1f} sn sonra denenecek)."
+            )
+        ticket = (LANE_RANK[lane], next(self._seq) if seq is None else seq)
+        heapq.heappush(self._queue, ticket)
+        self._notify_locked()
+        return ticket
+
+    def _dequeue_locked(self, ticket: Tuple[int, int]) -> None:
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._notify_locked()
+
+    def _try_admit_locked(self, ticket: Tuple[int, int], lane: str, cost: int, now: float) -> Optional[float]:
+        """
+        Kabul edilirse None, edilmezse tekrar bakmadan önce beklenecek süre (sn).
+        Yalnızca kuyruğun başındaki istek kabul edilebilir (şerit önceliği, şerit içinde FIFO).
+        """
+        if self._queue[0] != ticket:
+            return _IDLE_WAIT_SECONDS
+        busy = sum(self._in_flight.values())
+        if busy >= self.max_concurrency or (lane == BATCH and busy >= self.batch_max_concurrency):
+            return _IDLE_WAIT_SECONDS
+        wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+        if wait > 0:
+            return wait
+        if not self.breaker.admit(now):
+            self._stats["rejected"] += 1
+            raise LlmUnavailableError("LLM sağlayıcısı yanıt vermiyor; devre kesici açık.")
+        heapq.heappop(self._queue)
+        self.requests.consume(1, now)
+        self.tokens.consume(cost, now)
+        self._in_flight[lane] += 1
+        self._stats["admitted"] += 1
+        self._notify_locked()
+        return None
+
+    def acquire(self, cost: int, lane: Optional[str] = None, seq: Optional[int] = None,
+                timeout: Optional[float] = None) -> Permit:
+        lane = lane or current_llm_lane()
+        started = time.monotonic()
+        deadline = started + (get_llm_queue_timeout_seconds() if timeout is None else timeout)
+        with self._cond:
+            ticket = self._enqueue_locked(lane, seq, started)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_admit_locked(ticket, lane, cost, now)
+                    if wait is None:
+                        break
+                    if now >= deadline:
+                        raise LlmUnavailableError("LLM isteği kuyrukta zaman aşımına uğradı.")
+                    self._cond.wait(min(wait, deadline - now))
+            except BaseException:
+                self._dequeue_locked(ticket)
+                raise
+            return self._permit_locked(lane, cost, ticket, started)
+
+    async def acquire_async(self, cost: int, lane: Optional[str] = None, seq: Optional[int] = None,
+                            timeout: Optional[float] = None) -> Permit:
+        lane = lane or current_llm_lane()
+        started = time.monotonic()
+        deadline = started + (get_llm_queue_timeout_seconds() if timeout is None else timeout)
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            ticket = self._enqueue_locked(lane, seq, started)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = self._try_admit_locked(ticket, lane, cost, now)
+                    if wait is None:
+                        return self._permit_locked(lane, cost, ticket, started)
+                    waiter[1].clear()
+                if now >= deadline:
+                    raise LlmUnavailableError("LLM isteği kuyrukta zaman aşımına uğradı.")
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(wait, deadline - now))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                self._dequeue_locked(ticket)
+            raise
+        finally:
+            with self._lock:
+                self._async_waiters.discard(waiter)
+
+    def _permit_locked(self, lane: str, cost: int, ticket: Tuple[int, int], started: float) -> Permit:
+        queued_ms = (time.monotonic() - started) * 1000
+        self._stats["queued_ms"] += queued_ms
+        return Permit(lane=lane, cost=cost, seq=ticket[1], queued_ms=queued_ms)
+
+    def release(self, permit: Permit, used_tokens: Optional[int] = None,
+                error: Optional[BaseException] = None) -> Optional[float]:
+        """
+        Çağrı bittiğinde slotu bırakır, token tahminini gerçek kullanımla düzeltir ve sonucu devre
+        kesiciye işler. Exception olmayan hatalar (CancelledError, KeyboardInterrupt) nötr sayılır:
+        slot ve deneme hakkı bırakılır, devre kesiciye başarı ya da arıza olarak yazılmaz.
+        Dönüş: hata yeniden denenebilirse tekrar kuyruğa girmeden önce beklenecek süre,
+        denenemezse (ya da hata yoksa) None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight[permit.lane] -= 1
+            delay: Optional[float] = None
+            if error is None:
+                self.breaker.record_success()
+                self._consecutive_rate_limits = 0
+                if used_tokens is not None:
+                    self.tokens.adjust(used_tokens - permit.cost)
+            elif not isinstance(error, Exception):
+                self._stats["abandoned"] += 1
+                self.breaker.record_abandoned()
+            else:
+                kind = classify_llm_error(error)
+                if kind == RATE_LIMITED:
+                    # Sağlayıcı ayakta; tüm kuyruk Retry-After kadar durur, kovalar boşaltılır
+                    self.breaker.record_success()
+                    self._stats["rate_limited"] += 1
+                    self._consecutive_rate_limits += 1
+                    pause = retry_after_seconds(error)
+                    if pause is None:
+                        pause = backoff_seconds(self._consecutive_rate_limits)
+                    self._paused_until = max(self._paused_until, now + pause)
+                    self.requests.drain(now)
+                    self.tokens.drain(now)
+                    delay = 0.0
+                elif kind == UNAVAILABLE:
+                    self._stats["unavailable"] += 1
+                    self.breaker.record_failure(now)
+                    delay = 0.0
+                else:
+                    # Sağlayıcı cevap verdi (ör. 400/401): devre için başarı sayılır, yeniden denenmez
+                    self.breaker.record_success()
+                    self.tokens.adjust(-permit.cost)
+            self._notify_locked()
+            return delay
+
+    def circuit_open(self) -> bool:
+        with self._lock:
+            return self.breaker.rejects(time.monotonic())
+
+    def pause_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    # --- yeniden denemeli çağrı ---
+
+    def _record_retry(self, attempt: int, wait_s: float, error: BaseException) -> None:
+        # Her yeniden denemeyi ayrı bir span olarak kaydet
+        with span("ask_llm.retry", attempt=attempt, retries=1, wait_s=round(wait_s, 3),
+                  error=f"{type(error).__name__}: {error}"):
+            pass
+
+    def _retry_wait(self, attempt: int, error: BaseException) -> float:
+        # 429'da bekleme kuyruk duraklatmasıyla yapılır; arızada istek kendi jitter'lı süresini bekler
+        if classify_llm_error(error) == RATE_LIMITED:
+            self._record_retry(attempt, self.pause_remaining(), error)
+            return 0.0
+        wait_s = backoff_seconds(attempt)
+        self._record_retry(attempt, wait_s, error)
+        return wait_s
+
+    def run(self, fn: Callable[[], T], cost: int, lane: Optional[str] = None) -> Tuple[T, Permit]:
+        """
+        fn'i kuyruk + yeniden deneme kurallarıyla çalıştırır. Başarılı sonucun permit'i bırakılmaz;
+        çağıran (ör. akış bitince) release() çağırmalıdır.
+        """
+        lane = lane or current_llm_lane()
+        attempts = max(1, get_llm_max_attempts())
+        seq = None
+        queued_ms = 0.0
+        for attempt in range(1, attempts + 1):
+            permit = self.acquire(cost, lane, seq=seq)
+            seq = permit.seq
+            queued_ms += permit.queued_ms
+            current_span().update(llm_lane=lane, llm_queue_ms=round(queued_ms, 3))
+            try:
+                return fn(), permit
+            except Exception as e:
+                # Devre bu hatayla açıldıysa beklemek yerine asıl hata döner
+                if self.release(permit, error=e) is None or attempt >= attempts or self.circuit_open():
+                    raise
+                wait_s = self._retry_wait(attempt, e)
+            except BaseException as e:
+                # İptal/kesinti: slot ve (varsa) yarı açık devre deneme hakkı geri verilir
+                self.release(permit, error=e)
+                raise
+            if wait_s > 0:
+                time.sleep(wait_s)
+        raise AssertionError("unreachable")
+
+    async def run_async(self, fn: Callable[[], Awaitable[T]], cost: int,
+                        lane: Optional[str] = None) -> Tuple[T, Permit]:
+        lane = lane or current_llm_lane()
+        attempts = max(1, get_llm_max_attempts())
+        seq = None
+        queued_ms = 0.0
+        for attempt in range(1, attempts + 1):
+            permit = await self.acquire_async(cost, lane, seq=seq)
+            seq = permit.seq
+            queued_ms += permit.queued_ms
+            current_span().update(llm_lane=lane, llm_queue_ms=round(queued_ms, 3))
+            try:
+                return await fn(), permit
+            except Exception as e:
+                # Devre bu hatayla açıldıysa beklemek yerine asıl hata döner
+                if self.release(permit, error=e) is None or attempt >= attempts or self.circuit_open():
+                    raise
+                wait_s = self._retry_wait(attempt, e)
+            except BaseException as e:
+                # İptal/kesinti: slot ve (varsa) yarı açık devre deneme hakkı geri verilir
+                self.release(permit, error=e)
+                raise
+            if wait_s > 0:
+                await asyncio.sleep(wait_s)
+        raise AssertionError("unreachable")
+
+    def call(self, fn: Callable[[], T], cost: int, lane: Optional[str] = None,
+             usage: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        result, permit = self.run(fn, cost, lane)
+        self.release(permit, used_tokens=_usage_or_none(usage, result))
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], cost: int, lane: Optional[str] = None,
+                         usage: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        result, permit = await self.run_async(fn, cost, lane)
+        self.release(permit, used_tokens=_usage_or_none(usage, result))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "queued": len(self._queue),
+                "in_flight": dict(self._in_flight),
+                "paused_s": round(max(0.0, self._paused_until - now), 3),
+                "breaker": self.breaker.state,
+            }
+
+
+_scheduler = LlmScheduler()
+
+
+def get_llm_scheduler() -> LlmScheduler:
+    return _scheduler
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from llm import register_llm_backend
+
+# Ağ kullanmayan, deterministik yerel LLM. LLM_BACKEND=stub ile seçilir; benchmark ve testler içindir.
+# SQL kuralları: (regex, şablon). Şablondaki {0}, {1}... regex gruplarıyla doldurulur; ilk eşleşen kazanır.
+DEFAULT_SQL_RULES: List[Tuple[str, str]] = [
+    (r"(?i)(\w+)\s+stokta", "select units_in_stock from products where product_name ILIKE '%{0}%'"),
+    (r"(?i)(\w+)\s+fiyat", "select product_name, unit_price from products where product_name ILIKE '%{0}%'"),
+    (r"(?i)rastgele\s+(\d+)\s+ürün", "select product_name, unit_price from products order by random() limit {0}"),
+    (r"(?i)en\s+çok\s+satan\s+(\d+)",
+     "select p.product_name, sum(od.quantity) as toplam from order_details od "
+     "join products p on p.product_id = od.product_id group by p.product_name order by toplam desc limit {0}"),
+    (r"(?i)kaç\s+müşteri", "select count(*) from customers"),
+    (r"(?i)kaç\s+sipariş", "select count(*) from orders"),
+    (r"(?i)kategori",
+     "select c.category_name, count(*) from categories c join products p on p.category_id = c.category_id "
+     "group by c.category_name"),
+    (r"(?i)pahalı", "select product_name, unit_price from products where unit_price > 50 order by unit_price desc"),
+]
+DEFAULT_SQL = "select product_name, unit_price from products limit 10"
+DEFAULT_ANSWER = "Sorunuz için {rows} satırlık sonuç bulundu."
+
+_QUESTION_RE = re.compile(r"Kullanıcı sorusu(?: \(Türkçe\))?:\s*(.+)")
+_PREVIEW_ROW_RE = re.compile(r"^\|(?!\s*-)", re.MULTILINE)
+
+
+def get_stub_latency_ms() -> float:
+    try:
+        return float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+    except ValueError:
+        return 0.0
+
+
+def load_stub_responses(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    LLM_STUB_RESPONSES ile verilen JSON dosyasını okur:
+    {"sql": [["regex", "şablon"], ...], "default_sql": "...", "answer": "..."}
+    """
+    path = path or os.getenv("LLM_STUB_RESPONSES")
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Kalıp tabanlı sabit cevaplar üreten chat modeli. Son mesaj cevap prompt'u ise (Üretilen SQL: içerir)
+    doğal dil, değilse SQL döndürür. latency_ms kadar yapay gecikme ekler.
+    """
+
+    sql_rules: List[Tuple[str, str]] = DEFAULT_SQL_RULES
+    default_sql: str = DEFAULT_SQL
+    answer_template: str = DEFAULT_ANSWER
+    latency_ms: float = 0.0
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        last = str(messages[-1].content) if messages else ""
+        m = _QUESTION_RE.search(last)
+        question = m.group(1).strip() if m else last
+        if "Üretilen SQL:" in last:
+            preview = last.split("Önizleme (ilk satırlar):", 1)[-1]
+            rows = max(0, len(_PREVIEW_ROW_RE.findall(preview)) - 1)
+            return self.answer_template.format(rows=rows, question=question)
+        for pattern, template in self.sql_rules:
+            hit = re.search(pattern, question)
+            if hit:
+                return template.format(*hit.groups())
+        return self.default_sql
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        content = self._respond(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._result(messages)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Gecikmenin ilk parçadan önce geldiği, cevabın sözcük sözcük aktığı akış (TTFT ölçümü için)
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        for piece in re.findall(r"\S+\s*", self._respond(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        for piece in re.findall(r"\S+\s*", self._respond(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+_STUBS: Dict[float, StubChatModel] = {}
+_STUBS_LOCK = threading.Lock()
+
+
+def get_stub_llm(temperature: float = 0.1) -> StubChatModel:
+    with _STUBS_LOCK:
+        stub = _STUBS.get(float(temperature))
+        if stub is None:
+            custom = load_stub_responses()
+            stub = StubChatModel(
+                sql_rules=[tuple(r) for r in custom.get("sql", [])] + DEFAULT_SQL_RULES,
+                default_sql=custom.get("default_sql", DEFAULT_SQL),
+                answer_template=custom.get("answer", DEFAULT_ANSWER),
+                latency_ms=get_stub_latency_ms(),
+                temperature=temperature,
+            )
+            _STUBS[float(temperature)] = stub
+        return stub
+
+
+register_llm_backend("stub", get_stub_llm)
@@ -1,15 +1,41 @@
+import argparse
 import os
 import sys
-from typing import List, Tuple
+import time
+from typing import Any, Dict
 
-from dotenv import load_dotenv
-from tabulate import tabulate
+from env import load_env
 
-from context_loader import load_context_and_schema
-from db import create_db_engine, execute_select
-from llm import build_sql_prompt, build_answer_prompt, ask_llm
+from startup import BackgroundStartup, print_startup_profile
 
-load_dotenv()
+load_env()
+
+# Cevap akış halinde yazdırıldıysa tekrar yazdırılmaz
+STREAMED = object()
+
+# Ekrana ve cevap prompt'unun tablosuna konan satır sayısı. Sonucun tamamı çekilir;
+# satır sayısı ve sayısal özet tüm satırlar üzerinden hesaplanır.
+PREVIEW_ROWS = 10
+
+# Soru cevaplarken kullanılan modüller. SQLAlchemy/LangChain import'ları ~2 sn sürdüğü için
+# bunlar istem gösterildikten sonra arka planda yüklenir (--profile-startup ile dökümü alınır).
+RUNTIME_MODULES = (
+    "context_loader",
+    "db",
+    "fuzzy_index",
+    "sql_cache",
+    "llm",
+    "pipeline",
+    "fallback",
+    "answer_preview",
+    "answer_rules",
+    "cost_gate",
+    "speculative",
+    "sql_templates",
+    "result_cache",
+)
+# llm/pipeline'ın ilk kullanımda yüklediği ağır bağımlılıklar
+LAZY_MODULES = ("langchain_core.messages", "langchain_openai", "httpx", "tabulate")
 
 
 def print_header():
@@ -19,69 +45,272 @@ def print_header():
     print("Çıkmak için boş satır bırakıp Enter'a basın veya Ctrl+C\n")
 
 
-def find_similar_products(engine, search_term: str) -> List[str]:
+def _load_runtime(startup: BackgroundStartup, debug: bool) -> Dict[str, Any]:
     """
-    Veritabanından benzer ürün adlarını bulur (fuzzy matching).
+    Arka plan thread'inde çalışır: modül import'ları, bağlam/şema, engine, bulanık indeks,
+    şema izleyici ve SQL cache. İstem satırını bozmamak için mesajlar "notes"a yazılır,
+    ilk sorudan önce ana thread'de yazdırılır.
     """
+    rt: Dict[str, Any] = {"notes": []}
+    with startup.phase("import"):
+        from context_loader import load_context_and_schema, start_schema_refresher
+        from db import create_db_engine
+        from fuzzy_index import start_fuzzy_index
+        from llm import DEFAULT_MODEL
+        from sql_cache import get_sql_cache
+
+    with startup.phase("context_schema"):
+        try:
+            rt["context_rules"], rt["schema_text"] = load_context_and_schema("context.md")
+        except Exception as e:
+            raise RuntimeError(f"Bağlam/şema yüklenirken hata: {e}") from e
+    if debug:
+        rt["notes"].append(f"📄 Context kuralları yüklendi ({len(rt['context_rules'])} karakter)")
+        rt["notes"].append(f"📊 Şema bilgisi yüklendi ({len(rt['schema_text'])} karakter)\n")
+
+    with startup.phase("engine"):
+        try:
+            rt["engine"] = create_db_engine(echo=debug)  # DEBUG modunda SQL logları göster
+        except Exception as e:
+            raise RuntimeError(f"Veritabanına bağlanılamadı: {e}") from e
+    if debug:
+        rt["notes"].append("✅ Veritabanı bağlantısı başarılı\n")
+
+    with startup.phase("background_workers"):
+        # Ürün/şirket/kategori adları için bulanık indeks arka planda kurulur
+        start_fuzzy_index(rt["engine"])
+        # Canlı şema fingerprint'i arka planda izlenir; değişirse sonraki soru yeni şemayı kullanır
+        start_schema_refresher()
+
+    # Soru -> SQL cache'i (model adına göre ayrılır; şema değişince anahtar da değişir)
+    with startup.phase("sql_cache"):
+        try:
+            rt["sql_cache"] = get_sql_cache(namespace=DEFAULT_MODEL)
+        except Exception as e:
+            rt["notes"].append(f"SQL cache açılamadı, cache'siz devam ediliyor: {e}")
+            rt["sql_cache"] = None
+
+    # Kalan modüller ve LangChain istemcisi ilk soru beklenirken yüklenir
+    with startup.phase("runtime_modules"):
+        for name in RUNTIME_MODULES:
+            __import__(name)
+    with startup.phase("lazy_modules"):
+        for name in LAZY_MODULES:
+            try:
+                __import__(name)
+            except ImportError:
+                pass  # eksik bağımlılık ilk kullanımda kendi hatasını verir
+    with startup.phase("llm_client"):
+        from llm import prewarm_llm
+        prewarm_llm(temperature=0.0)
+    return rt
+
+
+def _answer_question(rt: Dict[str, Any], user_q: str, debug: bool) -> None:
+    from answer_preview import build_answer_preview
+    from context_loader import current_schema_text
+    from cost_gate import gate_generated_sql
+    from fallback import execute_with_fallbacks
+    from llm import build_sql_prompt, build_answer_prompt, ask_llm, is_answer_streaming_enabled, stream_llm
+    from pipeline import (
+        deterministic_answer,
+        extract_search_terms,
+        is_cacheable_sql,
+        postprocess_generated_sql,
+        preview_rows,
+    )
+    from speculative import is_ambiguous_question, is_speculative_enabled, run_speculative, start_answer_prewarm
+    from sql_templates import get_template_store, learn_template, run_template
+    from tracing import get_collector
+
+    engine, context_rules, sql_cache = rt["engine"], rt["context_rules"], rt["sql_cache"]
+    question_started = time.time()
+    schema_text = current_schema_text() or rt["schema_text"]
+
+    # 0) Bilinen bir soru kalıbıysa şablonu hazır ifade olarak çalıştır (LLM çağrılmaz)
+    template_result = run_template(engine, user_q, schema_text)
+
+    # 1) SQL üret (önce cache'e bak; hit olursa LLM çağrısı atlanır)
+    cached_sql = None
+    speculative_result = None
+    if template_result is None and sql_cache is not None:
+        try:
+            cached_sql = sql_cache.get(user_q, schema_text)
+        except Exception:
+            cached_sql = None
     try:
-        # ILIKE ile benzer ürünleri ara
-        fuzzy_sql = f"""
-        SELECT DISTINCT product_name 
-        FROM products 
-        WHERE product_name ILIKE '%{search_term.strip()}%'
-        OR product_name ILIKE '%{search_term.strip().lower()}%'
-        OR product_name ILIKE '%{search_term.strip().capitalize()}%'
-        LIMIT 10
-        """
-        columns, rows = execute_select(engine, fuzzy_sql, timeout_seconds=5)
-        return [row[0] for row in rows] if rows else []
-    except Exception:
-        return []
-
-
-def preview_rows(columns: List[str], rows: List[Tuple], max_rows: int = 10) -> str:
-    """
-    İlk max_rows kadar satırı metin olarak önizleme için döndürür.
-    """
-    if not rows:
-        return "(sonuç yok)"
-    head = rows[:max_rows]
+        if template_result is not None:
+            sql_query = template_result[0]
+            if debug:
+                print(f"[DEBUG] SQL şablonu kullanıldı: {get_template_store().stats()}")
+        elif cached_sql:
+            sql_query = cached_sql
+            if debug:
+                print(f"[DEBUG] SQL cache hit: {sql_cache.stats()}")
+        elif is_speculative_enabled() and is_ambiguous_question(user_q):
+            # Belirsiz soru: birkaç aday SQL eşzamanlı üretilip çalıştırılır, sonuç veren en düşük temperature'lı aday kazanır
+            speculative_result = run_speculative(engine, context_rules, schema_text, user_q)
+            sql_query = speculative_result[0]
+        else:
+            sql_messages = build_sql_prompt(context_rules, schema_text, user_q)
+            sql_query = ask_llm(sql_messages, temperature=0.0, mode="sql")
+            sql_query = postprocess_generated_sql(sql_query, schema_text)
+            # EXPLAIN ile pahalı bulunan sorgu yeniden yazılır ya da gerekçeyle yeniden üretilir
+            sql_query = gate_generated_sql(engine, context_rules, schema_text, user_q, sql_query, ask_llm)
+    except Exception as e:
+        print(f"SQL sorgusu üretilemedi: {e}")
+        return
+
+    print(f"\nÜretilen SQL:\n{sql_query}\n")
+
+    # 2) SQL'i çalıştır
     try:
-        return tabulate(head, headers=columns, tablefmt="github")
-    except Exception:
-        # Tabulate sorun çıkarsa basit format
-        lines = []
-        lines.append(" | ".join(columns))
-        for r in head:
-            lines.append(" | ".join(str(x) for x in r))
-        return "\n".join(lines)
+        # Sonuç boş ve ürün adı arama sorgusuysa fallback adayları tek sorguda denenir,
+        # benzer ürün önerileri paralel toplanır
+        # Deterministik cevaplayıcı ve cevap prompt'u tüm sonucu kullanır (dıştaki LIMIT ROW_LIMIT_DEFAULT ile
+        # sınırlı); 10 satırlık sınır yalnızca ekrana yazdırırken uygulanır
+        if template_result is not None:
+            _, columns, rows = template_result
+            strategy_name, similar_products = None, []
+        elif speculative_result is not None:
+            sql_query, columns, rows, strategy_name, similar_products = speculative_result
+        else:
+            # Spekülatif modda cevap istemcisi ve prompt'un şema bölümü sorgu çalışırken hazırlanır
+            start_answer_prewarm(schema_text, sql_query=sql_query, question=user_q)
+            sql_query, columns, rows, strategy_name, similar_products = execute_with_fallbacks(
+                engine, sql_query, user_q
+            )
+        if strategy_name and debug:
+            print(f"[DEBUG] {strategy_name} stratejisi başarılı: {sql_query}")
+
+        # Hala sonuç bulunamadıysa benzer ürünleri öner
+        if not rows and similar_products:
+            term = ", ".join(extract_search_terms(user_q))
+            print(f"\n🔍 '{term}' bulunamadı. Benzer ürünler:")
+            for product in similar_products[:5]:
+                print(f"  - {product}")
+            print("Bu ürünlerden birini deneyebilirsiniz.\n")
+
+        # Sonuç veren SQL'i cache'e yaz (boş sonuç ve 'select 1' son çaresi cache'lenmez)
+        if template_result is None and not cached_sql and is_cacheable_sql(sql_query, rows):
+            if sql_cache is not None:
+                try:
+                    sql_cache.put(user_q, schema_text, sql_query)
+                except Exception:
+                    pass
+            # Aynı kalıptaki sonraki sorular (başka ürün/sayı) için şablon çıkar
+            learn_template(user_q, schema_text, sql_query)
+
+    except Exception as e:
+        print(f"Sorgu çalıştırılırken hata: {e}")
+        return
+
+    # 3) Sonucu özetleyip Türkçe cevap üret
+    raw_preview = preview_rows(columns, rows, max_rows=PREVIEW_ROWS)
+
+    # Basit deterministik cevaplayıcı: bilinen bazı kalıpları LLM'e gerek kalmadan açıkla
+    fixed_answer = deterministic_answer(user_q, columns, rows)
+
+    if fixed_answer is None:
+        # LLM ile özetlet
+        try:
+            # rows tam sonuçtur: gösterilmeyen satırlar için toplam/min/maks özeti prompt'a eklenir
+            prompt_preview = build_answer_preview(columns, rows, max_rows=PREVIEW_ROWS)
+            answer_messages = build_answer_prompt(
+                context_rules=context_rules,
+                schema_text=schema_text,
+                sql_query=sql_query,
+                raw_rows_preview=prompt_preview.text,
+                columns=columns,
+                user_question=user_q,
+                numeric_summary=prompt_preview.summary,
+            )
+            if is_answer_streaming_enabled():
+                # Token'lar geldikçe yazdırılır; yeniden deneme yalnızca ilk token'dan önce yapılır
+                streamed = False
+                try:
+                    for token in stream_llm(answer_messages, temperature=0.1):
+                        if not streamed:
+                            print("Cevap:")
+                            streamed = True
+                        print(token, end="", flush=True)
+                except Exception as e:
+                    if not streamed:
+                        raise
+                    print(f"\n(Cevap akışı yarıda kesildi: {e})")
+                if streamed:
+                    print()
+                    final_answer = STREAMED
+                else:
+                    final_answer = None
+            else:
+                final_answer = ask_llm(answer_messages, temperature=0.1, mode="answer")
+        except Exception as e:
+            print("Sonuç yorumlanırken LLM hatası:", e)
+            final_answer = None
+    else:
+        final_answer = fixed_answer
+
+    # 4) Yazdır
+    if final_answer is STREAMED:
+        pass
+    elif final_answer:
+        print("Cevap:")
+        print(final_answer)
+    else:
+        print("Ham Sonuç (önizleme):")
+        print(raw_preview)
+
+    if debug:
+        # Bu soru sırasında biten span'lerin süre dökümü
+        for sp in get_collector().recent_spans():
+            if sp["start"] >= question_started:
+                print(f"[TRACE] {sp['name']:<24} {sp['duration_ms']:>10.1f} ms  {sp['status']}")
+
+
+def _print_debug_stats(rt: Dict[str, Any]) -> None:
+    from answer_rules import get_answer_rules
+    from cost_gate import get_plan_cache, is_cost_gate_enabled
+    from llm_scheduler import get_llm_scheduler
+    from result_cache import get_result_cache
+    from sql_templates import get_template_store
+
+    sql_cache = rt["sql_cache"]
+    if sql_cache is not None:
+        print(f"[DEBUG] SQL cache istatistikleri: {sql_cache.stats()}")
+    print(f"[DEBUG] Kural tabanlı cevap kapsamı: {get_answer_rules().stats()}")
+    template_store = get_template_store()
+    if template_store is not None:
+        print(f"[DEBUG] SQL şablon istatistikleri: {template_store.stats()}")
+    if is_cost_gate_enabled():
+        print(f"[DEBUG] Plan cache istatistikleri: {get_plan_cache().stats()}")
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        print(f"[DEBUG] Sonuç cache istatistikleri: {result_cache.stats()}")
+    print(f"[DEBUG] LLM zamanlayıcı: {get_llm_scheduler().stats()}")
 
 
 def main():
-    print_header()
-    
+    parser = argparse.ArgumentParser(description="Türkçe doğal dilden PostgreSQL sorgusu ve Türkçe cevap")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="import süresi dökümünü ve açılış adımlarının sürelerini yazdırıp çık")
+    args = parser.parse_args()
+
     # DEBUG modu için ortam değişkeni kontrolü
     DEBUG_MODE = os.getenv("DEBUG_SQL", "false").lower() == "true"
+    startup = BackgroundStartup(lambda s: _load_runtime(s, DEBUG_MODE))
+
+    if args.profile_startup:
+        print_startup_profile(RUNTIME_MODULES + LAZY_MODULES, startup.start())
+        return
+
+    print_header()
     if DEBUG_MODE:
         print("🐛 DEBUG MODU AÇIK - Detaylı loglar gösterilecek\n")
 
-    try:
-        context_rules, schema_text = load_context_and_schema("context.md")
-        if DEBUG_MODE:
-            print(f"📄 Context kuralları yüklendi ({len(context_rules)} karakter)")
-            print(f"📊 Şema bilgisi yüklendi ({len(schema_text)} karakter)\n")
-    except Exception as e:
-        print(f"Bağlam/şema yüklenirken hata: {e}")
-        sys.exit(1)
-
-    engine = None
-    try:
-        engine = create_db_engine(echo=DEBUG_MODE)  # DEBUG modunda SQL logları göster
-        if DEBUG_MODE:
-            print("✅ Veritabanı bağlantısı başarılı\n")
-    except Exception as e:
-        print(f"Veritabanına bağlanılamadı: {e}")
-        sys.exit(1)
+    # Şema/engine/import'lar kullanıcı ilk soruyu yazarken hazırlanır
+    startup.start()
+    rt = None
 
     while True:
         try:
@@ -94,187 +323,27 @@ def main():
             print("Çıkılıyor...")
             break
 
-        # 1) SQL üret
-        try:
-            sql_messages = build_sql_prompt(context_rules, schema_text, user_q)
-            sql_query = ask_llm(sql_messages, temperature=0.0, mode="sql")
-            # Temizlik: kod bloğu işaretçileri geldiyse ayıkla ve CamelCase -> snake_case normalize et
-            sql_query = sql_query.strip().strip("`").replace("```sql", "").replace("```", "").strip()
-            try:
-                from llm import _normalize_identifiers_in_text  # type: ignore
-                sql_query = _normalize_identifiers_in_text(sql_query)
-                # Ek güvenlik: SELECT ... parçalarını normalleştirirken eksik kolon isimlerini de tamamlamaya çalış
-                # Örn: "SELECT ProductName, UnitsIn" -> "select product_name, units_in_stock"
-                # Basit düzeltme heuristiği:
-                fixed = sql_query
-                # Küçük harfe indir ve birden çok boşluğu sadeleştir
-                low = fixed.lower()
-                # Kısmi anahtar kelime hataları
-                low = low.replace(" unitsin ", " units_in_stock ")
-                low = low.replace(" unitsinstock ", " units_in_stock ")
-                low = low.replace(" productname ", " product_name ")
-                # Başta/sonda da olma ihtimali
-                low = low.replace("select productname", "select product_name")
-                low = low.replace(", unitsin ", ", units_in_stock ")
-                # random fonksiyonunun büyük yazılması
-                low = low.replace("random()", "random()")
-                # Sonucu geri yaz
-                sql_query = low
-
-                # ÜRÜN ADI TİTLE-CASE DÜZELTMESİ (Chai kuralı ve genel baş harf büyütme):
-                # Eğer where product_name = 'chai' gibi küçük harfli üretim geldiyse 'Chai' olarak düzelt.
-                import re
-                def _titlecase_literal(m):
-                    val = m.group(1)
-                    # Sadece ilk harfi büyüt, diğerleri küçük kalsın (Chai -> Chai)
-                    if val:
-                        return f"= '{val[:1].upper()}{val[1:]}'"
-                    return m.group(0)
-                # Yalnızca eşleşen literal için uygula
-                sql_query = re.sub(r"=\s*'chai'", "= 'Chai'", sql_query)
-                # Genel baş harf büyütme: tek kelimeli ürünler için (örn. chai -> Chai)
-                sql_query = re.sub(r"=\s*'([a-zçğıöşü]+)'", lambda m: f"= '{m.group(1)[:1].upper()}{m.group(1)[1:]}'", sql_query)
-            except Exception:
-                # Normalizasyon başarısız olsa bile devam et
-                pass
-        except Exception as e:
-            print(f"SQL sorgusu üretilemedi: {e}")
-            continue
-
-        print(f"\nÜretilen SQL:\n{sql_query}\n")
-
-        # 2) SQL'i çalıştır
-        try:
-            columns, rows = execute_select(engine, sql_query, timeout_seconds=None)
-            
-            # Eğer sonuç boş ve ürün adı arama sorgusu varsa farklı stratejiler dene
-            if not rows and ("product_name" in sql_query.lower()):
-                fallback_attempts = []
-                
-                # Fallback 1: ILIKE yerine = kullanılmışsa ILIKE'a çevir
-                if " = '" in sql_query and "ilike" not in sql_query.lower():
-                    fallback_sql = sql_query.replace(" = '", " ILIKE '%").replace("'", "%'")
-                    fallback_attempts.append(("ILIKE dönüşümü", fallback_sql))
-                
-                # Fallback 2: Title Case dene
-                if " where product_name" in sql_query.lower():
-                    import re
-                    def _title_case(m):
-                        word = m.group(1)
-                        return f"ILIKE '%{word[:1].upper()}{word[1:]}%'"
-                    retry_sql = re.sub(r"(=|ILIKE)\s*['\"]([a-zçğıöşü]+)['\"]", _title_case, sql_query, flags=re.IGNORECASE)
-                    if retry_sql != sql_query:
-                        fallback_attempts.append(("Title case", retry_sql))
-                
-                # Fallback 3: Tamamen küçük harf dene
-                if " where product_name" in sql_query.lower():
-                    import re
-                    def _lower_case(m):
-                        word = m.group(1)
-                        return f"ILIKE '%{word.lower()}%'"
-                    retry_sql = re.sub(r"(=|ILIKE)\s*['\"]([a-zA-ZçğıöşüÇĞIÖŞÜ]+)['\"]", _lower_case, sql_query, flags=re.IGNORECASE)
-                    if retry_sql != sql_query:
-                        fallback_attempts.append(("Küçük harf", retry_sql))
-                
-                # Fallback stratejilerini sırayla dene
-                for strategy_name, retry_sql in fallback_attempts:
-                    try:
-                        columns2, rows2 = execute_select(engine, retry_sql, timeout_seconds=None)
-                        if rows2:
-                            print(f"[DEBUG] {strategy_name} stratejisi başarılı: {retry_sql}")
-                            columns, rows = columns2, rows2
-                            sql_query = retry_sql  # bilgi amaçlı güncelle
-                            break
-                    except Exception as e:
-                        print(f"[DEBUG] {strategy_name} stratejisi başarısız: {e}")
-                        continue
-                
-                # Hala sonuç bulunamadıysa benzer ürünleri öner
-                if not rows:
-                    # Kullanıcının aradığı terimi çıkarmaya çalış
-                    import re
-                    search_terms = re.findall(r"['\"]([^'\"]+)['\"]", user_q)
-                    for term in search_terms:
-                        similar_products = find_similar_products(engine, term)
-                        if similar_products:
-                            print(f"\n🔍 '{term}' bulunamadı. Benzer ürünler:")
-                            for product in similar_products[:5]:
-                                print(f"  - {product}")
-                            print("Bu ürünlerden birini deneyebilirsiniz.\n")
-                            break
-                        
-        except Exception as e:
-            print(f"Sorgu çalıştırılırken hata: {e}")
-            continue
-
-        # 3) Sonucu özetleyip Türkçe cevap üret
-        raw_preview = preview_rows(columns, rows, max_rows=10)
-
-        # Basit deterministik cevaplayıcı: bilinen bazı kalıpları LLM'e gerek kalmadan açıkla
-        normalized_q = user_q.strip().lower()
-        deterministic_answer = None
-
-        try:
-            # "stokta ne kadar var" benzeri soru ve beklenen tek değerli sonuçlar
-            if "stokta" in normalized_q and ("ne kadar" in normalized_q or "kaç" in normalized_q):
-                # units_in_stock tek kolonsa tek değer döndür
-                if columns and len(columns) == 1 and columns[0].lower() == "units_in_stock":
-                    if rows:
-                        miktar = rows[0][0]
-                        deterministic_answer = f"Stokta {miktar} adet var."
-                    else:
-                        deterministic_answer = "Bu ürüne ait stok bulunamadı."
-            # "rastgele 3 ürün" gibi isteklerde isim+fiyat tabloyu kısa listele
-            if deterministic_answer is None and "rastgele" in normalized_q and "ürün" in normalized_q:
-                # Ürün adını ve fiyatı bulmaya çalış
-                name_idx = None
-                price_idx = None
-                if columns:
-                    for i, c in enumerate(columns):
-                        lc = c.lower()
-                        if lc in ("product_name", "name"):
-                            name_idx = i
-                        if lc in ("unit_price", "price"):
-                            price_idx = i
-                if rows and name_idx is not None:
-                    lines = []
-                    for r in rows[:3]:
-                        if price_idx is not None:
-                            lines.append(f"- {r[name_idx]} — Fiyat: {r[price_idx]}")
-                        else:
-                            lines.append(f"- {r[name_idx]}")
-                    deterministic_answer = "Rastgele seçilen ürünler:\n" + "\n".join(lines)
-        except Exception:
-            deterministic_answer = None
-
-        if deterministic_answer is None:
-            # LLM ile özetlet
+        if rt is None:
             try:
-                answer_messages = build_answer_prompt(
-                    context_rules=context_rules,
-                    schema_text=schema_text,
-                    sql_query=sql_query,
-                    raw_rows_preview=raw_preview,
-                    columns=columns,
-                    user_question=user_q,
-                )
-                final_answer = ask_llm(answer_messages, temperature=0.1, mode="answer")
+                rt = startup.result()
+            except KeyboardInterrupt:
+                print("\nÇıkılıyor...")
+                return
             except Exception as e:
-                print("Sonuç yorumlanırken LLM hatası:", e)
-                final_answer = None
-        else:
-            final_answer = deterministic_answer
+                print(e)
+                sys.exit(1)
+            for note in rt["notes"]:
+                print(note)
+            if DEBUG_MODE:
+                print(f"[DEBUG] Açılış: {startup.elapsed_ms:.0f} ms arka planda")
 
-        # 4) Yazdır
-        if final_answer:
-            print("Cevap:")
-            print(final_answer)
-        else:
-            print("Ham Sonuç (önizleme):")
-            print(raw_preview)
+        _answer_question(rt, user_q, DEBUG_MODE)
 
         print("\n" + "-" * 72 + "\n")
 
+    if rt is not None and DEBUG_MODE:
+        _print_debug_stats(rt)
+
 
 if __name__ == "__main__":
     main()
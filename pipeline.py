@@ -0,0 +1,268 @@
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from answer_preview import build_answer_preview
+from answer_rules import answer_with_rules
+from columnar import head_rows, result_len
+from context_loader import current_schema_text
+from db import execute_select
+from fuzzy_index import get_fuzzy_index
+from sql_normalizer import normalize_sql_identifiers
+from sql_templates import learn_template, run_template
+from tracing import current_span, traced
+
+# main.py, async_pipeline.py, batch.py ve diğer giriş noktalarının paylaştığı akış adımları.
+
+SIMILAR_PRODUCTS_SQL = """
+SELECT DISTINCT product_name
+FROM products
+WHERE product_name ILIKE :p1
+OR product_name ILIKE :p2
+OR product_name ILIKE :p3
+LIMIT 10
+"""
+
+
+def preview_rows(columns: List[str], rows: Any, max_rows: int = 10) -> str:
+    """
+    İlk max_rows kadar satırı metin olarak önizleme için döndürür.
+    rows satır listesi, pandas DataFrame veya Arrow Table olabilir.
+    """
+    if result_len(rows) == 0:
+        return "(sonuç yok)"
+    head = head_rows(rows, max_rows)
+    try:
+        from tabulate import tabulate
+        return tabulate(head, headers=columns, tablefmt="github")
+    except Exception:
+        # Tabulate sorun çıkarsa basit format
+        lines = []
+        lines.append(" | ".join(columns))
+        for r in head:
+            lines.append(" | ".join(str(x) for x in r))
+        return "\n".join(lines)
+
+
+@traced("sql_normalize")
+def postprocess_generated_sql(sql_query: str, schema_text: Optional[str] = None) -> str:
+    """
+    LLM'in ürettiği SQL'i temizler: kod bloğu işaretçileri, tablo/kolon adlarının şemadaki
+    yazıma çevrilmesi (ProductName -> product_name, unitsin -> units_in_stock) ve
+    bulanık indeksle ürün adı literal'lerinin kayıtlı isimlere eşlenmesi.
+    schema_text verilmezse canlı şemadan yüklenen son metin kullanılır.
+    """
+    # Temizlik: kod bloğu işaretçileri geldiyse ayıkla
+    sql_query = sql_query.replace("```sql", "").replace("```", "").strip().strip("`").strip()
+    try:
+        # Literal'lere dokunmadan tek geçişte kimlik normalizasyonu (bkz. sql_normalizer)
+        sql_query = normalize_sql_identifiers(sql_query, schema_text or current_schema_text())
+    except Exception:
+        # Normalizasyon başarısız olsa bile devam et
+        pass
+    return resolve_entity_literals(sql_query)
+
+
+def resolve_entity_literals(sql_query: str) -> str:
+    """
+    Bulanık indeks hazırsa ürün/şirket/kategori literal'lerini veritabanındaki tam isimle değiştirir
+    (ör. product_name ILIKE '%chai%' -> product_name = 'Chai'); böylece fallback turuna gerek kalmaz.
+    """
+    index = get_fuzzy_index()
+    if index is None:
+        return sql_query
+    try:
+        return index.rewrite_literals(sql_query)
+    except Exception:
+        return sql_query
+
+
+def needs_product_fallback(sql_query: str, rows: List[Tuple]) -> bool:
+    # Eğer sonuç boş ve ürün adı arama sorgusu varsa farklı stratejiler denenir
+    return not rows and ("product_name" in sql_query.lower())
+
+
+def build_fallback_sqls(sql_query: str) -> List[Tuple[str, str]]:
+    """
+    Boş sonuç dönen ürün adı sorguları için sırayla denenecek (strateji_adı, sql) listesi.
+    """
+    fallback_attempts = []
+
+    # Fallback 1: ILIKE yerine = kullanılmışsa ILIKE'a çevir
+    if " = '" in sql_query and "ilike" not in sql_query.lower():
+        fallback_sql = re.sub(r"(product_name)\s*=\s*'([^']*)'", r"\1 ILIKE '%\2%'", sql_query, flags=re.IGNORECASE)
+        if fallback_sql != sql_query:
+            fallback_attempts.append(("ILIKE dönüşümü", fallback_sql))
+
+    # Fallback 2: Title Case dene
+    if " where product_name" in sql_query.lower():
+        def _title_case(m):
+            word = m.group(2)
+            return f"ILIKE '%{word[:1].upper()}{word[1:]}%'"
+        retry_sql = re.sub(r"(=|ILIKE)\s*['\"]([a-zçğıöşü]+)['\"]", _title_case, sql_query, flags=re.IGNORECASE)
+        if retry_sql != sql_query:
+            fallback_attempts.append(("Title case", retry_sql))
+
+    # Fallback 3: Tamamen küçük harf dene
+    if " where product_name" in sql_query.lower():
+        def _lower_case(m):
+            word = m.group(2)
+            return f"ILIKE '%{word.lower()}%'"
+        retry_sql = re.sub(r"(=|ILIKE)\s*['\"]([a-zA-ZçğıöşüÇĞIÖŞÜ]+)['\"]", _lower_case, sql_query, flags=re.IGNORECASE)
+        if retry_sql != sql_query:
+            fallback_attempts.append(("Küçük harf", retry_sql))
+
+    # Aynı SQL'e düşen stratejileri tekrar çalıştırma
+    seen = set()
+    unique_attempts = []
+    for name, sql in fallback_attempts:
+        if sql not in seen:
+            seen.add(sql)
+            unique_attempts.append((name, sql))
+    return unique_attempts
+
+
+def extract_search_terms(user_q: str, sql_query: Optional[str] = None) -> List[str]:
+    # Kullanıcının tırnak içinde aradığı terimleri çıkar; yoksa SQL'deki product_name literal'lerini kullan
+    terms = re.findall(r"['\"]([^'\"]+)['\"]", user_q)
+    if not terms and sql_query:
+        terms = [t.strip("%") for t in re.findall(r"product_name\s*(?:=|ilike|like)\s*'([^']+)'", sql_query, flags=re.IGNORECASE)]
+    return [t for t in terms if t.strip()]
+
+
+def similar_products_params(search_term: str) -> dict:
+    term = search_term.strip()
+    return {"p1": f"%{term}%", "p2": f"%{term.lower()}%", "p3": f"%{term.capitalize()}%"}
+
+
+@traced("find_similar_products")
+def find_similar_products(engine, search_term: str) -> List[str]:
+    """
+    Benzer ürün adlarını bulur (fuzzy matching). Bulanık indeks hazırsa bellekten,
+    değilse veritabanından ILIKE ile.
+    """
+    index = get_fuzzy_index()
+    if index is not None:
+        current_span().set("source", "index")
+        return [name for name, _score in index.search(search_term, column="product_name", limit=10)]
+    try:
+        # ILIKE ile benzer ürünleri ara (terim bind parametresi olarak gider)
+        columns, rows = execute_select(
+            engine, SIMILAR_PRODUCTS_SQL, timeout_seconds=5, params=similar_products_params(search_term)
+        )
+        current_span().set("rows", len(rows))
+        return [row[0] for row in rows] if rows else []
+    except Exception:
+        return []
+
+
+def deterministic_answer(user_q: str, columns: List[str], rows: Any) -> Optional[str]:
+    """
+    Bilinen soru/sonuç kalıplarını LLM'e gerek kalmadan cevaplar (kurallar answer_rules.py'de).
+    Eşleşme yoksa None döner. rows satır listesi veya DataFrame/Arrow Table olabilir.
+    """
+    return answer_with_rules(user_q, columns, rows)
+
+
+def is_cacheable_sql(sql_query: str, rows: Any) -> bool:
+    # Sonuç veren SQL cache'e yazılır (boş sonuç ve 'select 1' son çaresi cache'lenmez)
+    return result_len(rows) > 0 and sql_query.strip().lower() != "select 1"
+
+
+@traced("run_question")
+def run_question(engine, context_rules: str, schema_text: str, question: str,
+                 ask: Optional[Callable[..., str]] = None,
+                 sql_cache=None,
+                 preview_limit: int = 10) -> Dict[str, Any]:
+    """
+    Üret -> çalıştır -> cevapla akışının senkron, ekrana yazmayan sürümü (batch ve araçlar için).
+    Her aşamanın süresi (ms) timings'te döner; async_pipeline.answer_question_async ile aynı çıktı.
+    """
+    from cost_gate import gate_generated_sql
+    from fallback import execute_with_fallbacks
+    from llm import build_sql_prompt, build_answer_prompt, ask_llm
+    from speculative import is_ambiguous_question, is_speculative_enabled, run_speculative, start_answer_prewarm
+
+    ask = ask or ask_llm
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    # Bilinen bir soru kalıbıysa şablon LLM'siz, hazır ifade olarak çalıştırılır
+    cached_sql = None
+    template_result = run_template(engine, question, schema_text)
+    if template_result is not None:
+        sql_query, columns, rows = template_result
+        suggestions: List[str] = []
+        t2 = time.perf_counter()
+        timings["generate_ms"] = 0.0
+        timings["execute_ms"] = (t2 - t0) * 1000
+    else:
+        if sql_cache is not None:
+            try:
+                cached_sql = sql_cache.get(question, schema_text)
+            except Exception:
+                cached_sql = None
+        if not cached_sql and is_speculative_enabled() and is_ambiguous_question(question):
+            # Aday SQL'ler eşzamanlı üretilip çalıştırılır; üretim süresi execute_ms'e dahildir
+            t1 = time.perf_counter()
+            timings["generate_ms"] = 0.0
+            sql_query, columns, rows, _strategy, suggestions = run_speculative(
+                engine, context_rules, schema_text, question, ask=ask
+            )
+        else:
+            if cached_sql:
+                sql_query = cached_sql
+            else:
+                sql_messages = build_sql_prompt(context_rules, schema_text, question)
+                sql_query = postprocess_generated_sql(ask(sql_messages, temperature=0.0, mode="sql"), schema_text)
+                sql_query = gate_generated_sql(engine, context_rules, schema_text, question, sql_query, ask)
+            t1 = time.perf_counter()
+            timings["generate_ms"] = (t1 - t0) * 1000
+
+            start_answer_prewarm(schema_text, question, sql_query)
+            sql_query, columns, rows, _strategy, suggestions = execute_with_fallbacks(engine, sql_query, question)
+        t2 = time.perf_counter()
+        timings["execute_ms"] = (t2 - t1) * 1000
+
+        if not cached_sql and is_cacheable_sql(sql_query, rows):
+            if sql_cache is not None:
+                try:
+                    sql_cache.put(question, schema_text, sql_query)
+                except Exception:
+                    pass
+            learn_template(question, schema_text, sql_query)
+
+    raw_preview = preview_rows(columns, rows, max_rows=preview_limit)
+    final_answer = deterministic_answer(question, columns, rows)
+    if final_answer is None:
+        # Prompt'a token bütçesine sığan önizleme + tüm sonuç üzerinden özet gider
+        prompt_preview = build_answer_preview(columns, rows, max_rows=preview_limit)
+        answer_messages = build_answer_prompt(
+            context_rules=context_rules,
+            schema_text=schema_text,
+            sql_query=sql_query,
+            raw_rows_preview=prompt_preview.text,
+            columns=columns,
+            user_question=question,
+            numeric_summary=prompt_preview.summary,
+        )
+        try:
+            final_answer = ask(answer_messages, temperature=0.1, mode="answer")
+        except Exception:
+            final_answer = None
+    t3 = time.perf_counter()
+    timings["answer_ms"] = (t3 - t2) * 1000
+    timings["total_ms"] = (t3 - t0) * 1000
+
+    return {
+        "question": question,
+        "sql": sql_query,
+        "cache_hit": bool(cached_sql),
+        "template_hit": template_result is not None,
+        "columns": columns,
+        "row_count": len(rows),
+        "rows": [list(r) for r in rows[:preview_limit]],
+        "answer": final_answer or raw_preview,
+        "suggestions": suggestions[:5],
+        "timings": timings,
+    }
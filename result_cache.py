@@ -0,0 +1,275 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from env import load_env
+
+from sql_guard import parse_sql
+from tracing import span
+
+load_env()
+
+# execute_select sonuçları için bellek içi LRU cache. Anahtar LIMIT uygulanmış son SQL metni
+# (+ bind parametreleri ve veritabanı); boyut bayt cinsinden sınırlanır. Kayıtlar TTL ile, "stats"
+# modunda ayrıca pg_stat_user_tables değişiklik sayaçları artan tablolara göre geçersiz kılınır.
+
+TABLE_VERSIONS_SQL = """
+SELECT relname, n_tup_ins + n_tup_upd + n_tup_del + n_live_tup
+FROM pg_stat_user_tables
+WHERE schemaname = 'public'
+"""
+
+# Her çalıştırmada farklı sonuç verebilecek ifadeler cache'lenmez
+_NON_DETERMINISTIC_RE = re.compile(
+    r"\b(random|setseed|now|clock_timestamp|statement_timestamp|transaction_timestamp|timeofday|"
+    r"current_date|current_time|current_timestamp|localtime|localtimestamp|gen_random_uuid|"
+    r"uuid_generate_v4|nextval|currval|txid_current|pg_sleep)\b|\btablesample\b",
+    re.IGNORECASE,
+)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def get_result_cache_max_bytes() -> int:
+    try:
+        return int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    except ValueError:
+        return 64 * 1024 * 1024
+
+
+def get_result_cache_ttl_seconds() -> int:
+    try:
+        return int(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+    except ValueError:
+        return 300
+
+
+def get_result_cache_poll_seconds() -> float:
+    try:
+        return float(os.getenv("RESULT_CACHE_POLL_SECONDS", "5"))
+    except ValueError:
+        return 5.0
+
+
+def get_result_cache_invalidation() -> str:
+    """
+    "stats": TTL + pg_stat_user_tables sayaçlarıyla tablo bazlı geçersiz kılma (varsayılan)
+    "ttl": yalnızca TTL
+    """
+    mode = os.getenv("RESULT_CACHE_INVALIDATION", "stats").lower()
+    return mode if mode in ("stats", "ttl") else "stats"
+
+
+def is_result_cache_enabled() -> bool:
+    return os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+
+
+def is_deterministic_sql(sql: str) -> bool:
+    return _NON_DETERMINISTIC_RE.search(sql) is None
+
+
+def referenced_tables(sql: str) -> FrozenSet[str]:
+    """
+    FROM/JOIN sonrasındaki tablo adları (virgüllü listeler ve alt sorgular dahil, CTE adları hariç).
+    """
+    return parse_sql(sql).tables
+
+
+def _estimate_size(columns: List[str], rows: List[Tuple[Any, ...]]) -> int:
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(c) for c in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+    return size
+
+
+@dataclass
+class _Entry:
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+    tables: FrozenSet[str]
+    size: int
+    created_at: float
+
+
+class ResultCache:
+    """
+    Süreç içi, thread-safe sonuç cache'i. get/put LIMIT'li son SQL ile çağrılır.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 invalidation: Optional[str] = None, poll_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else get_result_cache_max_bytes()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else get_result_cache_ttl_seconds()
+        self.invalidation = invalidation or get_result_cache_invalidation()
+        self.poll_seconds = poll_seconds if poll_seconds is not None else get_result_cache_poll_seconds()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._versions: Dict[str, int] = {}
+        self._last_poll = 0.0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def make_key(db_key: str, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+        normalized = _SPACE_RE.sub(" ", sql.strip().rstrip(";")).strip()
+        if params:
+            normalized += " -- " + json.dumps(params, sort_keys=True, default=str)
+        return f"{db_key}|{normalized}"
+
+    def is_cacheable(self, sql: str) -> bool:
+        return is_deterministic_sql(sql)
+
+    def get(self, key: str) -> Optional[Tuple[List[str], List[Tuple[Any, ...]]]]:
+        with span("result_cache.get") as sp:
+            result = self._get(key)
+            sp.set("cache_hit", result is not None)
+            return result
+
+    def _get(self, key: str) -> Optional[Tuple[List[str], List[Tuple[Any, ...]]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if self.ttl_seconds > 0 and time.time() - entry.created_at > self.ttl_seconds:
+                self._remove_locked(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.columns, list(entry.rows)
+
+    def put(self, key: str, sql: str, columns: List[str], rows: List[Tuple[Any, ...]]) -> bool:
+        size = _estimate_size(columns, rows)
+        # Tek bir dev sonuç tüm cache'i boşaltmasın
+        if size > self.max_bytes // 4:
+            return False
+        entry = _Entry(list(columns), list(rows), referenced_tables(sql), size, time.time())
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = entry
+            self._bytes += size
+            for table in entry.tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._evictions += 1
+        return True
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_table(self, table: str) -> int:
+        with self._lock:
+            keys = list(self._by_table.get(table.lower(), ()))
+            for key in keys:
+                self._remove_locked(key)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def needs_poll(self) -> bool:
+        return self.invalidation == "stats" and time.time() - self._last_poll >= self.poll_seconds
+
+    def apply_table_versions(self, versions: Dict[str, int]) -> List[str]:
+        """
+        pg_stat_user_tables sayaçlarını önceki okumayla karşılaştırır; değişen tabloların kayıtlarını siler.
+        """
+        changed = [t for t, v in versions.items() if t in self._versions and self._versions[t] != v]
+        # İlk okuma yalnızca başlangıç değerlerini kaydeder (execute_select her get'ten önce poll eder)
+        if self._last_poll == 0.0:
+            changed = []
+        self._versions = versions
+        self._last_poll = time.time()
+        for table in changed:
+            self.invalidate_table(table)
+        return changed
+
+    def poll(self, engine) -> None:
+        if not self.needs_poll() or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            from sqlalchemy import text
+            with span("result_cache.poll") as sp:
+                try:
+                    with engine.connect() as conn:
+                        rows = conn.execute(text(TABLE_VERSIONS_SQL)).fetchall()
+                except Exception as e:
+                    # İzin/istatistik yoksa TTL moduna düş
+                    sp.set("error", str(e))
+                    self.invalidation = "ttl"
+                    return
+                sp.set("invalidated", len(self.apply_table_versions({r[0].lower(): int(r[1] or 0) for r in rows})))
+        finally:
+            self._poll_lock.release()
+
+    async def poll_async(self, engine) -> None:
+        if not self.needs_poll() or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            from sqlalchemy import text
+            with span("result_cache.poll") as sp:
+                try:
+                    async with engine.connect() as conn:
+                        rows = (await conn.execute(text(TABLE_VERSIONS_SQL))).fetchall()
+                except Exception as e:
+                    sp.set("error", str(e))
+                    self.invalidation = "ttl"
+                    return
+                sp.set("invalidated", len(self.apply_table_versions({r[0].lower(): int(r[1] or 0) for r in rows})))
+        finally:
+            self._poll_lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Süreç genelinde paylaşılan sonuç cache'i (RESULT_CACHE_ENABLED=false ise None).
+    """
+    global _result_cache
+    if not is_result_cache_enabled():
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
@@ -0,0 +1,270 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from env import load_env
+
+from fuzzy_index import normalize_name
+from tokens import count_tokens
+
+load_env()
+
+# Prompt'a şemanın tamamı yerine soruyla ilgili tablolar konur. Tablolar Türkçe anahtar kelime/eş
+# anlamlı eşleşmesiyle puanlanır, seçilen tabloların yabancı anahtar komşuları da (ör. products ->
+# order_details) eklenir ve sonuç PROMPT_SCHEMA_TOKEN_BUDGET'a sığacak şekilde paketlenir.
+
+# Türkçe kök (ASCII'ye katlanmış) -> ilgili tablo / tablo.kolon
+SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "urun": ("products",),
+    "mal": ("products",),
+    "stok": ("products.units_in_stock", "products.units_on_order", "products.reorder_level"),
+    "fiyat": ("products.unit_price", "order_details.unit_price"),
+    "ucret": ("products.unit_price",),
+    "pahali": ("products.unit_price",),
+    "ucuz": ("products.unit_price",),
+    "kategori": ("categories",),
+    "musteri": ("customers",),
+    "siparis": ("orders", "order_details"),
+    "satis": ("order_details", "orders"),
+    "sat": ("order_details",),
+    "ciro": ("order_details.unit_price", "order_details.quantity"),
+    "gelir": ("order_details.unit_price", "order_details.quantity"),
+    "tedarik": ("suppliers",),
+    "calisan": ("employees",),
+    "personel": ("employees",),
+    "eleman": ("employees",),
+    "kargo": ("shippers", "orders.freight"),
+    "nakliye": ("shippers", "orders.freight"),
+    "gonderi": ("orders.shipped_date", "shippers"),
+    "sevk": ("orders.shipped_date", "shippers"),
+    "ulke": ("customers.country", "suppliers.country", "orders.ship_country"),
+    "sehir": ("customers.city", "suppliers.city", "orders.ship_city"),
+    "bolge": ("region", "territories"),
+    "indirim": ("order_details.discount",),
+    "tarih": ("orders.order_date",),
+    "ay": ("orders.order_date",),
+    "yil": ("orders.order_date",),
+    "adet": ("order_details.quantity",),
+    "miktar": ("order_details.quantity",),
+    "sirket": ("customers.company_name", "suppliers.company_name"),
+    "firma": ("customers.company_name", "suppliers.company_name"),
+    "telefon": ("customers.phone", "suppliers.phone"),
+    "adres": ("customers.address",),
+    "demografi": ("customer_demographics",),
+}
+
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 2.0
+NEIGHBOUR_WEIGHT = 1.0
+
+_LIVE_LINE_RE = re.compile(r"^-\s*(\w+):\s*(.*)$")
+_LIVE_COL_RE = re.compile(r"(\w+)\s*\(([^)]*)\)")
+_FILE_HEADER_RE = re.compile(r"^Tablo:\s*(\w+)", re.IGNORECASE)
+_FILE_COL_RE = re.compile(r"^-\s*(\w+)")
+_FK_REF_RE = re.compile(r"->\s*(\w+)\.")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_RELATION_RE = re.compile(r"^-?\s*(\w+)\.\w+\s*=\s*(\w+)\.\w+")
+_SQL_TABLE_RE = re.compile(r"\b(?:from|join)\s+(\w+)", re.IGNORECASE)
+
+
+def get_prompt_schema_token_budget() -> int:
+    """
+    SQL prompt'undaki şema bölümü için token bütçesi (0: seçim kapalı, tüm şema gönderilir).
+    """
+    try:
+        return int(os.getenv("PROMPT_SCHEMA_TOKEN_BUDGET", "600"))
+    except ValueError:
+        return 600
+
+
+@dataclass
+class SchemaTable:
+    name: str
+    lines: List[str]
+    columns: List[str] = field(default_factory=list)
+    references: Set[str] = field(default_factory=set)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+@dataclass
+class ParsedSchema:
+    preamble: List[str]
+    tables: List[SchemaTable]
+    # ("- customers.customer_id = orders.customer_id", "customers", "orders")
+    relations: List[Tuple[str, str, str]] = field(default_factory=list)
+
+
+@dataclass
+class SchemaSelection:
+    text: str
+    tables: List[str]
+    tokens: int
+    full_tokens: int
+
+
+def parse_schema(schema_text: str) -> ParsedSchema:
+    """
+    Canlı şema ("- tablo: kolon (tip), ...") ve context.md ("Tablo: x" + "- kolon" satırları,
+    "İlişkiler:" altındaki "a.x = b.y" satırları) biçimlerini tablo bloklarına ayırır.
+    """
+    preamble: List[str] = []
+    tables: List[SchemaTable] = []
+    relations: List[Tuple[str, str, str]] = []
+    current: Optional[SchemaTable] = None
+    for raw in schema_text.strip().splitlines():
+        line = raw.strip()
+        if not line:
+            current = None
+            continue
+        relation = _RELATION_RE.match(line)
+        if relation and current is None:
+            relations.append((line, relation.group(1).lower(), relation.group(2).lower()))
+            continue
+        header = _FILE_HEADER_RE.match(line)
+        if header:
+            current = SchemaTable(name=header.group(1).lower(), lines=[line])
+            tables.append(current)
+            continue
+        if current is not None and line.startswith("-"):
+            current.lines.append(line)
+            col = _FILE_COL_RE.match(line)
+            if col:
+                current.columns.append(col.group(1).lower())
+            current.references.update(r.lower() for r in _FK_REF_RE.findall(line))
+            continue
+        live = _LIVE_LINE_RE.match(line)
+        if live:
+            columns = [c[0].lower() for c in _LIVE_COL_RE.findall(live.group(2))]
+            tables.append(SchemaTable(name=live.group(1).lower(), lines=[line], columns=columns))
+            current = None
+            continue
+        if not tables:
+            preamble.append(line)
+    return ParsedSchema(preamble, tables, relations)
+
+
+def _neighbours(schema: ParsedSchema) -> Dict[str, Set[str]]:
+    """
+    Yabancı anahtar komşuluğu: context.md'deki "-> tablo.kolon" referansları ve ilişki satırları,
+    canlı şemada ise aynı adlı *_id kolonları (products.category_id <-> categories.category_id).
+    """
+    tables = schema.tables
+    graph: Dict[str, Set[str]] = {t.name: set() for t in tables}
+    for _line, a, b in schema.relations:
+        if a in graph and b in graph and a != b:
+            graph[a].add(b)
+            graph[b].add(a)
+    id_owners: Dict[str, Set[str]] = {}
+    for t in tables:
+        for ref in t.references:
+            if ref in graph and ref != t.name:
+                graph[t.name].add(ref)
+                graph[ref].add(t.name)
+        for col in t.columns:
+            if col.endswith("_id"):
+                id_owners.setdefault(col, set()).add(t.name)
+    for owners in id_owners.values():
+        for a in owners:
+            graph[a].update(owners - {a})
+    return graph
+
+
+def _question_stems(question: str) -> List[str]:
+    return _WORD_RE.findall(normalize_name(question))
+
+
+def score_tables(question: str, schema: ParsedSchema) -> Dict[str, float]:
+    tables = schema.tables
+    by_name = {t.name: t for t in tables}
+    scores: Dict[str, float] = {t.name: 0.0 for t in tables}
+    words = _question_stems(question)
+
+    def _hit(target: str) -> None:
+        table, _, column = target.partition(".")
+        if table not in by_name:
+            return
+        if not column:
+            scores[table] += TABLE_WEIGHT
+        elif column in by_name[table].columns:
+            scores[table] += COLUMN_WEIGHT
+
+    for word in words:
+        # Türkçe ekler için kök eşleşmesi: "ürünleri" -> "urun", "siparişlerin" -> "siparis"
+        for stem, targets in SYNONYMS.items():
+            if word == stem or (len(stem) >= 3 and word.startswith(stem)):
+                for target in targets:
+                    _hit(target)
+        # İngilizce tablo/kolon adları doğrudan geçiyorsa (products, unit_price ...)
+        for t in tables:
+            if word == t.name or word.rstrip("s") == t.name.rstrip("s"):
+                scores[t.name] += TABLE_WEIGHT
+            elif word in t.columns:
+                scores[t.name] += COLUMN_WEIGHT
+
+    graph = _neighbours(schema)
+    direct = {name for name, score in scores.items() if score > 0}
+    for name in direct:
+        for neighbour in graph.get(name, ()):
+            scores[neighbour] += NEIGHBOUR_WEIGHT
+    return scores
+
+
+def _pack(schema: ParsedSchema, ordered: Iterable[SchemaTable], budget: int) -> Tuple[str, List[str], int]:
+    lines = list(schema.preamble)
+    used = count_tokens("\n".join(lines))
+    chosen: List[str] = []
+    for t in ordered:
+        cost = count_tokens(t.text) + 1
+        if budget > 0 and used + cost > budget:
+            continue
+        lines.extend(t.lines)
+        chosen.append(t.name)
+        used += cost
+    # Yalnızca iki ucu da seçilmiş tablolar arasındaki ilişkiler
+    relation_lines = [line for line, a, b in schema.relations if a in chosen and b in chosen]
+    if relation_lines:
+        cost = count_tokens("\n".join(relation_lines)) + 4
+        if budget <= 0 or used + cost <= budget:
+            lines.append("İlişkiler:")
+            lines.extend(relation_lines)
+            used += cost
+    return "\n".join(lines), chosen, used
+
+
+def select_schema(schema_text: str, question: str, budget: Optional[int] = None,
+                  tables: Optional[Iterable[str]] = None) -> SchemaSelection:
+    """
+    Soruyla ilgili tabloları puanlayıp token bütçesine sığanları döndürür.
+    tables verilirse (ör. SQL'de geçen tablolar) puanlama yerine onlar kullanılır.
+    Hiçbir tablo eşleşmezse şema orijinal sırasıyla bütçe kadar doldurulur.
+    """
+    budget = get_prompt_schema_token_budget() if budget is None else budget
+    full_tokens = count_tokens(schema_text)
+    schema = parse_schema(schema_text)
+    parsed = schema.tables
+    if budget <= 0 or not parsed or full_tokens <= budget:
+        return SchemaSelection(schema_text, [t.name for t in parsed], full_tokens, full_tokens)
+
+    order = {t.name: i for i, t in enumerate(parsed)}
+    if tables is not None:
+        wanted = {name.lower() for name in tables}
+        graph = _neighbours(schema)
+        ordered = [t for t in parsed if t.name in wanted]
+        ordered += [t for t in parsed if t.name not in wanted and graph.get(t.name, set()) & wanted]
+    else:
+        scores = score_tables(question, schema)
+        relevant = [t for t in parsed if scores[t.name] > 0]
+        ordered = sorted(relevant, key=lambda t: (-scores[t.name], order[t.name]))
+    if not ordered:
+        ordered = parsed
+
+    text, chosen, used = _pack(schema, ordered, budget)
+    return SchemaSelection(text, chosen, used, full_tokens)
+
+
+def tables_in_sql(sql_query: str) -> List[str]:
+    return [m.lower() for m in _SQL_TABLE_RE.findall(sql_query or "")]
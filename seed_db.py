@@ -1,15 +1,22 @@
+import argparse
+import bisect
+import csv
+import io
 import os
+import random
+import time
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from sqlalchemy import text
-from sqlalchemy.engine import Engine
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.exc import SQLAlchemyError
 
 from db import create_db_engine
-from dotenv import load_dotenv
+from env import load_env
 
-load_dotenv()
+load_env()
 
 
 DDL_SQL = """
@@ -89,11 +96,465 @@ def seed_data(engine: Engine):
                 qty = ((i + j) % 5) + 1
                 inserts.append({"customer_id": cust, "product_id": prod, "quantity": qty, "order_date": d})
 
-        for row in inserts:
-            conn.execute(
-                text("INSERT INTO orders (customer_id, product_id, quantity, order_date) VALUES (:c, :p, :q, :d)"),
-                {"c": row["customer_id"], "p": row["product_id"], "q": row["quantity"], "d": row["order_date"]},
-            )
+        # Tek executemany (satır başına ayrı round-trip yok)
+        conn.execute(
+            text("INSERT INTO orders (customer_id, product_id, quantity, order_date) "
+                 "VALUES (:customer_id, :product_id, :quantity, :order_date)"),
+            inserts,
+        )
+
+
+# --- Üretici modu (--scale): Northwind biçiminde, yük testi boyutunda sentetik veri ---
+# Ölçek 1 ≈ 2.000 müşteri, 500 ürün, 50.000 sipariş, ~130.000 sipariş kalemi; satır sayıları ölçekle doğrusal.
+# Ürün ve müşteri popülerliği Zipf dağılımlı (birkaç ürün satışların çoğunu alır), tarihler verilen aralıkta.
+# Veriler parça parça COPY (bellekteki CSV akışı) ya da toplu executemany ile yüklenir; indeksler,
+# yabancı anahtarlar ve ANALYZE yüklemeden sonra çalışır.
+
+NORTHWIND_DDL = """
+CREATE TABLE categories (
+    category_id SMALLINT PRIMARY KEY,
+    category_name VARCHAR(40) NOT NULL,
+    description TEXT,
+    picture BYTEA
+);
+
+CREATE TABLE suppliers (
+    supplier_id INTEGER PRIMARY KEY,
+    company_name VARCHAR(80) NOT NULL,
+    contact_name VARCHAR(60),
+    contact_title VARCHAR(40),
+    city VARCHAR(30),
+    country VARCHAR(30),
+    phone VARCHAR(24)
+);
+
+CREATE TABLE shippers (
+    shipper_id SMALLINT PRIMARY KEY,
+    company_name VARCHAR(60) NOT NULL,
+    phone VARCHAR(24)
+);
+
+CREATE TABLE employees (
+    employee_id INTEGER PRIMARY KEY,
+    last_name VARCHAR(30) NOT NULL,
+    first_name VARCHAR(30) NOT NULL,
+    title VARCHAR(40),
+    birth_date DATE,
+    hire_date DATE,
+    city VARCHAR(30),
+    country VARCHAR(30),
+    reports_to INTEGER
+);
+
+CREATE TABLE customers (
+    customer_id VARCHAR(10) PRIMARY KEY,
+    company_name VARCHAR(80) NOT NULL,
+    contact_name VARCHAR(60),
+    contact_title VARCHAR(40),
+    city VARCHAR(30),
+    region VARCHAR(30),
+    postal_code VARCHAR(10),
+    country VARCHAR(30),
+    phone VARCHAR(24)
+);
+
+CREATE TABLE products (
+    product_id INTEGER PRIMARY KEY,
+    product_name VARCHAR(80) NOT NULL,
+    supplier_id INTEGER,
+    category_id SMALLINT,
+    quantity_per_unit VARCHAR(30),
+    unit_price NUMERIC(10, 2),
+    units_in_stock INTEGER,
+    units_on_order INTEGER,
+    reorder_level INTEGER,
+    discontinued INTEGER NOT NULL
+);
+
+CREATE TABLE orders (
+    order_id INTEGER PRIMARY KEY,
+    customer_id VARCHAR(10),
+    employee_id INTEGER,
+    order_date DATE,
+    required_date DATE,
+    shipped_date DATE,
+    ship_via SMALLINT,
+    freight NUMERIC(10, 2),
+    ship_name VARCHAR(80),
+    ship_city VARCHAR(30),
+    ship_country VARCHAR(30)
+);
+
+CREATE TABLE order_details (
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    unit_price NUMERIC(10, 2) NOT NULL,
+    quantity SMALLINT NOT NULL,
+    discount REAL NOT NULL,
+    PRIMARY KEY (order_id, product_id)
+);
+"""
+
+# Bağımlılık sırasının tersi (DROP ... CASCADE için)
+NORTHWIND_TABLES = ["order_details", "orders", "products", "customers", "employees", "shippers", "suppliers",
+                    "categories"]
+
+FOREIGN_KEY_SQL = [
+    "ALTER TABLE products ADD FOREIGN KEY (supplier_id) REFERENCES suppliers (supplier_id)",
+    "ALTER TABLE products ADD FOREIGN KEY (category_id) REFERENCES categories (category_id)",
+    "ALTER TABLE employees ADD FOREIGN KEY (reports_to) REFERENCES employees (employee_id)",
+    "ALTER TABLE orders ADD FOREIGN KEY (customer_id) REFERENCES customers (customer_id)",
+    "ALTER TABLE orders ADD FOREIGN KEY (employee_id) REFERENCES employees (employee_id)",
+    "ALTER TABLE orders ADD FOREIGN KEY (ship_via) REFERENCES shippers (shipper_id)",
+    "ALTER TABLE order_details ADD FOREIGN KEY (order_id) REFERENCES orders (order_id)",
+    "ALTER TABLE order_details ADD FOREIGN KEY (product_id) REFERENCES products (product_id)",
+]
+
+# Üretilen SQL'lerin tipik filtre/JOIN/sıralama kolonları
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders (customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_employee_id ON orders (employee_id)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders (order_date)",
+    "CREATE INDEX IF NOT EXISTS idx_order_details_product_id ON order_details (product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_products_category_id ON products (category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_products_supplier_id ON products (supplier_id)",
+    "CREATE INDEX IF NOT EXISTS idx_products_unit_price ON products (unit_price)",
+    "CREATE INDEX IF NOT EXISTS idx_products_units_in_stock ON products (units_in_stock)",
+    "CREATE INDEX IF NOT EXISTS idx_products_name_lower ON products (lower(product_name))",
+    "CREATE INDEX IF NOT EXISTS idx_customers_country ON customers (country)",
+]
+# product_name ILIKE '%...%' aramaları için (pg_trgm kurulamazsa atlanır)
+TRIGRAM_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (product_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_company_trgm ON customers USING gin (company_name gin_trgm_ops)",
+]
+
+FIRST_NAMES = [
+    "Ahmet", "Mehmet", "Mustafa", "Ali", "Hüseyin", "Hasan", "İbrahim", "Murat", "Emre", "Burak", "Can", "Cem",
+    "Oğuz", "Serkan", "Uğur", "Tolga", "Kerem", "Onur", "Barış", "Yusuf", "Ayşe", "Fatma", "Emine", "Hatice",
+    "Zeynep", "Elif", "Merve", "Özlem", "Gül", "Şule", "Derya", "Ebru", "Esra", "Selin", "Deniz", "Gizem",
+    "İrem", "Büşra", "Çiğdem", "Nur",
+]
+LAST_NAMES = [
+    "Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Yıldırım", "Öztürk", "Aydın", "Özdemir", "Arslan",
+    "Doğan", "Kılıç", "Aslan", "Çetin", "Kara", "Koç", "Kurt", "Özkan", "Şimşek", "Polat", "Korkmaz", "Erdoğan",
+    "Güneş", "Akın", "Bulut", "Türkmen", "Ekinci", "Uçar", "Güler",
+]
+CITIES = [
+    ("İstanbul", "Marmara", "34"), ("Ankara", "İç Anadolu", "06"), ("İzmir", "Ege", "35"), ("Bursa", "Marmara", "16"),
+    ("Antalya", "Akdeniz", "07"), ("Adana", "Akdeniz", "01"), ("Konya", "İç Anadolu", "42"),
+    ("Gaziantep", "Güneydoğu Anadolu", "27"), ("Kayseri", "İç Anadolu", "38"), ("Eskişehir", "İç Anadolu", "26"),
+    ("Trabzon", "Karadeniz", "61"), ("Samsun", "Karadeniz", "55"), ("Diyarbakır", "Güneydoğu Anadolu", "21"),
+    ("Mersin", "Akdeniz", "33"), ("Denizli", "Ege", "20"),
+]
+# Müşterilerin bir kısmı yurt dışından
+FOREIGN_CITIES = [("Berlin", "Almanya"), ("Londra", "Birleşik Krallık"), ("Paris", "Fransa"), ("Bakü", "Azerbaycan"),
+                  ("Amsterdam", "Hollanda"), ("Viyana", "Avusturya")]
+SECTORS = ["Gıda", "Market", "Ticaret", "Toptan", "Lokanta", "Kafe", "Şarküteri", "Dağıtım", "Pazarlama", "Unlu Mamuller"]
+COMPANY_SUFFIXES = ["Ltd. Şti.", "A.Ş.", "ve Ortakları", "Kardeşler", "Tic. Ltd."]
+CONTACT_TITLES = ["Satın Alma Müdürü", "Genel Müdür", "Satış Temsilcisi", "Muhasebe Müdürü", "İşletme Sahibi"]
+EMPLOYEE_TITLES = ["Satış Temsilcisi", "Kıdemli Satış Temsilcisi", "Bölge Satış Müdürü", "İç Satış Koordinatörü"]
+
+CATEGORIES = [
+    (1, "İçecekler", "Alkolsüz içecekler, kahve, çay"),
+    (2, "Çeşniler", "Tatlı ve tuzlu soslar, baharatlar"),
+    (3, "Şekerlemeler", "Tatlılar, şekerler, lokum"),
+    (4, "Süt Ürünleri", "Peynirler, yoğurtlar"),
+    (5, "Tahıllar", "Ekmek, makarna, bulgur"),
+    (6, "Et ve Tavuk", "Hazırlanmış etler"),
+    (7, "Kuru Gıdalar", "Kurutulmuş meyve, kuruyemiş, bakliyat"),
+    (8, "Deniz Ürünleri", "Balık ve deniz ürünleri"),
+]
+PRODUCT_BASES = {
+    1: ["Çay", "Türk Kahvesi", "Ayran", "Şalgam", "Limonata", "Maden Suyu", "Boza", "Salep"],
+    2: ["Nar Ekşisi", "Pul Biber", "Biber Salçası", "Domates Salçası", "Sumak", "Kekik", "Zeytinyağı"],
+    3: ["Lokum", "Baklava", "Helva", "Pişmaniye", "Cezerye", "Kestane Şekeri", "Akide Şekeri"],
+    4: ["Beyaz Peynir", "Kaşar", "Tulum Peyniri", "Süzme Yoğurt", "Kaymak", "Lor", "Çökelek"],
+    5: ["Bulgur", "Erişte", "Yufka", "Simit", "Tarhana", "Kuskus", "Pirinç"],
+    6: ["Sucuk", "Pastırma", "Kavurma", "Tavuk Göğsü", "Köfte", "Kuzu İncik"],
+    7: ["Fındık", "Antep Fıstığı", "Kuru Kayısı", "Kuru İncir", "Leblebi", "Nohut", "Kırmızı Mercimek"],
+    8: ["Hamsi", "Levrek", "Çipura", "Lakerda", "Midye", "Karides"],
+}
+PRODUCT_QUALIFIERS = ["Organik", "Ev Yapımı", "Köy", "Antep", "Trabzon", "Ege", "Karadeniz", "Geleneksel", "Ekstra",
+                      "Taze", "Özel", "Yöresel"]
+# Klasik Northwind adları: mevcut örnek sorular ("Chai stokta ne kadar var") büyük veride de çalışsın
+CLASSIC_PRODUCTS = [("Chai", 1, 18.0), ("Chang", 1, 19.0), ("Aniseed Syrup", 2, 10.0), ("Tofu", 7, 23.25),
+                    ("Konbu", 8, 6.0), ("Pavlova", 3, 17.45), ("Ikura", 8, 31.0), ("Geitost", 4, 2.5)]
+SHIPPERS = [(1, "Hızlı Kargo", "(0212) 555 10 10"), (2, "Anadolu Lojistik", "(0312) 555 20 20"),
+            (3, "Boğaziçi Taşımacılık", "(0216) 555 30 30")]
+ORDER_LINE_WEIGHTS = [30, 30, 20, 12, 8]   # siparişte 1..5 kalem
+DISCOUNTS = [0.0, 0.0, 0.0, 0.05, 0.1, 0.15, 0.2, 0.25]
+
+
+@dataclass
+class ScaleConfig:
+    customers: int
+    suppliers: int
+    products: int
+    employees: int
+    orders: int
+
+    @classmethod
+    def from_scale(cls, scale: float) -> "ScaleConfig":
+        return cls(
+            customers=max(10, int(2_000 * scale)),
+            suppliers=max(5, int(40 * scale)),
+            products=max(len(CLASSIC_PRODUCTS) + 8, int(500 * scale)),
+            employees=max(5, int(20 * scale)),
+            orders=max(50, int(50_000 * scale)),
+        )
+
+
+def _zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cum.append(total)
+    return cum
+
+
+def _pick(rng: random.Random, cum: List[float]) -> int:
+    # Kümülatif ağırlıklardan 0 tabanlı indeks (random.choices'tan hızlı; tek örnek için)
+    return bisect.bisect_left(cum, rng.random() * cum[-1])
+
+
+def _person(rng: random.Random) -> Tuple[str, str]:
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def _phone(rng: random.Random, area: str) -> str:
+    return f"(0{area}) {rng.randint(200, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+
+
+def _customer_id(i: int) -> str:
+    return f"C{i:07d}"
+
+
+def generate_suppliers(rng: random.Random, n: int) -> Iterator[Tuple[Any, ...]]:
+    for i in range(1, n + 1):
+        first, last = _person(rng)
+        city, _region, area = rng.choice(CITIES)
+        yield (i, f"{last} {rng.choice(SECTORS)} {rng.choice(COMPANY_SUFFIXES)}", f"{first} {last}",
+               rng.choice(CONTACT_TITLES), city, "Türkiye", _phone(rng, area))
+
+
+def generate_employees(rng: random.Random, n: int, today: date) -> Iterator[Tuple[Any, ...]]:
+    for i in range(1, n + 1):
+        first, last = _person(rng)
+        city, _region, _area = rng.choice(CITIES[:4])
+        birth = today - timedelta(days=rng.randint(22 * 365, 60 * 365))
+        hire = today - timedelta(days=rng.randint(30, 15 * 365))
+        # İlk çalışan yönetici; diğerleri ilk beş kişiden birine bağlı
+        reports_to = None if i == 1 else rng.randint(1, min(i - 1, 5))
+        title = "Satış Direktörü" if i == 1 else rng.choice(EMPLOYEE_TITLES)
+        yield (i, last, first, title, birth, hire, city, "Türkiye", reports_to)
+
+
+def generate_customers(rng: random.Random, n: int) -> Iterator[Tuple[Any, ...]]:
+    for i in range(1, n + 1):
+        first, last = _person(rng)
+        if rng.random() < 0.85:
+            city, region, area = rng.choice(CITIES)
+            country, postal = "Türkiye", f"{area}{rng.randint(0, 999):03d}"
+        else:
+            city, country = rng.choice(FOREIGN_CITIES)
+            region, postal, area = None, f"{rng.randint(1000, 99999)}", "850"
+        company = f"{rng.choice(LAST_NAMES)} {rng.choice(SECTORS)} {rng.choice(COMPANY_SUFFIXES)}"
+        yield (_customer_id(i), company, f"{first} {last}", rng.choice(CONTACT_TITLES), city, region, postal,
+               country, _phone(rng, area))
+
+
+def generate_products(rng: random.Random, n: int, suppliers: int) -> List[Tuple[Any, ...]]:
+    """
+    Ürün satırları (liste: fiyatlar sipariş kalemlerinde de kullanılır). Adlar benzersizdir.
+    """
+    rows: List[Tuple[Any, ...]] = []
+    seen = set()
+    for i, (name, category, price) in enumerate(CLASSIC_PRODUCTS, start=1):
+        rows.append((i, name, rng.randint(1, suppliers), category, "10 kutu x 20 adet", price,
+                     rng.randint(0, 120), 0, 10, 0))
+        seen.add(name)
+    while len(rows) < n:
+        category = rng.randint(1, len(CATEGORIES))
+        name = f"{rng.choice(PRODUCT_QUALIFIERS)} {rng.choice(PRODUCT_BASES[category])}"
+        if name in seen:
+            name = f"{name} {rng.choice(['250 g', '500 g', '1 kg', '2 kg', 'Paket', 'Kavanoz', 'Kutu'])}"
+        if name in seen:
+            name = f"{name} No.{len(rows) + 1}"
+        seen.add(name)
+        price = round(rng.lognormvariate(3.2, 0.8), 2)
+        stock = 0 if rng.random() < 0.05 else rng.randint(1, 500)
+        rows.append((len(rows) + 1, name, rng.randint(1, suppliers), category, rng.choice(["1 kg", "500 g", "12 adet",
+                     "24 şişe x 330 ml", "10 paket"]), price, stock, rng.choice([0, 0, 0, 10, 20, 50]),
+                     rng.choice([0, 5, 10, 15, 25]), 1 if rng.random() < 0.08 else 0))
+    return rows
+
+
+def generate_order_chunks(rng: random.Random, cfg: ScaleConfig, product_prices: Sequence[float], start: date,
+                          end: date, chunk_size: int
+                          ) -> Iterator[Tuple[List[Tuple[Any, ...]], List[Tuple[Any, ...]]]]:
+    """
+    (siparişler, sipariş_kalemleri) parçaları üretir; bellekte en fazla chunk_size sipariş tutulur.
+    Ürün ve müşteri seçimi Zipf dağılımlı; müşteri sıraları karıştırıldığı için popüler müşteriler
+    id'ye göre kümelenmez.
+    """
+    product_cum = _zipf_cum_weights(len(product_prices), 1.1)
+    customer_cum = _zipf_cum_weights(cfg.customers, 0.8)
+    customer_rank = list(range(1, cfg.customers + 1))
+    rng.shuffle(customer_rank)
+    span_days = max(1, (end - start).days)
+    line_counts = [i + 1 for i, w in enumerate(ORDER_LINE_WEIGHTS) for _ in range(w)]
+    orders: List[Tuple[Any, ...]] = []
+    details: List[Tuple[Any, ...]] = []
+    for order_id in range(1, cfg.orders + 1):
+        customer = _customer_id(customer_rank[_pick(rng, customer_cum)])
+        order_date = start + timedelta(days=rng.randint(0, span_days))
+        required = order_date + timedelta(days=rng.choice((14, 21, 28)))
+        shipped = order_date + timedelta(days=rng.randint(1, 10))
+        if shipped > end or rng.random() < 0.02:
+            shipped = None
+        city, _region, _area = rng.choice(CITIES)
+        orders.append((order_id, customer, rng.randint(1, cfg.employees), order_date, required, shipped,
+                       rng.randint(1, len(SHIPPERS)), round(rng.expovariate(1 / 60), 2), f"{customer} teslimat",
+                       city, "Türkiye"))
+        chosen = set()
+        for _ in range(rng.choice(line_counts)):
+            product_id = _pick(rng, product_cum) + 1
+            if product_id in chosen:
+                continue
+            chosen.add(product_id)
+            details.append((order_id, product_id, product_prices[product_id - 1],
+                            rng.choice((1, 2, 3, 5, 6, 10, 12, 15, 20, 24, 30, 40)), rng.choice(DISCOUNTS)))
+        if len(orders) >= chunk_size:
+            yield orders, details
+            orders, details = [], []
+    if orders:
+        yield orders, details
+
+
+def _csv_value(value: Any) -> Any:
+    # COPY csv: None -> boş alan (NULL)
+    return "" if value is None else value
+
+
+def _copy_rows(conn: Connection, table_name: str, columns: Sequence[str], rows: Iterable[Tuple[Any, ...]]) -> None:
+    dbapi_conn = conn.connection.dbapi_connection
+    cursor = dbapi_conn.cursor()
+    statement = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2: bellekteki CSV akışı
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([_csv_value(v) for v in row])
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+        else:
+            # psycopg 3: satırlar COPY protokolüyle doğrudan yazılır
+            with cursor.copy(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(conn: Connection, table_name: str, columns: Sequence[str], rows: Sequence[Tuple[Any, ...]],
+                 batch_size: int) -> None:
+    # Core insert + liste: SQLAlchemy çok satırlı VALUES parçalarına böler (insertmanyvalues)
+    target = table(table_name, *[column(c) for c in columns])
+    for start in range(0, len(rows), batch_size):
+        conn.execute(target.insert(), [dict(zip(columns, r)) for r in rows[start:start + batch_size]])
+
+
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    "categories": ["category_id", "category_name", "description"],
+    "suppliers": ["supplier_id", "company_name", "contact_name", "contact_title", "city", "country", "phone"],
+    "shippers": ["shipper_id", "company_name", "phone"],
+    "employees": ["employee_id", "last_name", "first_name", "title", "birth_date", "hire_date", "city", "country",
+                  "reports_to"],
+    "customers": ["customer_id", "company_name", "contact_name", "contact_title", "city", "region", "postal_code",
+                  "country", "phone"],
+    "products": ["product_id", "product_name", "supplier_id", "category_id", "quantity_per_unit", "unit_price",
+                 "units_in_stock", "units_on_order", "reorder_level", "discontinued"],
+    "orders": ["order_id", "customer_id", "employee_id", "order_date", "required_date", "shipped_date", "ship_via",
+               "freight", "ship_name", "ship_city", "ship_country"],
+    "order_details": ["order_id", "product_id", "unit_price", "quantity", "discount"],
+}
+
+
+def _load(conn: Connection, table_name: str, rows: Sequence[Tuple[Any, ...]], method: str, batch_size: int) -> int:
+    if not rows:
+        return 0
+    if method == "copy":
+        _copy_rows(conn, table_name, TABLE_COLUMNS[table_name], rows)
+    else:
+        _insert_rows(conn, table_name, TABLE_COLUMNS[table_name], rows, batch_size)
+    return len(rows)
+
+
+def create_indexes(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for stmt in FOREIGN_KEY_SQL + INDEX_SQL:
+            conn.execute(text(stmt))
+    # pg_trgm yetki isteyebilir; yoksa ILIKE aramaları lower() indeksine ve taramaya kalır
+    try:
+        with engine.begin() as conn:
+            for stmt in TRIGRAM_INDEX_SQL:
+                conn.execute(text(stmt))
+    except SQLAlchemyError as e:
+        print(f"pg_trgm indeksleri atlandı: {e.__class__.__name__}")
+
+
+def generate_data(engine: Engine, scale: float, method: str = "copy", batch_size: int = 50_000, seed: int = 42,
+                  start: Optional[date] = None, end: Optional[date] = None, indexes: bool = True) -> Dict[str, int]:
+    """
+    Northwind tablolarını yeniden oluşturur (mevcut tablolar DROP ... CASCADE ile silinir) ve
+    ölçeğe göre sentetik veriyle doldurur. Dönüş: tablo -> yüklenen satır sayısı.
+    """
+    rng = random.Random(seed)
+    cfg = ScaleConfig.from_scale(scale)
+    end = end or date.today()
+    start = start or end - timedelta(days=3 * 365)
+    counts: Dict[str, int] = {}
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS " + ", ".join(NORTHWIND_TABLES) + " CASCADE"))
+        for stmt in NORTHWIND_DDL.strip().split(";\n\n"):
+            if stmt.strip():
+                conn.execute(text(stmt))
+
+    with engine.begin() as conn:
+        counts["categories"] = _load(conn, "categories", CATEGORIES, method, batch_size)
+        counts["shippers"] = _load(conn, "shippers", SHIPPERS, method, batch_size)
+        counts["suppliers"] = _load(conn, "suppliers", list(generate_suppliers(rng, cfg.suppliers)), method,
+                                    batch_size)
+        counts["employees"] = _load(conn, "employees", list(generate_employees(rng, cfg.employees, end)), method,
+                                    batch_size)
+        customers = list(generate_customers(rng, cfg.customers))
+        counts["customers"] = _load(conn, "customers", customers, method, batch_size)
+        products = generate_products(rng, cfg.products, cfg.suppliers)
+        counts["products"] = _load(conn, "products", products, method, batch_size)
+    prices = [p[5] for p in products]
+    del customers
+
+    counts["orders"] = counts["order_details"] = 0
+    for orders, details in generate_order_chunks(rng, cfg, prices, start, end, batch_size):
+        # Her parça ayrı transaction: yarıda kesilen yükleme o ana kadarki veriyi korur
+        with engine.begin() as conn:
+            counts["orders"] += _load(conn, "orders", orders, method, batch_size)
+            counts["order_details"] += _load(conn, "order_details", details, method, batch_size)
+        print(f"  siparişler: {counts['orders']:,}/{cfg.orders:,}", end="\r", flush=True)
+    print()
+
+    if indexes:
+        create_indexes(engine)
+    # Planlayıcı istatistikleri (cost_gate'in EXPLAIN tahminleri gerçek boyutları görsün)
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+    return counts
 
 
 def ensure_schema(engine: Engine):
@@ -104,10 +565,36 @@ def ensure_schema(engine: Engine):
                 conn.execute(text(s))
 
 
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
 def main():
-    print("Veritabanı şeması oluşturuluyor / doğrulanıyor...")
+    parser = argparse.ArgumentParser(description="Demo verisi ya da ölçeklenebilir sentetik Northwind verisi yükler")
+    parser.add_argument("--scale", type=float,
+                        help="Üretici modu: ölçek faktörü (1 ≈ 50.000 sipariş). Northwind tabloları yeniden oluşturulur")
+    parser.add_argument("--method", choices=("copy", "executemany"), default="copy",
+                        help="Yükleme yöntemi (varsayılan: COPY)")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Parça başına sipariş / insert satırı")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-date", type=_parse_date, help="Sipariş tarihi başlangıcı (YYYY-AA-GG)")
+    parser.add_argument("--end-date", type=_parse_date, help="Sipariş tarihi bitişi (varsayılan: bugün)")
+    parser.add_argument("--no-indexes", action="store_true", help="İndeks ve yabancı anahtarları oluşturma")
+    args = parser.parse_args()
+
     engine = create_db_engine()
     try:
+        if args.scale is not None:
+            print(f"Sentetik Northwind verisi üretiliyor (ölçek {args.scale}, yöntem {args.method})...")
+            started = time.perf_counter()
+            counts = generate_data(engine, args.scale, method=args.method, batch_size=args.batch_size,
+                                   seed=args.seed, start=args.start_date, end=args.end_date,
+                                   indexes=not args.no_indexes)
+            for table_name, count in counts.items():
+                print(f"  {table_name:<14} {count:>12,} satır")
+            print(f"Tamamlandı: {time.perf_counter() - started:.1f} sn")
+            return
+        print("Veritabanı şeması oluşturuluyor / doğrulanıyor...")
         ensure_schema(engine)
         print("Şema hazır.")
         print("Örnek veriler ekleniyor...")
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from functools import partial
+from typing import Optional
+
+from aiohttp import web
+from env import load_env
+
+from async_pipeline import AskFn, StreamFn, answer_question_async, stream_question_async
+from context_loader import load_context_and_schema, start_schema_refresher
+from db import create_async_db_engine, create_db_engine
+from fuzzy_index import start_fuzzy_index
+from llm import DEFAULT_MODEL
+from llm_scheduler import get_llm_scheduler
+from sql_cache import get_sql_cache
+from tracing import get_collector, render_prometheus
+
+load_env()
+
+_json_dumps = partial(json.dumps, ensure_ascii=False, default=str)
+
+
+def get_service_max_concurrency() -> int:
+    """
+    Aynı anda işlenecek azami soru sayısı (LLM ve DB havuzunu korumak için).
+    """
+    try:
+        return int(os.getenv("SERVICE_MAX_CONCURRENCY", "32"))
+    except ValueError:
+        return 32
+
+
+async def _on_startup(app: web.Application) -> None:
+    if app["context_rules"] is None or app["schema_text"] is None:
+        rules, schema = await asyncio.to_thread(load_context_and_schema, "context.md")
+        app["context_rules"], app["schema_text"] = rules, schema
+
+        # Şema değişirse (fingerprint) yeni istekler güncel şemayı kullanır
+        def _on_schema_change(schema_text: str, _fingerprint: str) -> None:
+            app["schema_text"] = schema_text
+
+        start_schema_refresher(on_change=_on_schema_change)
+    if app["engine"] is None:
+        app["engine"] = create_async_db_engine()
+        app["owns_engine"] = True
+        # İndeks senkron engine ile okunur (arka plan thread'i, event loop'u bloklamaz)
+        try:
+            start_fuzzy_index(create_db_engine())
+        except Exception:
+            pass
+    if app["sql_cache"] is None:
+        try:
+            app["sql_cache"] = get_sql_cache(namespace=DEFAULT_MODEL)
+        except Exception:
+            app["sql_cache"] = None
+
+
+async def _on_cleanup(app: web.Application) -> None:
+    if app.get("owns_engine") and app["engine"] is not None:
+        await app["engine"].dispose()
+
+
+async def handle_ask(request: web.Request) -> web.Response:
+    try:
+        payload = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return web.json_response({"error": "Geçersiz JSON gövdesi."}, status=400)
+
+    question = str(payload.get("question") or "").strip() if isinstance(payload, dict) else ""
+    if not question:
+        return web.json_response({"error": "'question' alanı zorunludur."}, status=400)
+
+    app = request.app
+    async with app["semaphore"]:
+        try:
+            result = await answer_question_async(
+                app["engine"], app["context_rules"], app["schema_text"], question,
+                ask=app["ask"], sql_cache=app["sql_cache"],
+            )
+        except Exception as e:
+            return web.json_response({"question": question, "error": str(e)}, status=500, dumps=_json_dumps)
+    return web.json_response(result, dumps=_json_dumps)
+
+
+async def handle_ask_stream(request: web.Request) -> web.StreamResponse:
+    """
+    /ask'in Server-Sent Events sürümü: meta (SQL + önizleme), token (cevap parçaları), error, done.
+    """
+    try:
+        payload = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return web.json_response({"error": "Geçersiz JSON gövdesi."}, status=400)
+
+    question = str(payload.get("question") or "").strip() if isinstance(payload, dict) else ""
+    if not question:
+        return web.json_response({"error": "'question' alanı zorunludur."}, status=400)
+
+    app = request.app
+    async with app["semaphore"]:
+        events = stream_question_async(
+            app["engine"], app["context_rules"], app["schema_text"], question,
+            ask=app["ask"], stream=app["stream"], sql_cache=app["sql_cache"],
+        )
+        # SQL aşaması hatası başlıklar gönderilmeden önce olur; /ask ile aynı 500 cevabı döner
+        try:
+            first = await events.__anext__()
+        except Exception as e:
+            return web.json_response({"question": question, "error": str(e)}, status=500, dumps=_json_dumps)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+        try:
+            event, data = first
+            await response.write(f"event: {event}\ndata: {_json_dumps(data)}\n\n".encode("utf-8"))
+            async for event, data in events:
+                await response.write(f"event: {event}\ndata: {_json_dumps(data)}\n\n".encode("utf-8"))
+        except ConnectionResetError:
+            # İstemci ayrıldı; üreteci kapatmak LLM akışını da keser
+            pass
+        finally:
+            await events.aclose()
+        await response.write_eof()
+    return response
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "llm": get_llm_scheduler().stats()})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    # Prometheus metin formatı (span süre histogramları, token/satır sayaçları, cache hit/miss)
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def handle_traces(request: web.Request) -> web.Response:
+    try:
+        limit = int(request.query.get("limit", "100"))
+    except ValueError:
+        limit = 100
+    return web.json_response(get_collector().recent_spans(limit), dumps=_json_dumps)
+
+
+def create_app(context_rules: Optional[str] = None, schema_text: Optional[str] = None,
+               engine=None, ask: Optional[AskFn] = None, sql_cache=None,
+               stream: Optional[StreamFn] = None, max_concurrency: Optional[int] = None) -> web.Application:
+    """
+    HTTP uygulamasını kurar. Testlerde ask/stream (stub LLM), engine ve şema dışarıdan verilebilir.
+    """
+    app = web.Application()
+    app["context_rules"] = context_rules
+    app["schema_text"] = schema_text
+    app["engine"] = engine
+    app["owns_engine"] = False
+    app["ask"] = ask
+    app["stream"] = stream
+    app["sql_cache"] = sql_cache
+    app["semaphore"] = asyncio.Semaphore(max_concurrency or get_service_max_concurrency())
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    app.router.add_post("/ask", handle_ask)
+    app.router.add_post("/ask/stream", handle_ask_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/traces", handle_traces)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Türkçe soru -> SQL -> cevap HTTP servisi")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8080")))
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        # psycopg 3 async sürücüsü Windows'ta Proactor loop ile çalışmaz
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
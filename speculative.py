@@ -0,0 +1,259 @@
+import asyncio
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from env import load_env
+
+from cost_gate import CostGateError, check_query_cost, check_query_cost_async, is_cost_gate_enabled
+from fuzzy_index import get_fuzzy_index
+from llm import ask_llm, ask_llm_async, build_sql_prompt, prewarm_answer_prompt, prewarm_llm
+from pipeline import extract_search_terms, postprocess_generated_sql
+from tracing import current_span, traced
+
+load_env()
+
+# Spekülatif mod (SPECULATIVE_MODE=true):
+# - SQL çalışırken cevap modeli istemcisi/bağlantısı ve cevap prompt'unun şema bölümü arka planda hazırlanır.
+# - Belirsiz sorularda (bulanık indeksin tek isme bağlayamadığı ürün aramaları) farklı temperature'larla
+#   2-3 aday SQL eşzamanlı üretilip çalıştırılır; sonuç veren en düşük temperature'lı aday kazanır
+#   (hâlâ çalışan daha düşük temperature'lı adaylar beklenir), daha yüksek olanlar iptal edilir.
+#   COST_GATE_ENABLED=true ise her aday çalıştırılmadan önce maliyet kapısından geçer; reddedilen aday elenir.
+# Ek sağlayıcı maliyeti karşılığında "boş sonuç -> fallback" yolundaki kuyruk gecikmesi kısalır.
+
+# execute_with_fallbacks ile aynı dönüş: (sql, kolonlar, satırlar, strateji, öneriler)
+ExecResult = Tuple[str, List[str], List[Tuple[Any, ...]], Optional[str], List[str]]
+
+# Yazım hatası sayılacak en düşük benzerlik (altı alakasız sözcük kabul edilir)
+AMBIGUOUS_MIN_SCORE = 0.75
+
+_prewarm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="answer-prewarm")
+_candidate_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="speculative-sql")
+
+
+def is_speculative_enabled() -> bool:
+    return os.getenv("SPECULATIVE_MODE", "false").lower() == "true"
+
+
+def get_speculative_temperatures() -> List[float]:
+    """
+    Aday SQL'ler için temperature listesi (SPECULATIVE_TEMPERATURES, varsayılan "0.0,0.4,0.8"; en fazla 3).
+    """
+    raw = os.getenv("SPECULATIVE_TEMPERATURES", "0.0,0.4,0.8")
+    try:
+        temps = [float(t) for t in raw.split(",") if t.strip()]
+    except ValueError:
+        temps = [0.0, 0.4, 0.8]
+    return temps[:3] or [0.0]
+
+
+def is_ambiguous_question(question: str) -> bool:
+    """
+    Tipik "boş sonuç -> fallback" adayı olan sorular:
+    - tırnaklı arama terimi indeksteki tek bir isme bağlanamıyorsa (indeks hazır değilse her tırnaklı terim)
+    - sorudaki bir sözcük birden çok ürün adında geçiyorsa ("chef", "sauce")
+    - bir sözcük hiçbir ürün adında geçmiyor ama bir ada çok benziyorsa (yazım hatası: "chaii")
+    """
+    index = get_fuzzy_index()
+    terms = extract_search_terms(question)
+    if terms and (index is None or any(index.canonicalize(term) is None for term in terms)):
+        return True
+    if index is None:
+        return False
+    for word in re.findall(r"\w{4,}", question):
+        if len(index.containing(word)) > 1:
+            return True
+        hits = index.search(word, limit=1, min_score=AMBIGUOUS_MIN_SCORE)
+        if hits and hits[0][1] < 0.9 and not index.containing(word):
+            return True
+    return False
+
+
+def start_answer_prewarm(schema_text: str, question: str, sql_query: str) -> Optional[Future]:
+    """
+    SQL çalışırken cevap adımını hazırlar (istemci/bağlantı + şema bölümü). Spekülatif mod kapalıysa None.
+    """
+    if not is_speculative_enabled():
+        return None
+
+    def _run() -> None:
+        prewarm_llm(temperature=0.1)
+        try:
+            prewarm_answer_prompt(schema_text, question, sql_query)
+        except Exception:
+            pass
+
+    return _prewarm_pool.submit(contextvars.copy_context().run, _run)
+
+
+def _is_valid_sql(sql: str) -> bool:
+    return bool(sql) and sql.strip().lower() != "select 1"
+
+
+def _gate_candidate(engine, sql: str) -> str:
+    # Adaylar yeniden üretilmez: maliyet kapısının reddettiği aday CostGateError ile elenir.
+    # EXPLAIN çalışmazsa (izin, sözdizimi) karar execute_with_fallbacks'e bırakılır.
+    if not is_cost_gate_enabled():
+        return sql
+    try:
+        decision = check_query_cost(engine, sql)
+    except Exception:
+        return sql
+    if decision.action == "rejected":
+        raise CostGateError(f"Sorgu maliyet sınırını aşıyor:\n{decision.reason}")
+    return decision.sql
+
+
+async def _gate_candidate_async(engine, sql: str) -> str:
+    if not is_cost_gate_enabled():
+        return sql
+    try:
+        decision = await check_query_cost_async(engine, sql)
+    except Exception:
+        return sql
+    if decision.action == "rejected":
+        raise CostGateError(f"Sorgu maliyet sınırını aşıyor:\n{decision.reason}")
+    return decision.sql
+
+
+@traced("speculative")
+def run_speculative(engine, context_rules: str, schema_text: str, question: str,
+                    ask: Optional[Callable[..., str]] = None, max_rows: Optional[int] = None,
+                    temperatures: Optional[List[float]] = None) -> ExecResult:
+    """
+    Aday SQL'leri farklı temperature'larla eşzamanlı üretir ve her birini execute_with_fallbacks ile çalıştırır.
+    Satır döndüren en düşük temperature'lı aday kazanır: daha yüksek temperature'lı bir aday önce bitse de
+    hâlâ çalışan daha düşük temperature'lı adaylar beklenir. Kazanan kesinleşince başlamamış adaylar iptal
+    edilir, çalışanların sonucu beklenmez (sunucudaki sorgular statement_timeout ile sınırlıdır).
+    Hiçbiri sonuç vermezse en düşük temperature'lı geçerli adayın sonucu (önerilerle birlikte) döner.
+    """
+    from fallback import execute_with_fallbacks
+
+    ask = ask or ask_llm
+    temperatures = temperatures or get_speculative_temperatures()
+    messages = build_sql_prompt(context_rules, schema_text, question)
+    # Aynı SQL'i üreten adaylar sorguyu ikinci kez çalıştırmaz
+    executions: Dict[str, Future] = {}
+    lock = threading.Lock()
+
+    def _execute(sql: str) -> ExecResult:
+        return execute_with_fallbacks(engine, sql, question, max_rows=max_rows)
+
+    def _candidate(temperature: float) -> Optional[ExecResult]:
+        sql = postprocess_generated_sql(ask(messages, temperature=temperature, mode="sql"), schema_text)
+        if not _is_valid_sql(sql):
+            return None
+        sql = _gate_candidate(engine, sql)
+        with lock:
+            shared = executions.get(sql)
+            owner = shared is None
+            if owner:
+                shared = executions[sql] = Future()
+        if not owner:
+            return shared.result()
+        try:
+            result = _execute(sql)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        shared.set_result(result)
+        return result
+
+    # Havuz thread'leri contextvar'ları devralmaz: LLM şeridi (batch) ve izleme span'i her adaya kopyalanır
+    futures = {_candidate_pool.submit(contextvars.copy_context().run, _candidate, t): t for t in temperatures}
+    pending = set(futures)
+    results: Dict[float, ExecResult] = {}
+    winner: Optional[float] = None
+    rejected: Optional[CostGateError] = None
+    # Kazanan, ondan düşük temperature'lı aday kalmayınca kesinleşir
+    while pending and (winner is None or any(futures[f] < winner for f in pending)):
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                result = fut.result()
+            except CostGateError as e:
+                rejected = e
+                continue
+            except Exception:
+                continue
+            if result is None:
+                continue
+            results[futures[fut]] = result
+            if result[2] and (winner is None or futures[fut] < winner):
+                winner = futures[fut]
+    for fut in pending:
+        fut.cancel()
+
+    current_span().update(candidates=len(temperatures), valid=len(results), winner_temperature=winner)
+    if winner is None:
+        if not results:
+            if rejected is not None:
+                raise rejected
+            raise RuntimeError("Spekülatif modda geçerli SQL üretilemedi.")
+        winner = min(results)
+    sql, columns, rows, strategy, suggestions = results[winner]
+    label = f"spekülatif (t={winner})"
+    return sql, columns, rows, f"{label} + {strategy}" if strategy else label, suggestions
+
+
+@traced("speculative")
+async def run_speculative_async(engine, context_rules: str, schema_text: str, question: str,
+                                ask: Optional[Callable[..., Awaitable[str]]] = None,
+                                temperatures: Optional[List[float]] = None
+                                ) -> Tuple[str, List[str], List[Tuple[Any, ...]], List[str]]:
+    """
+    run_speculative'in asyncio karşılığı. Kazanan kesinleşince diğer görevler iptal edilir; psycopg 3
+    iptal edilen görevin sunucudaki sorgusunu da iptal eder.
+    Dönüş: execute_with_fallbacks_async ile aynı (sql, kolonlar, satırlar, öneriler)
+    """
+    from async_pipeline import execute_with_fallbacks_async
+
+    ask = ask or ask_llm_async
+    temperatures = temperatures or get_speculative_temperatures()
+    messages = build_sql_prompt(context_rules, schema_text, question)
+    executions: Dict[str, "asyncio.Task[Any]"] = {}
+
+    async def _candidate(temperature: float):
+        sql = postprocess_generated_sql(await ask(messages, temperature=temperature, mode="sql"), schema_text)
+        if not _is_valid_sql(sql):
+            return None
+        sql = await _gate_candidate_async(engine, sql)
+        task = executions.get(sql)
+        if task is None:
+            task = executions[sql] = asyncio.ensure_future(execute_with_fallbacks_async(engine, sql, question))
+        # shield: aynı sorguyu bekleyen diğer aday iptal edilirse paylaşılan sorgu iptal olmasın
+        return await asyncio.shield(task)
+
+    tasks = {asyncio.ensure_future(_candidate(t)): t for t in temperatures}
+    pending = set(tasks)
+    results: Dict[float, Any] = {}
+    winner: Optional[float] = None
+    rejected: Optional[BaseException] = None
+    try:
+        while pending and (winner is None or any(tasks[t] < winner for t in pending)):
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                if isinstance(task.exception(), CostGateError):
+                    rejected = task.exception()
+                if task.exception() is not None or task.result() is None:
+                    continue
+                results[tasks[task]] = task.result()
+                if task.result()[2] and (winner is None or tasks[task] < winner):
+                    winner = tasks[task]
+    finally:
+        for task in list(pending) + list(executions.values()):
+            task.cancel()
+
+    current_span().update(candidates=len(temperatures), valid=len(results), winner_temperature=winner)
+    if winner is None:
+        if not results:
+            if rejected is not None:
+                raise rejected
+            raise RuntimeError("Spekülatif modda geçerli SQL üretilemedi.")
+        winner = min(results)
+    return results[winner]
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+from env import load_env
+
+from tracing import span
+
+load_env()
+
+
+def get_sql_cache_path() -> str:
+    return os.getenv("SQL_CACHE_PATH", ".sql_cache.sqlite3")
+
+
+def get_sql_cache_ttl_seconds() -> int:
+    try:
+        return int(os.getenv("SQL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    except ValueError:
+        return 7 * 24 * 3600
+
+
+def get_sql_cache_max_entries() -> int:
+    try:
+        return int(os.getenv("SQL_CACHE_MAX_ENTRIES", "5000"))
+    except ValueError:
+        return 5000
+
+
+def is_sql_cache_enabled() -> bool:
+    return os.getenv("SQL_CACHE_ENABLED", "true").lower() == "true"
+
+
+# Türkçe büyük/küçük harf dönüşümü: I -> ı, İ -> i. Anahtar üretiminde noktalı/noktasız
+# i farkını da yok sayıyoruz ki "CHAI", "Chai" ve "chaı" aynı kayda düşsün.
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+_DOTLESS_FOLD = str.maketrans({"ı": "i"})
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Soruyu cache anahtarı için sadeleştirir:
+    - Unicode NFC + Türkçe küçük harfe indirme
+    - Noktalama işaretlerini boşluğa çevirme
+    - Birden çok boşluğu teke indirme
+    """
+    q = unicodedata.normalize("NFC", question or "")
+    q = q.translate(_TR_LOWER).lower().translate(_DOTLESS_FOLD)
+    q = _PUNCT_RE.sub(" ", q)
+    return _SPACE_RE.sub(" ", q).strip()
+
+
+def schema_fingerprint(schema_text: str) -> str:
+    """
+    Şema metninin kısa bir özetini (hash) döndürür. Şema değişirse cache anahtarı da değişir.
+    """
+    lines = [ln.strip() for ln in (schema_text or "").strip().splitlines() if ln.strip()]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(question: str, schema_text: str, namespace: str = "") -> str:
+    raw = f"{namespace}|{schema_fingerprint(schema_text)}|{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SqlCache:
+    """
+    Soru -> SQL eşleşmelerini SQLite dosyasında tutan kalıcı cache.
+    - TTL: created_at üzerinden, süresi dolan kayıt miss sayılır ve silinir.
+    - LRU: max_entries aşılınca en uzun süredir kullanılmayan kayıtlar atılır.
+    - hits/misses/evictions sayaçları süreç içinde tutulur (stats()).
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None, namespace: str = ""):
+        self.path = path or get_sql_cache_path()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else get_sql_cache_ttl_seconds()
+        self.max_entries = max_entries if max_entries is not None else get_sql_cache_max_entries()
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sql_cache_last_used ON sql_cache(last_used)")
+
+    def get(self, question: str, schema_text: str) -> Optional[str]:
+        with span("sql_cache.get") as sp:
+            sql = self._get(question, schema_text)
+            sp.set("cache_hit", sql is not None)
+            return sql
+
+    def _get(self, question: str, schema_text: str) -> Optional[str]:
+        key = make_cache_key(question, schema_text, self.namespace)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql, created_at FROM sql_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            sql, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE sql_cache SET last_used = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (now, key),
+            )
+            self.hits += 1
+            return sql
+
+    def put(self, question: str, schema_text: str, sql: str) -> None:
+        key = make_cache_key(question, schema_text, self.namespace)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO sql_cache (key, question, sql, created_at, last_used, hit_count)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(key) DO UPDATE SET sql = excluded.sql,
+                    created_at = excluded.created_at, last_used = excluded.last_used
+                """,
+                (key, normalize_question(question), sql, now, now),
+            )
+            self._evict_locked(now)
+
+    def _evict_locked(self, now: float) -> None:
+        if self.ttl_seconds > 0:
+            cur = self._conn.execute(
+                "DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cur.rowcount, 0)
+        if self.max_entries > 0:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM sql_cache WHERE key IN "
+                    "(SELECT key FROM sql_cache ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# namespace (ör. model adı) başına bir cache; aynı dosyayı paylaşır, anahtarlar namespace ile ayrılır
+_caches: Dict[str, SqlCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_sql_cache(namespace: str = "") -> Optional[SqlCache]:
+    """
+    Verilen namespace için süreç genelinde paylaşılan cache'i döndürür. SQL_CACHE_ENABLED=false ise None.
+    """
+    if not is_sql_cache_enabled():
+        return None
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = _caches[namespace] = SqlCache(namespace=namespace)
+        return cache
@@ -0,0 +1,415 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sql_normalizer import SQL_KEYWORDS
+
+# execute_select öncesi SQL doğrulama ve LIMIT yeniden yazımı.
+# SQL tek bir tokenizer regex'iyle token'lara ayrılır (literal, $$...$$, yorum, tırnaklı kimlik ayrı token);
+# parantez derinliği ve her parantezin türü (fonksiyon çağrısı / alt sorgu) izlenerek:
+# - birden çok ifade (";" sonrası ikinci sorgu), CTE veya alt sorgu içindeki yazma işlemleri,
+#   SELECT ... INTO, FOR UPDATE/SHARE ve yan etkili fonksiyonlar reddedilir
+# - yalnızca en dıştaki sorgunun LIMIT/FETCH değeri eklenir ya da üst sınıra indirilir
+#   (alt sorgu veya kolon adındaki "limit" dıştaki sorguyu sınırsız bırakmaz)
+# - başvurulan tablo ve kolonlar çıkarılır
+# Ayrıştırma sonucu SQL metni başına önbelleklenir (aynı SQL fallback/cache yollarında tekrar gelir).
+
+PARSE_CACHE_SIZE = 1024
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<literal>[eE]'(?:[^'\\]|''|\\.)*'|'(?:[^']|'')*'|\$(?P<tag>(?:[^\W\d]\w*)?)\$.*?\$(?P=tag)\$)
+    |(?P<quoted>"(?:[^"]|"")+")
+    |(?P<cast>::)
+    |(?P<param>:\w+|\$\d+)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    |(?P<word>[^\W\d]\w*)
+    |(?P<punct>[(),;.\[\]])
+    |(?P<op>[^\s\w'"(),;.\[\]$:]+|:)
+    |(?P<other>.)
+    """,
+    re.S | re.X,
+)
+
+# Sorgunun (veya CTE/alt sorgu gövdesinin) başında izin verilen sözcükler
+READ_STATEMENTS = {"select", "with", "values", "table"}
+# Herhangi bir derinlikte görülürse sorguyu reddeden sözcükler (tırnaksız, nitelenmemiş)
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "merge", "truncate", "drop", "alter", "create", "grant", "revoke",
+    "copy", "call", "vacuum", "reindex", "cluster", "refresh", "lock", "into", "execute", "prepare",
+    "deallocate", "listen", "notify", "unlisten", "discard",
+}
+# Yan etkili ya da sunucuyu meşgul eden fonksiyonlar
+UNSAFE_FUNCTIONS = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "set_config", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_reload_conf", "pg_rotate_logfile", "lo_import", "lo_export", "lo_unlink", "pg_read_file",
+    "pg_read_binary_file", "pg_ls_dir", "pg_stat_file", "dblink", "dblink_exec", "nextval", "setval",
+    "pg_advisory_lock", "pg_advisory_xact_lock", "txid_current", "pg_notify",
+}
+# FOR UPDATE / FOR SHARE / FOR NO KEY UPDATE / FOR KEY SHARE
+_LOCK_WORDS = {"update", "share", "no", "key"}
+# Önündeki sözcük bunlardan biriyse "(" fonksiyon çağrısı değil alt sorgu/gruplamadır
+_GROUPING_WORDS = {
+    "select", "from", "join", "in", "exists", "as", "on", "where", "and", "or", "not", "union", "all",
+    "any", "some", "lateral", "with", "recursive", "materialized", "values", "then", "else", "when",
+    "by", "having", "intersect", "except", "using", "case", "limit", "offset", "is", "distinct", "array",
+}
+# guard_select'in daha önce sardığı LIMIT ifadesi: LEAST(ifade, n) ya da (LEAST(ifade, n))
+_LEAST_LIMIT_RE = re.compile(r"^\(?\s*least\s*\((?:[^()]|\([^()]*\))*,\s*(\d+)\s*\)\s*\)?$", re.IGNORECASE)
+# Dıştaki LIMIT ifadesini sonlandıran sözcükler
+_LIMIT_END_WORDS = {"offset", "fetch", "for"}
+# Kolon sayılmayacak ek sözcükler (tip adları, tarih parçaları, pencere/örnekleme sözdizimi)
+_NON_COLUMN_WORDS = SQL_KEYWORDS | {
+    "similar", "to", "any", "some", "escape", "at", "zone", "of", "for", "no", "key", "share", "update",
+    "both", "leading", "trailing", "current_date", "current_time", "current_timestamp", "localtime",
+    "localtimestamp", "date", "time", "timestamp", "timestamptz", "text", "varchar", "char", "character",
+    "varying", "integer", "int", "int2", "int4", "int8", "smallint", "bigint", "numeric", "decimal", "real",
+    "double", "precision", "float", "boolean", "bool", "json", "jsonb", "uuid", "bytea", "year", "month",
+    "day", "hour", "minute", "second", "epoch", "dow", "doy", "week", "quarter", "isodow", "tablesample",
+    "bernoulli", "system", "repeatable", "search", "cycle", "depth", "breadth", "set", "row", "next",
+    "percent", "preceding", "following", "unbounded", "current", "groups", "exclude", "others", "ties",
+    "default", "unknown", "materialized", "array", "user", "session_user", "current_user",
+}
+
+
+class UnsafeSqlError(ValueError):
+    """
+    Doğrulamadan geçmeyen SQL (ValueError: eski SELECT guard'ıyla aynı hata türü).
+    """
+
+
+@dataclass(frozen=True)
+class _Tok:
+    kind: str     # word, quoted, literal, number, param, cast, punct, op
+    value: str    # word için küçük harf; tırnaklı kimlikte tırnaksız ad
+    start: int
+    end: int
+    depth: int
+    in_func: bool  # en yakın açık parantez bir fonksiyon çağrısına ait
+
+
+@dataclass(frozen=True)
+class ParsedSql:
+    """
+    error: doğrulama hatası (None = çalıştırılabilir)
+    tables: başvurulan tablolar (CTE adları hariç, şema öneki atılmış)
+    columns: başvurulan kolonlar; niteleyicisi bir tabloya bağlanabilenler "tablo.kolon" biçiminde
+             (yaklaşık: AS'siz takma adlar da kolon sayılabilir)
+    limit: dıştaki sorgunun sayısal LIMIT/FETCH değeri (yoksa veya ifade ise None)
+    """
+    sql: str
+    error: Optional[str]
+    tables: FrozenSet[str] = frozenset()
+    columns: FrozenSet[str] = frozenset()
+    cte_names: FrozenSet[str] = frozenset()
+    limit: Optional[int] = None
+    # Yeniden yazım için karakter aralıkları: (başlangıç, bitiş)
+    limit_span: Optional[Tuple[int, int]] = field(default=None, repr=False)
+    limit_kind: Optional[str] = field(default=None, repr=False)  # "limit" | "fetch"
+    end: int = field(default=0, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _tokenize(sql: str) -> Tuple[List[_Tok], Optional[str]]:
+    tokens: List[_Tok] = []
+    # Açık parantezlerin türü: True = fonksiyon çağrısı
+    stack: List[bool] = []
+    for m in _TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        raw = m.group()
+        if kind == "other":
+            if raw in ("'", '"') or raw == "$":
+                return tokens, "Kapanmamış tırnak ya da dolar tırnağı."
+            return tokens, f"Beklenmeyen karakter: {raw!r}"
+        if kind == "op" and "/*" in raw:
+            # Kapanmamış "/*" yorum olarak eşleşmez, operatör token'ına düşer
+            return tokens, "Kapanmamış yorum."
+        value = raw.lower() if kind == "word" else raw[1:-1].replace('""', '"') if kind == "quoted" else raw
+        in_func = bool(stack) and stack[-1]
+        if raw == "(":
+            prev = tokens[-1] if tokens else None
+            is_func = prev is not None and (
+                prev.kind == "quoted" or (prev.kind == "word" and prev.value not in _GROUPING_WORDS)
+            )
+            tokens.append(_Tok("punct", raw, m.start(), m.end(), len(stack), in_func))
+            stack.append(is_func)
+            continue
+        if raw == ")":
+            if not stack:
+                return tokens, "Parantezler dengesiz."
+            stack.pop()
+            in_func = bool(stack) and stack[-1]
+        tokens.append(_Tok(kind, value, m.start(), m.end(), len(stack), in_func))
+    if stack:
+        return tokens, "Parantezler dengesiz."
+    return tokens, None
+
+
+def _is_word(tok: Optional[_Tok], *values: str) -> bool:
+    return tok is not None and tok.kind == "word" and (not values or tok.value in values)
+
+
+def _check_safety(toks: List[_Tok], main_start: int) -> Optional[str]:
+    for i, tok in enumerate(toks):
+        if tok.kind != "word":
+            continue
+        prev = toks[i - 1] if i else None
+        nxt = toks[i + 1] if i + 1 < len(toks) else None
+        if prev is not None and prev.value == ".":
+            continue  # nitelenmiş kolon adı (x.update)
+        if tok.value == "for" and _is_word(nxt, *_LOCK_WORDS):
+            return "Satır kilitleyen (FOR UPDATE/SHARE) sorgular çalıştırılamaz."
+        if tok.value in WRITE_KEYWORDS:
+            if tok.value == "into":
+                return "SELECT ... INTO ile tablo oluşturulamaz."
+            if toks[0].value == "with" and tok.depth > 0 and i < main_start:
+                return f"CTE içinde yazma işlemi ({tok.value.upper()}) çalıştırılamaz."
+            return f"Yazma işlemi ({tok.value.upper()}) içeren sorgular çalıştırılamaz."
+        if tok.value in UNSAFE_FUNCTIONS and nxt is not None and nxt.value == "(":
+            return f"{tok.value}() çağrısı içeren sorgular çalıştırılamaz."
+    return None
+
+
+def _main_start(toks: List[_Tok]) -> int:
+    # WITH ... AS (...) tanımlarından sonra dıştaki sorgunun başladığı token
+    if toks[0].value != "with":
+        return 0
+    for i in range(1, len(toks)):
+        tok = toks[i]
+        if tok.depth == 0 and (_is_word(tok, "select", "values", "table") or _is_word(tok, *WRITE_KEYWORDS)):
+            return i
+    return len(toks)
+
+
+def _cte_names(toks: List[_Tok]) -> Set[str]:
+    names: Set[str] = set()
+    for i, tok in enumerate(toks):
+        if not _is_word(tok, "with"):
+            continue
+        for j in range(i + 1, len(toks)):
+            cur = toks[j]
+            if cur.depth < tok.depth or (cur.depth == tok.depth and _is_word(cur, "select", "values", "table")):
+                break
+            nxt = toks[j + 1] if j + 1 < len(toks) else None
+            if (cur.depth == tok.depth and cur.kind in ("word", "quoted") and nxt is not None
+                    and (_is_word(nxt, "as") or nxt.value == "(")
+                    and cur.value not in ("recursive", "materialized", "not", "as")):
+                names.add(cur.value)
+    return names
+
+
+def _skip_group(toks: List[_Tok], i: int) -> int:
+    # toks[i] "(" ise eşleşen ")" sonrasındaki indeks
+    depth = toks[i].depth
+    for j in range(i + 1, len(toks)):
+        if toks[j].value == ")" and toks[j].depth == depth:
+            return j + 1
+    return len(toks)
+
+
+def _table_refs(toks: List[_Tok], ctes: Set[str]) -> Tuple[Set[str], Dict[str, str], Set[int]]:
+    """
+    FROM/JOIN sonrasındaki tablo listeleri. Dönüş: (tablolar, takma_ad -> tablo, tüketilen token indeksleri)
+    Fonksiyon içindeki FROM (extract(year from x), substring(x from 1)) ve IS DISTINCT FROM atlanır.
+    """
+    tables: Set[str] = set()
+    aliases: Dict[str, str] = {}
+    used: Set[int] = set()
+    for i, tok in enumerate(toks):
+        if not _is_word(tok, "from", "join") or tok.in_func:
+            continue
+        if tok.value == "from" and i > 0 and _is_word(toks[i - 1], "distinct"):
+            continue
+        j = i + 1
+        while j < len(toks):
+            while _is_word(toks[j] if j < len(toks) else None, "lateral", "only"):
+                j += 1
+            if j >= len(toks):
+                break
+            ref = toks[j]
+            name: Optional[str] = None
+            if ref.value == "(":
+                j = _skip_group(toks, j)
+            elif ref.kind in ("word", "quoted"):
+                used.add(j)
+                name = ref.value
+                j += 1
+                # schema.tablo
+                if j + 1 < len(toks) and toks[j].value == "." and toks[j + 1].kind in ("word", "quoted"):
+                    used.update((j, j + 1))
+                    name = toks[j + 1].value
+                    j += 2
+                if j < len(toks) and toks[j].value == "(":
+                    # FROM generate_series(...) gibi tablo fonksiyonu
+                    name = None
+                    j = _skip_group(toks, j)
+                elif name not in ctes:
+                    tables.add(name)
+            else:
+                break
+            # [AS] takma_ad [(kolonlar)]
+            if _is_word(toks[j] if j < len(toks) else None, "as"):
+                j += 1
+            if j < len(toks) and toks[j].kind in ("word", "quoted") and toks[j].value not in _NON_COLUMN_WORDS \
+                    and toks[j].value not in _GROUPING_WORDS:
+                used.add(j)
+                aliases[toks[j].value] = name or toks[j].value
+                j += 1
+                if j < len(toks) and toks[j].value == "(":
+                    j = _skip_group(toks, j)
+            if name:
+                aliases.setdefault(name, name)
+            if tok.value == "from" and j < len(toks) and toks[j].value == "," and toks[j].depth == tok.depth:
+                j += 1
+                continue
+            break
+    return tables, aliases, used
+
+
+def _columns(toks: List[_Tok], tables: Set[str], aliases: Dict[str, str], used: Set[int],
+             ctes: Set[str]) -> Set[str]:
+    columns: Set[str] = set()
+    output_aliases: Set[str] = set()
+    for i, tok in enumerate(toks):
+        if tok.kind not in ("word", "quoted") or i in used:
+            continue
+        prev = toks[i - 1] if i else None
+        nxt = toks[i + 1] if i + 1 < len(toks) else None
+        if prev is not None and prev.kind == "cast":
+            continue
+        if _is_word(prev, "as"):
+            output_aliases.add(tok.value)
+            continue
+        if nxt is not None and (nxt.value == "(" or nxt.kind == "literal"):
+            continue  # fonksiyon çağrısı ya da date '...' gibi tipli literal
+        if prev is not None and prev.value == ".":
+            qualifier = toks[i - 2].value if i >= 2 else ""
+            table = aliases.get(qualifier)
+            columns.add(f"{table}.{tok.value}" if table and table not in ctes else tok.value)
+            continue
+        if nxt is not None and nxt.value == ".":
+            continue  # niteleyici (tablo/takma ad)
+        if tok.kind == "word" and tok.value in _NON_COLUMN_WORDS:
+            continue
+        if tok.value in ctes or tok.value in aliases or tok.value in tables:
+            continue
+        columns.add(tok.value)
+    return columns - output_aliases
+
+
+def _outer_limit(toks: List[_Tok], main_start: int
+                 ) -> Tuple[Optional[Tuple[int, int]], Optional[str], Optional[int]]:
+    # Dıştaki sorgunun (derinlik 0) LIMIT ya da FETCH FIRST n değerinin karakter aralığı
+    for i in range(main_start, len(toks)):
+        tok = toks[i]
+        if tok.depth != 0:
+            continue
+        if _is_word(tok, "limit"):
+            j = i + 1
+            while j < len(toks) and not (toks[j].depth == 0 and _is_word(toks[j], *_LIMIT_END_WORDS)):
+                j += 1
+            if j == i + 1:
+                return None, None, None
+            expr = toks[i + 1:j]
+            value = int(expr[0].value) if len(expr) == 1 and expr[0].value.isdigit() else None
+            return (expr[0].start, expr[-1].end), "limit", value
+        if _is_word(tok, "fetch") and _is_word(toks[i + 1] if i + 1 < len(toks) else None, "first", "next"):
+            j = i + 2
+            k = j
+            while k < len(toks) and not _is_word(toks[k], "row", "rows"):
+                k += 1
+            if k == j or k >= len(toks):
+                # FETCH FIRST ROW ONLY: tek satır
+                return None, "fetch", 1
+            expr = toks[j:k]
+            value = int(expr[0].value) if len(expr) == 1 and expr[0].value.isdigit() else None
+            return (expr[0].start, expr[-1].end), "fetch", value
+    return None, None, None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_sql(sql: str) -> ParsedSql:
+    """
+    SQL'i ayrıştırıp doğrular. Hata olsa da (çıkarılabildiği kadar) tablo/kolon bilgisi döner.
+    """
+    toks, error = _tokenize(sql)
+    if error:
+        return ParsedSql(sql=sql, error=error)
+    # Sondaki ";" (birden çok olabilir) atılır; arada ";" varsa ikinci ifade vardır
+    while toks and toks[-1].value == ";":
+        toks.pop()
+    if not toks:
+        return ParsedSql(sql=sql, error="Boş sorgu.")
+    if any(t.value == ";" for t in toks):
+        return ParsedSql(sql=sql, error="Birden fazla SQL ifadesi çalıştırılamaz.")
+
+    main_start = _main_start(toks)
+    ctes = _cte_names(toks)
+    tables, aliases, used = _table_refs(toks, ctes)
+    columns = _columns(toks, tables, aliases, used, ctes)
+    span, kind, value = _outer_limit(toks, main_start)
+
+    first = toks[0]
+    if not (_is_word(first, *READ_STATEMENTS) or first.value == "("):
+        error = "Sadece SELECT sorguları çalıştırılabilir."
+    else:
+        error = _check_safety(toks, main_start)
+    if error is None and main_start >= len(toks):
+        error = "WITH ifadesinden sonra SELECT bulunamadı."
+    return ParsedSql(
+        sql=sql, error=error, tables=frozenset(tables), columns=frozenset(columns), cte_names=frozenset(ctes),
+        limit=value, limit_span=span, limit_kind=kind, end=toks[-1].end,
+    )
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def guard_select(sql: str, limit: int) -> str:
+    """
+    Doğrulanmış ve dıştaki sorgusu en fazla limit satır döndüren SQL (sonunda ";").
+    - LIMIT/FETCH yoksa sona LIMIT eklenir
+    - sayısal LIMIT limit'ten büyükse limit'e indirilir; LIMIT ALL -> LIMIT limit
+    - ifade/parametre ise LEAST(ifade, limit) ile sınırlanır (zaten en fazla limit ile sarılmışsa dokunulmaz)
+    Geçersiz ya da güvensiz SQL için UnsafeSqlError.
+    """
+    parsed = parse_sql(sql)
+    if parsed.error:
+        raise UnsafeSqlError(parsed.error)
+    body = sql[:parsed.end]
+    if parsed.limit_kind is None:
+        return f"{body} LIMIT {limit};"
+    if parsed.limit_span is None or (parsed.limit is not None and parsed.limit <= limit):
+        return body + ";"
+    start, end = parsed.limit_span
+    expr = sql[start:end]
+    wrapped = _LEAST_LIMIT_RE.match(expr)
+    if wrapped is not None and int(wrapped.group(1)) <= limit:
+        return body + ";"
+    if parsed.limit is not None or expr.strip().lower() == "all":
+        replacement = str(limit)
+    elif parsed.limit_kind == "fetch":
+        replacement = f"(LEAST({expr}, {limit}))"
+    else:
+        replacement = f"LEAST({expr}, {limit})"
+    return f"{body[:start]}{replacement}{body[end:]};"
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def sql_fingerprint(sql: str) -> str:
+    """
+    Boşluk ve yorumlardan bağımsız SQL parmak izi. Literal'ler ve sayılar aynen korunur:
+    '1997-01-01' ile '1900-01-01' ya da farklı bir LIMIT planı (ve maliyeti) değiştirir,
+    bu yüzden aynı izi paylaşmaz.
+    """
+    toks, _error = _tokenize(sql)
+    # Tırnaklı tanımlayıcı anahtar sözcükle karışmasın ("select" ≠ select)
+    parts = [f'"{t.value}"' if t.kind == "quoted" else t.value for t in toks if t.value != ";"]
+    return hashlib.sha1(" ".join(parts).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+
+from schema_selector import parse_schema
+
+# LLM'in ürettiği SQL'deki tablo/kolon adlarını şemadaki yazımına çevirir (ProductName -> product_name).
+# Kimlik sözlüğü şema metninden kurulur; SQL tek bir tokenizer regex'iyle tek geçişte taranır ve
+# yalnızca kimlik token'ları değişir: '...' literal'leri, $$...$$ gövdeleri ve yorumlar olduğu gibi kalır.
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<literal>'(?:[^']|'')*'|\$(?P<tag>\w*)\$.*?\$(?P=tag)\$)
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<quoted>"(?:[^"]|"")+")
+    |(?P<word>[^\W\d]\w*)
+    """,
+    re.S | re.X,
+)
+
+_TR_FOLD = str.maketrans({"ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u",
+                          "Ç": "c", "Ğ": "g", "İ": "i", "Ö": "o", "Ş": "s", "Ü": "u"})
+_SNAKE_RE = re.compile(r"\b[a-z][a-z0-9]*(?:_[a-z0-9]+)+\b")
+
+# Önek tamamlamada (unitsin -> units_in_stock) kimlik sayılmayacak sözcükler
+SQL_KEYWORDS: Set[str] = {
+    "select", "from", "where", "group", "order", "by", "having", "limit", "offset", "join", "inner", "outer",
+    "left", "right", "full", "cross", "natural", "on", "using", "as", "and", "or", "not", "in", "is", "null",
+    "like", "ilike", "between", "exists", "distinct", "case", "when", "then", "else", "end", "union", "all",
+    "intersect", "except", "with", "recursive", "asc", "desc", "nulls", "first", "last", "true", "false",
+    "count", "sum", "avg", "min", "max", "coalesce", "nullif", "cast", "extract", "date_trunc", "round",
+    "random", "lower", "upper", "trim", "length", "substring", "concat", "now", "interval", "filter",
+    "over", "partition", "window", "rows", "range", "lateral", "values", "fetch", "only", "ties",
+}
+
+PREFIX_MIN_LENGTH = 6
+
+
+def _squash(word: str) -> str:
+    # Karşılaştırma anahtarı: Türkçe katlama + küçük harf + alt çizgisiz (ProductName == product_name)
+    return word.translate(_TR_FOLD).lower().replace("_", "")
+
+
+class SqlNormalizer:
+    """
+    identifiers: şemadaki kanonik tablo/kolon adları (snake_case).
+    """
+
+    def __init__(self, identifiers: Iterable[str]):
+        self.identifiers: Set[str] = {i.lower() for i in identifiers if i}
+        squashed: Dict[str, Set[str]] = {}
+        for ident in self.identifiers:
+            squashed.setdefault(_squash(ident), set()).add(ident)
+        # Aynı anahtara düşen birden çok kimlik (order_details / orderdetails) belirsizdir; yalnızca
+        # birebir yazım eşleşmesi kullanılır
+        self._by_key: Dict[str, str] = {k: next(iter(v)) for k, v in squashed.items() if len(v) == 1}
+        self._keys: List[str] = sorted(self._by_key)
+
+    def resolve(self, word: str) -> Optional[str]:
+        low = word.lower()
+        if low in self.identifiers:
+            return low
+        return self._by_key.get(_squash(word))
+
+    def _complete_prefix(self, word: str) -> Optional[str]:
+        key = _squash(word)
+        if len(key) < PREFIX_MIN_LENGTH or key in SQL_KEYWORDS:
+            return None
+        matches = [k for k in self._keys if k.startswith(key)]
+        return self._by_key[matches[0]] if len(matches) == 1 else None
+
+    def normalize(self, sql: str) -> str:
+        """
+        Tek geçişte kimlikleri kanonik yazıma çevirir; literal ve yorumlara dokunmaz.
+        AS'ten sonra gelen takma adlar ve fonksiyon çağrıları için önek tamamlama yapılmaz.
+        """
+        prev_word = ""
+
+        def _replace(m: "re.Match[str]") -> str:
+            nonlocal prev_word
+            kind = m.lastgroup
+            if kind == "word":
+                word = m.group("word")
+                target = self.resolve(word)
+                if target is None and prev_word != "as" and not sql[m.end():m.end() + 1] == "(":
+                    target = self._complete_prefix(word)
+                prev_word = word.lower()
+                return target or word
+            if kind == "quoted":
+                # "ProductName" gibi çift tırnaklı kimlikler PostgreSQL'de büyük/küçük harf duyarlıdır
+                inner = m.group("quoted")[1:-1].replace('""', '"')
+                target = self.resolve(inner)
+                prev_word = ""
+                return target or m.group(0)
+            return m.group(0)
+
+        return _TOKEN_RE.sub(_replace, sql)
+
+
+def identifiers_from_schema(schema_text: str) -> Set[str]:
+    """
+    Şema metnindeki tablo ve kolon adları (canlı şema ve context.md biçimleri).
+    context.md'deki serbest satırlarda geçen snake_case adlar da eklenir (ör. "ship_name, ship_city").
+    """
+    schema = parse_schema(schema_text)
+    identifiers: Set[str] = set()
+    for table in schema.tables:
+        identifiers.add(table.name)
+        identifiers.update(c for c in table.columns if re.fullmatch(r"[a-z][a-z0-9_]*", c))
+        for line in table.lines[1:]:
+            identifiers.update(_SNAKE_RE.findall(line))
+    return identifiers
+
+
+@lru_cache(maxsize=8)
+def get_sql_normalizer(schema_text: str) -> SqlNormalizer:
+    return SqlNormalizer(identifiers_from_schema(schema_text))
+
+
+def normalize_sql_identifiers(sql: str, schema_text: Optional[str]) -> str:
+    if not schema_text:
+        return sql
+    return get_sql_normalizer(schema_text).normalize(sql)
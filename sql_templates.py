@@ -0,0 +1,411 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from env import load_env
+
+from db import execute_prepared, execute_select_async
+from fuzzy_index import ENTITY_SOURCES, get_fuzzy_index, normalize_name
+from sql_cache import schema_fingerprint
+from tracing import current_span, traced
+
+load_env()
+
+# Sık gelen soru kalıpları ("Chai stokta ne kadar var", "rastgele 5 ürün göster") için şablon katmanı.
+# Sonuç veren bir SQL'deki literal'ler soruda geçen varlık/sayıyla eşleştirilip bind parametresine
+# çevrilir; soru da aynı yerlerde {e}/{n} yuvaları olan bir imzaya indirgenir. Aynı imzaya uyan yeni
+# bir soru LLM çağrılmadan şablonla (sunucu taraflı hazır ifade olarak) çalıştırılır.
+
+_SQL_TOKEN_RE = re.compile(
+    r"""
+    (?P<literal>'(?:[^']|'')*')
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<quoted>"(?:[^"]|"")+")
+    |(?P<word>[^\W\d]\w*)
+    |(?P<number>\b\d+\b)
+    """,
+    re.S | re.X,
+)
+_WORD_RE = re.compile(r"\w+")
+# literal'den hemen önce gelen "kolon ILIKE" / "kolon =" (varlık kolonunu bulmak için)
+_COMPARE_RE = re.compile(r"(?:\w+\.)?(\w+)\s*(?:=|ilike|like)\s*$", re.IGNORECASE)
+
+ENTITY_SLOT = "{e}"
+NUMBER_SLOT = "{n}"
+# İmzada en az bu kadar sabit sözcük olmalı; aksi halde "{e}" her soruya uyar
+MIN_FIXED_WORDS = 2
+
+
+def get_sql_templates_path() -> str:
+    return os.getenv("SQL_TEMPLATES_PATH", ".sql_templates.json")
+
+
+def get_sql_templates_max_entries() -> int:
+    try:
+        return int(os.getenv("SQL_TEMPLATES_MAX_ENTRIES", "500"))
+    except ValueError:
+        return 500
+
+
+def is_sql_templates_enabled() -> bool:
+    return os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+
+
+def _fold(word: str) -> str:
+    return normalize_name(word).replace(" ", "")
+
+
+def _question_words(question: str) -> List[Tuple[str, int, int]]:
+    # (katlanmış_sözcük, başlangıç, bitiş); boş kalanlar (yalnızca noktalama vb.) atlanır
+    words = []
+    for m in _WORD_RE.finditer(question or ""):
+        folded = _fold(m.group(0))
+        if folded:
+            words.append((folded, m.start(), m.end()))
+    return words
+
+
+def _find_span(haystack: List[str], needle: List[str]) -> Optional[Tuple[int, int]]:
+    if not needle:
+        return None
+    for i in range(len(haystack) - len(needle) + 1):
+        if haystack[i:i + len(needle)] == needle:
+            return i, i + len(needle)
+    return None
+
+
+@dataclass
+class SqlTemplate:
+    """
+    signature: yuvalı soru imzası ("{e} stokta ne kadar var")
+    sql: :p0, :p1 ... bind parametreli SQL
+    slots: imzadaki yuva sırasıyla [{name, kind: entity|number, pattern: "%{}%", column}]
+    """
+    signature: str
+    sql: str
+    slots: List[Dict[str, Any]]
+    hits: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        parts = []
+        for token in self.signature.split(" "):
+            if token == ENTITY_SLOT:
+                parts.append(r"(\S+(?: \S+)*?)")
+            elif token == NUMBER_SLOT:
+                parts.append(r"(\d+)")
+            else:
+                parts.append(re.escape(token))
+        self._regex = re.compile(" ".join(parts))
+        self.fixed_words = sum(1 for t in self.signature.split(" ") if t not in (ENTITY_SLOT, NUMBER_SLOT))
+
+
+@dataclass
+class TemplateMatch:
+    template: SqlTemplate
+    params: Dict[str, Any]
+
+    @property
+    def sql(self) -> str:
+        return self.template.sql
+
+    def display_sql(self) -> str:
+        """
+        Ekranda/sonuçta göstermek için parametreleri yerine yazılmış SQL (yalnızca gösterim amaçlı).
+        """
+        def _literal(value: Any) -> str:
+            if isinstance(value, (int, float)):
+                return str(value)
+            return "'" + str(value).replace("'", "''") + "'"
+
+        return re.sub(r"(?<!:):(p\d+)\b", lambda m: _literal(self.params.get(m.group(1), m.group(0))), self.sql)
+
+
+def templatize(question: str, sql: str) -> Optional[SqlTemplate]:
+    """
+    Sonuç vermiş bir (soru, SQL) çiftinden şablon çıkarır.
+    - Sorudaki ardışık sözcüklerle birebir eşleşen '...' literal'leri -> varlık yuvası (LIKE jokerleri korunur)
+    - Soruda ayrı bir sözcük olarak geçen sayılar (LIMIT 5) -> sayı yuvası
+    Eşleşmeyen literal ve sayılar şablonda sabit kalır. Yuva çıkmazsa None.
+    """
+    sql = sql.strip()
+    words = _question_words(question)
+    folded = [w[0] for w in words]
+    spans: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    ok = True
+
+    def _slot_for(span: Tuple[int, int], kind: str, pattern: str, column: Optional[str]) -> Optional[str]:
+        nonlocal ok
+        for other, slot in spans.items():
+            if other == span:
+                if slot["kind"] != kind or slot["pattern"] != pattern:
+                    ok = False
+                return slot["name"]
+            if other[0] < span[1] and span[0] < other[1]:
+                ok = False
+                return None
+        name = f"p{len(spans)}"
+        spans[span] = {"name": name, "kind": kind, "pattern": pattern, "column": column}
+        return name
+
+    def _replace(m: "re.Match[str]") -> str:
+        kind = m.lastgroup
+        if kind == "literal":
+            value = m.group("literal")[1:-1].replace("''", "'")
+            core = value.strip("%")
+            span = _find_span(folded, [_fold(w) for w in _WORD_RE.findall(core) if _fold(w)])
+            if span is None or "%" in core or "_" in core:
+                return m.group(0)
+            prefix = value[:len(value) - len(value.lstrip("%"))]
+            suffix = value[len(value.rstrip("%")):]
+            col = _COMPARE_RE.search(sql[:m.start()])
+            name = _slot_for(span, "entity", prefix + "{}" + suffix, col.group(1).lower() if col else None)
+            return f":{name}" if name else m.group(0)
+        if kind == "number":
+            number = m.group("number")
+            positions = [i for i, w in enumerate(folded) if w == number]
+            if len(positions) != 1:
+                return m.group(0)
+            name = _slot_for((positions[0], positions[0] + 1), "number", "{}", None)
+            return f":{name}" if name else m.group(0)
+        return m.group(0)
+
+    param_sql = _SQL_TOKEN_RE.sub(_replace, sql)
+    if not spans or not ok:
+        return None
+
+    tokens: List[str] = []
+    slots: List[Dict[str, Any]] = []
+    i = 0
+    starts = {span[0]: (span, slot) for span, slot in spans.items()}
+    while i < len(folded):
+        if i in starts:
+            span, slot = starts[i]
+            tokens.append(ENTITY_SLOT if slot["kind"] == "entity" else NUMBER_SLOT)
+            slots.append(slot)
+            i = span[1]
+        else:
+            tokens.append(folded[i])
+            i += 1
+
+    template = SqlTemplate(signature=" ".join(tokens), sql=param_sql, slots=slots)
+    if template.fixed_words < MIN_FIXED_WORDS:
+        return None
+    return template
+
+
+def _bind_entity(value: str, slot: Dict[str, Any]) -> Optional[str]:
+    """
+    Sorudan çıkan varlık metnini bind değerine çevirir. Bulanık indeks hazırsa isim doğrulanır:
+    '=' karşılaştırmaları kayıtlı tam isme çevrilir, hiçbir kayda benzemeyen değerler reddedilir.
+    """
+    column = slot.get("column")
+    index = get_fuzzy_index()
+    if index is not None and column in ENTITY_SOURCES:
+        exact = "%" not in slot["pattern"]
+        if exact or not index.containing(value, column=column):
+            # ILIKE '%x%' hiçbir isimde geçmiyorsa yazım hatası olabilir; tek aday varsa onu kullan
+            canonical = index.canonicalize(value, column=column)
+            if canonical is None:
+                return None
+            value = canonical
+    return slot["pattern"].replace("{}", value)
+
+
+class TemplateStore:
+    """
+    Şema fingerprint'i -> imza -> SqlTemplate. Dosyaya (JSON) yazılır, süreç açılışında okunur.
+    max_entries aşılınca en uzun süredir kullanılmayan şablonlar atılır.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or get_sql_templates_path()
+        self.max_entries = max_entries if max_entries is not None else get_sql_templates_max_entries()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Dict[str, SqlTemplate]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(Path(self.path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        for fingerprint, templates in data.items():
+            try:
+                self._templates[fingerprint] = {t["signature"]: SqlTemplate(**t) for t in templates}
+            except (TypeError, KeyError):
+                continue
+
+    def _save(self) -> None:
+        data = {fp: [asdict(t) for t in templates.values()] for fp, templates in self._templates.items()}
+        tmp = f"{self.path}.tmp"
+        try:
+            Path(tmp).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    @traced("sql_templates.match")
+    def match(self, question: str, schema_text: str) -> Optional[TemplateMatch]:
+        """
+        Soruya uyan en özgül şablonu (en çok sabit sözcük) ve bind değerlerini döndürür.
+        """
+        words = _question_words(question)
+        joined = " ".join(w[0] for w in words)
+        # katlanmış metindeki karakter konumu -> sözcük indeksi
+        offsets = []
+        pos = 0
+        for w in words:
+            offsets.append(pos)
+            pos += len(w[0]) + 1
+
+        with self._lock:
+            candidates = sorted(self._templates.get(schema_fingerprint(schema_text), {}).values(),
+                                key=lambda t: -t.fixed_words)
+        for template in candidates:
+            m = template._regex.fullmatch(joined)
+            if not m:
+                continue
+            params: Dict[str, Any] = {}
+            for group, slot in enumerate(template.slots, start=1):
+                first = offsets.index(m.start(group))
+                last = first + m.group(group).count(" ")
+                if slot["kind"] == "number":
+                    params[slot["name"]] = int(m.group(group))
+                    continue
+                # Kayıtlı isimlerdeki kesme işareti vb. korunsun diye değer orijinal sorudan kesilir
+                value = _bind_entity(question[words[first][1]:words[last][2]], slot)
+                if value is None:
+                    break
+                params[slot["name"]] = value
+            else:
+                with self._lock:
+                    template.hits += 1
+                    template.last_used = time.time()
+                    self.hits += 1
+                current_span().update(template_hit=True, signature=template.signature)
+                return TemplateMatch(template, params)
+        with self._lock:
+            self.misses += 1
+        current_span().set("template_hit", False)
+        return None
+
+    def learn(self, question: str, schema_text: str, sql: str) -> Optional[SqlTemplate]:
+        """
+        Sonuç vermiş SQL'den şablon çıkarıp saklar (aynı imza varsa üzerine yazar).
+        """
+        template = templatize(question, sql)
+        if template is None:
+            return None
+        with self._lock:
+            bucket = self._templates.setdefault(schema_fingerprint(schema_text), {})
+            existing = bucket.get(template.signature)
+            if existing is not None and existing.sql == template.sql:
+                return existing
+            bucket[template.signature] = template
+            self._evict()
+            self._save()
+        return template
+
+    def _evict(self) -> None:
+        entries = [(t.last_used, fp, sig) for fp, bucket in self._templates.items() for sig, t in bucket.items()]
+        if self.max_entries <= 0 or len(entries) <= self.max_entries:
+            return
+        for _, fp, sig in sorted(entries)[:len(entries) - self.max_entries]:
+            del self._templates[fp][sig]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "templates": sum(len(b) for b in self._templates.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self._save()
+
+
+_default_store: Optional[TemplateStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_template_store() -> Optional[TemplateStore]:
+    """
+    Süreç genelinde paylaşılan şablon deposu. SQL_TEMPLATES_ENABLED=false ise None.
+    """
+    global _default_store
+    if not is_sql_templates_enabled():
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = TemplateStore()
+        return _default_store
+
+
+def run_template(engine, question: str, schema_text: str,
+                 store: Optional[TemplateStore] = None) -> Optional[Tuple[str, List[str], List[Tuple[Any, ...]]]]:
+    """
+    Soru bilinen bir şablona uyuyorsa şablonu hazır ifade olarak çalıştırır.
+    Sonuç boşsa veya hata olursa None döner; çağıran normal LLM akışına devam eder.
+    Dönüş: (gösterim_sql'i, kolonlar, satırlar)
+    """
+    store = store or get_template_store()
+    if store is None:
+        return None
+    matched = store.match(question, schema_text)
+    if matched is None:
+        return None
+    try:
+        columns, rows = execute_prepared(engine, matched.sql, matched.params)
+    except Exception:
+        return None
+    if not rows:
+        return None
+    return matched.display_sql(), columns, rows
+
+
+async def run_template_async(engine, question: str, schema_text: str,
+                             store: Optional[TemplateStore] = None) -> Optional[Tuple[str, List[str], List[Tuple[Any, ...]]]]:
+    """
+    run_template'in asyncio karşılığı. psycopg 3 aynı parametreli sorguyu prepare_threshold kez
+    çalıştırdıktan sonra kendisi sunucu tarafında hazırladığı için düz bind parametreleriyle çalıştırılır.
+    """
+    store = store or get_template_store()
+    if store is None:
+        return None
+    matched = store.match(question, schema_text)
+    if matched is None:
+        return None
+    try:
+        columns, rows = await execute_select_async(engine, matched.sql, params=matched.params)
+    except Exception:
+        return None
+    if not rows:
+        return None
+    return matched.display_sql(), columns, rows
+
+
+def learn_template(question: str, schema_text: str, sql: str, store: Optional[TemplateStore] = None) -> None:
+    """
+    Sonuç vermiş SQL'i şablon olarak kaydeder; hatalar akışı bozmaz.
+    """
+    store = store or get_template_store()
+    if store is None:
+        return
+    try:
+        store.learn(question, schema_text, sql)
+    except Exception:
+        pass
@@ -0,0 +1,127 @@
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# CLI açılışı: ağır işler (şema/bağlam, engine, LangChain import'ları) arka plandaki bir thread'de
+# yürürken istem (prompt) hemen gösterilir; ilk soru girildiğinde sonuç beklenir.
+# --profile-startup için import süresi dökümü (python -X importtime) ve açılış adımlarının süreleri.
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$")
+
+
+class BackgroundStartup:
+    """
+    target(startup) arka planda bir kez çalışır; adımlar startup.phase(ad) ile ölçülür.
+    result() bitene kadar bekler ve hedefin hatasını çağıranın thread'inde yeniden fırlatır.
+    """
+
+    def __init__(self, target: Callable[["BackgroundStartup"], Any], name: str = "cli-startup"):
+        self.phases: List[Tuple[str, float, Optional[str]]] = []   # (ad, ms, hata)
+        self._target = target
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+        self._started: Optional[float] = None
+        self._elapsed_ms: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> "BackgroundStartup":
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            self._result = self._target(self)
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._elapsed_ms = (time.perf_counter() - self._started) * 1000
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.phases.append((name, (time.perf_counter() - t0) * 1000, f"{type(e).__name__}: {e}"))
+            raise
+        self.phases.append((name, (time.perf_counter() - t0) * 1000, None))
+
+    def done(self) -> bool:
+        return self._started is not None and not self._thread.is_alive()
+
+    @property
+    def elapsed_ms(self) -> Optional[float]:
+        return self._elapsed_ms
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("Açılış adımları henüz bitmedi.")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def import_time_breakdown(modules: Sequence[str]) -> Tuple[float, Dict[str, int], Dict[str, int]]:
+    """
+    Modülleri temiz bir alt süreçte `python -X importtime` ile import eder (önceden yüklenmiş
+    modüller ölçümü bozmasın diye). Dönüş: (duvar saati ms, üst paket -> öz süre µs, modül -> kümülatif µs)
+    """
+    code = "\n".join(f"import {m}" for m in modules)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        raise RuntimeError(f"Import ölçümü başarısız: {tail[0]}")
+
+    by_package: Dict[str, int] = {}
+    cumulative: Dict[str, int] = {}
+    wanted = set(modules)
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, name = int(m.group(1)), int(m.group(2)), m.group(4)
+        package = name.split(".", 1)[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        if name in wanted:
+            cumulative[name] = cum_us
+    return wall_ms, by_package, cumulative
+
+
+def print_startup_profile(modules: Sequence[str], startup: Optional[BackgroundStartup] = None, top: int = 15) -> None:
+    """
+    --profile-startup çıktısı: import süresi dökümü ve (verildiyse) açılış adımlarının süreleri.
+    """
+    try:
+        wall_ms, by_package, cumulative = import_time_breakdown(modules)
+    except Exception as e:
+        print(f"Import süresi ölçülemedi: {e}")
+    else:
+        total_us = sum(by_package.values()) or 1
+        print(f"Import süresi (alt süreç, toplam {wall_ms:.0f} ms duvar saati)")
+        print("\nModül başına kümülatif:")
+        for name in modules:
+            if name in cumulative:
+                print(f"  {name:<28} {cumulative[name] / 1000:>9.1f} ms")
+        print(f"\nPaket başına öz süre (ilk {top}):")
+        for package, self_us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            print(f"  {package:<28} {self_us / 1000:>9.1f} ms  %{100 * self_us / total_us:>5.1f}")
+
+    if startup is None:
+        return
+    try:
+        startup.result()
+    except Exception:
+        pass
+    total = f"{startup.elapsed_ms:.0f} ms" if startup.elapsed_ms is not None else "?"
+    print(f"\nAçılış adımları (arka plan thread'i, toplam {total}):")
+    for name, ms, error in startup.phases:
+        status = f"HATA {error}" if error else "ok"
+        print(f"  {name:<28} {ms:>9.1f} ms  {status}")
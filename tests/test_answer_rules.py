@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+import pytest
+
+from answer_rules import answer_with_rules
+
+# (soru, kolonlar, satırlar, beklenen cevap; None = kural uygulanmaz, LLM'e gider)
+CASES = [
+    # sayım
+    ("Kaç müşteri var?", ["count"], [(91,)], "Toplam 91 müşteri var."),
+    ("Almanya'da kaç farklı müşteri var", ["count"], [(11,)], "Toplam: 11."),
+    ("Kaç ürün var", ["urun_sayisi"], [(77,)], "Toplam 77 ürün var."),
+    ("Kaç sipariş var", ["total"], [(830,)], "Toplam 830 sipariş var."),
+    ("Sipariş sayısı", ["count"], [(Decimal("830"),)], "Toplam: 830."),
+    # "kaç" ama sayım değil
+    ("Siparişler ortalama kaç günde kargolanıyor", ["avg"], [(Decimal("8.49"),)], "Ortalama: 8,49."),
+    ("En pahalı ürün kaç para", ["max"], [(Decimal("263.50"),)], None),
+    ("Chai kaç lira", ["unit_price"], [(Decimal("18.00"),)], None),
+    ("Chai kaç TL", ["count"], [(18,)], None),
+    ("Çalışanlar kaç yaşında", ["age"], [(45,)], None),
+    ("Siparişler kaç günde teslim ediliyor", ["days"], [(8,)], None),
+    ("Chai kaç kutu", ["units_in_stock"], [(39,)], None),
+    # diğer kurallar
+    ("Chai stokta ne kadar var", ["product_name", "units_in_stock"], [("Chai", 39)],
+     "Chai ürününden stokta 39 adet var."),
+    ("Chai fiyatı", ["product_name", "unit_price"], [("Chai", Decimal("18.00"))],
+     "Chai ürününün fiyatı 18,00."),
+    ("Toplam ciro", ["sum"], [(Decimal("1265793.04"),)], "Toplam: 1.265.793,04."),
+    ("En çok satan 2 ürün", ["product_name", "toplam"], [("Camembert", 1577), ("Raclette", 1496)],
+     "1. Camembert — 1.577\n2. Raclette — 1.496"),
+    ("Bu hafta neler oldu", ["note"], [("x",), ("y",)], None),
+]
+
+
+@pytest.mark.parametrize("question,columns,rows,expected", CASES, ids=[c[0] for c in CASES])
+def test_answer_rules(question, columns, rows, expected):
+    assert answer_with_rules(question, columns, rows) == expected
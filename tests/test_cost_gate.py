@@ -0,0 +1,62 @@
+import cost_gate
+from cost_gate import PlanCache, check_query_cost
+
+
+def _plan(total_cost: float, rows: int):
+    return {"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": total_cost, "Plan Rows": rows}
+
+
+def test_plan_cache_keeps_literals_apart(monkeypatch):
+    # Aynı kalıbın seçici ve seçici olmayan sürümü aynı önbellek kaydını paylaşmamalı
+    plans = {"1997-01-01": _plan(100.0, 50), "1900-01-01": _plan(10_000_000.0, 5_000_000)}
+    explained = []
+
+    def fake_explain(engine, sql, timeout_seconds=None, limit=None):
+        explained.append(sql)
+        return next(plan for literal, plan in plans.items() if literal in sql)
+
+    monkeypatch.setattr(cost_gate, "explain_query", fake_explain)
+    monkeypatch.setattr(cost_gate, "_plan_cache", PlanCache(max_entries=16, ttl_seconds=600))
+    monkeypatch.setenv("COST_GATE_MAX_REGENERATIONS", "0")
+
+    cheap = check_query_cost(None, "select * from orders where order_date >= '1997-01-01' limit 10")
+    assert cheap.action == "ok"
+    wide = check_query_cost(None, "select * from orders where order_date >= '1900-01-01' limit 10")
+    assert wide.estimate.total_cost == 10_000_000.0
+    assert wide.action != "ok"
+    # Yalnızca biçimi farklı aynı sorgu önbellekten gelir
+    again = check_query_cost(None, "SELECT * FROM orders\n  WHERE order_date >= '1997-01-01' LIMIT 10;")
+    assert again.action == "ok"
+    assert sum("1997-01-01" in sql for sql in explained) == 1
+
+
+def _limit(rows: int, total_cost: float, child):
+    return {"Node Type": "Limit", "Total Cost": total_cost, "Plan Rows": rows, "Plans": [child]}
+
+
+def test_limit_over_large_scan_is_not_rejected(monkeypatch):
+    # Gerçek EXPLAIN çıktısı: Limit altındaki tarama tüm tablonun tahminini raporlar
+    plan = _limit(10, 0.2, _plan(95_000.0, 5_000_000))
+    monkeypatch.setattr(cost_gate, "explain_query", lambda engine, sql, **kw: plan)
+    monkeypatch.setattr(cost_gate, "_plan_cache", PlanCache(max_entries=16, ttl_seconds=600))
+
+    decision = check_query_cost(None, "select * from orders limit 10")
+    assert decision.action == "ok"
+    assert decision.estimate.total_cost == 0.2
+    assert decision.estimate.max_rows == 10
+
+
+def test_join_explosion_under_limit_is_rejected(monkeypatch):
+    join = {
+        "Node Type": "Nested Loop", "Total Cost": 40_000.0, "Plan Rows": 50_000_000,
+        "Plans": [_plan(20.0, 5_000), {"Node Type": "Seq Scan", "Relation Name": "order_details",
+                                       "Total Cost": 20.0, "Plan Rows": 10_000}],
+    }
+    plan = _limit(100, 0.5, join)
+    monkeypatch.setattr(cost_gate, "explain_query", lambda engine, sql, **kw: plan)
+    monkeypatch.setattr(cost_gate, "_plan_cache", PlanCache(max_entries=16, ttl_seconds=600))
+
+    decision = check_query_cost(None, "select * from orders, order_details limit 100")
+    assert decision.action == "rejected"
+    assert decision.estimate.max_rows == 50_000_000
+    assert decision.estimate.cartesian
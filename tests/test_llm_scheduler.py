@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_scheduler import CircuitBreaker, LlmScheduler, LlmUnavailableError
+
+
+class ProviderDown(Exception):
+    status_code = 503
+
+
+async def _hang():
+    await asyncio.sleep(3600)
+
+
+async def _cancel_in_flight(scheduler: LlmScheduler) -> None:
+    task = asyncio.ensure_future(scheduler.call_async(_hang, 1))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_async_calls_release_their_slots():
+    scheduler = LlmScheduler(max_concurrency=2, interactive_reserved=0)
+
+    async def scenario():
+        await _cancel_in_flight(scheduler)
+        await _cancel_in_flight(scheduler)
+
+        async def ok():
+            return "ok"
+
+        return await asyncio.wait_for(scheduler.call_async(ok, 1), timeout=2)
+
+    assert asyncio.run(scenario()) == "ok"
+    stats = scheduler.stats()
+    assert stats["in_flight"] == {"interactive": 0, "batch": 0}
+    assert stats["abandoned"] == 2
+    assert stats["breaker"] == CircuitBreaker.CLOSED
+
+
+def test_cancelled_half_open_probe_does_not_wedge_breaker():
+    scheduler = LlmScheduler(breaker_failures=1, breaker_reset_seconds=0.05)
+    with pytest.raises(ProviderDown):
+        scheduler.call(lambda: (_ for _ in ()).throw(ProviderDown("down")), 1)
+    assert scheduler.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.1)
+
+    async def scenario():
+        # Süre dolduktan sonraki ilk çağrı yarı açık devrenin deneme isteğidir; iptal edilir
+        await _cancel_in_flight(scheduler)
+        assert scheduler.breaker.state == CircuitBreaker.HALF_OPEN
+
+        async def ok():
+            return "ok"
+
+        return await scheduler.call_async(ok, 1)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_keyboard_interrupt_releases_sync_slot():
+    scheduler = LlmScheduler(max_concurrency=1)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.call(interrupted, 1)
+    assert scheduler.call(lambda: "ok", 1) == "ok"
+    assert scheduler.stats()["in_flight"]["interactive"] == 0
+
+
+def test_open_breaker_fails_fast():
+    scheduler = LlmScheduler(breaker_failures=1, breaker_reset_seconds=60)
+    with pytest.raises(ProviderDown):
+        scheduler.call(lambda: (_ for _ in ()).throw(ProviderDown("down")), 1)
+    with pytest.raises(LlmUnavailableError):
+        scheduler.call(lambda: "ok", 1)
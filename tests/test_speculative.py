@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+import async_pipeline
+import fallback
+import speculative
+from cost_gate import CostDecision, CostGateError
+from llm_scheduler import BATCH, current_llm_lane, llm_lane
+from speculative import run_speculative, run_speculative_async
+
+SQL_BY_TEMPERATURE = {
+    0.0: "select * from orders limit 10",
+    0.8: "select * from orders, order_details limit 10",
+}
+
+
+@pytest.fixture
+def candidates(monkeypatch):
+    executed = []
+
+    def fake_execute(engine, sql, question, max_rows=None):
+        executed.append(sql)
+        return sql, ["n"], [(1,)], None, []
+
+    monkeypatch.setattr(speculative, "build_sql_prompt", lambda *args: [])
+    monkeypatch.setattr(speculative, "postprocess_generated_sql", lambda sql, schema_text=None: sql)
+    monkeypatch.setattr(fallback, "execute_with_fallbacks", fake_execute)
+    return executed
+
+
+def _ask(messages, temperature=0.0, mode="sql"):
+    return SQL_BY_TEMPERATURE[temperature]
+
+
+def _reject_joins(engine, sql):
+    action = "rejected" if "order_details" in sql else "ok"
+    return CostDecision(sql=sql, action=action, estimate=None, reason="- Tahmini maliyet: 1e9")
+
+
+def test_cost_gate_drops_rejected_candidates(monkeypatch, candidates):
+    monkeypatch.setenv("COST_GATE_ENABLED", "true")
+    monkeypatch.setattr(speculative, "check_query_cost", _reject_joins)
+
+    sql, _columns, rows, _strategy, _suggestions = run_speculative(
+        None, "", "", "?", ask=_ask, temperatures=[0.0, 0.8])
+    assert sql == SQL_BY_TEMPERATURE[0.0]
+    assert candidates == [SQL_BY_TEMPERATURE[0.0]]
+
+
+def test_all_candidates_rejected_raises_cost_gate_error(monkeypatch, candidates):
+    monkeypatch.setenv("COST_GATE_ENABLED", "true")
+    monkeypatch.setattr(speculative, "check_query_cost", _reject_joins)
+
+    with pytest.raises(CostGateError):
+        run_speculative(None, "", "", "?", ask=_ask, temperatures=[0.8])
+    assert candidates == []
+
+
+def test_candidates_inherit_llm_lane(candidates):
+    lanes = []
+
+    def ask(messages, temperature=0.0, mode="sql"):
+        lanes.append(current_llm_lane())
+        return SQL_BY_TEMPERATURE[temperature]
+
+    with llm_lane(BATCH):
+        run_speculative(None, "", "", "?", ask=ask, temperatures=[0.0, 0.8])
+    assert lanes == [BATCH, BATCH]
+
+
+def test_lower_temperature_wins_even_if_slower(candidates):
+    def ask(messages, temperature=0.0, mode="sql"):
+        if temperature == 0.0:
+            time.sleep(0.2)
+        return SQL_BY_TEMPERATURE[temperature]
+
+    sql, _columns, _rows, strategy, _suggestions = run_speculative(
+        None, "", "", "?", ask=ask, temperatures=[0.0, 0.8])
+    assert sql == SQL_BY_TEMPERATURE[0.0]
+    assert strategy == "spekülatif (t=0.0)"
+
+
+def test_lower_temperature_wins_even_if_slower_async(monkeypatch):
+    async def fake_execute(engine, sql, question):
+        return sql, ["n"], [(1,)], []
+
+    async def ask(messages, temperature=0.0, mode="sql"):
+        if temperature == 0.0:
+            await asyncio.sleep(0.2)
+        return SQL_BY_TEMPERATURE[temperature]
+
+    monkeypatch.setattr(speculative, "build_sql_prompt", lambda *args: [])
+    monkeypatch.setattr(speculative, "postprocess_generated_sql", lambda sql, schema_text=None: sql)
+    monkeypatch.setattr(async_pipeline, "execute_with_fallbacks_async", fake_execute)
+
+    result = asyncio.run(run_speculative_async(None, "", "", "?", ask=ask, temperatures=[0.0, 0.8]))
+    assert result[0] == SQL_BY_TEMPERATURE[0.0]
@@ -0,0 +1,112 @@
+import pytest
+
+from sql_guard import UnsafeSqlError, guard_select, parse_sql, sql_fingerprint
+
+# (sql, hata mesajında geçmesi beklenen parça)
+REJECTED = [
+    ("select 1; select 2", "Birden fazla"),
+    ("select * from orders; delete from orders", "Birden fazla"),
+    ("with x as (delete from orders returning *) select * from x", "CTE içinde yazma"),
+    ("with x as (update orders set freight = 0 returning *) select * from x", "CTE içinde yazma"),
+    ("select * from orders for update", "FOR UPDATE/SHARE"),
+    ("select * from orders for no key update", "FOR UPDATE/SHARE"),
+    ("select * from orders for share", "FOR UPDATE/SHARE"),
+    ("select * into orders_copy from orders", "INTO"),
+    ("select pg_sleep(10)", "pg_sleep()"),
+    ("update orders set freight = 0", "Sadece SELECT"),
+    ("select 'açık", "Kapanmamış"),
+    ("select (1", "Parantezler"),
+    ("", "Boş sorgu"),
+]
+
+# (sql, beklenen guard_select(sql, 100) çıktısı)
+LIMITS = [
+    # LIMIT yoksa sona eklenir; sondaki ";" atılır
+    ("select * from orders", "select * from orders LIMIT 100;"),
+    ("select * from orders;;", "select * from orders LIMIT 100;"),
+    ("select ';' as x", "select ';' as x LIMIT 100;"),
+    # büyük LIMIT indirilir, küçük LIMIT korunur
+    ("select * from orders limit 500", "select * from orders limit 100;"),
+    ("select * from orders limit 5", "select * from orders limit 5;"),
+    ("select * from orders limit all", "select * from orders limit 100;"),
+    ("select * from orders limit 500 offset 20", "select * from orders limit 100 offset 20;"),
+    # parametre / ifade LEAST ile sınırlanır
+    ("select * from orders limit :n", "select * from orders limit LEAST(:n, 100);"),
+    ("select * from orders limit $1", "select * from orders limit LEAST($1, 100);"),
+    ("select * from orders fetch first :n rows only", "select * from orders fetch first (LEAST(:n, 100)) rows only;"),
+    ("select * from orders limit least(:n, 5)", "select * from orders limit least(:n, 5);"),
+    ("select * from orders limit least(:n, 5) + least(:m, 5)",
+     "select * from orders limit LEAST(least(:n, 5) + least(:m, 5), 100);"),
+    # FETCH FIRST
+    ("select * from orders fetch first 500 rows only", "select * from orders fetch first 100 rows only;"),
+    ("select * from orders fetch first 5 rows only", "select * from orders fetch first 5 rows only;"),
+    ("select * from orders fetch first row only", "select * from orders fetch first row only;"),
+    # LIMIT'siz OFFSET dıştaki sorguyu sınırlamaz
+    ("select * from orders offset 20", "select * from orders offset 20 LIMIT 100;"),
+    # kolon adındaki ya da alt sorgudaki "limit" dıştaki sorguyu sınırsız bırakmaz
+    ('select "limit" from orders', 'select "limit" from orders LIMIT 100;'),
+    ("select * from (select * from orders limit 5) s", "select * from (select * from orders limit 5) s LIMIT 100;"),
+    ("select o.order_id, (select max(freight) from orders limit 1) as m from orders o",
+     "select o.order_id, (select max(freight) from orders limit 1) as m from orders o LIMIT 100;"),
+    ("with recent as (select * from orders limit 1000) select * from recent",
+     "with recent as (select * from orders limit 1000) select * from recent LIMIT 100;"),
+]
+
+
+@pytest.mark.parametrize("sql,message", REJECTED)
+def test_rejects_unsafe_sql(sql, message):
+    assert message in parse_sql(sql).error
+    with pytest.raises(UnsafeSqlError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        guard_select(sql, 100)
+
+
+@pytest.mark.parametrize("sql", [
+    "select x.update from orders x",
+    "select * from orders where ship_name = 'delete me; drop table orders'",
+    "select 1 -- ; delete from orders",
+    "with x as (select 1 as n) select n from x",
+    "select extract(year from order_date) from orders",
+])
+def test_accepts_safe_sql(sql):
+    assert parse_sql(sql).ok
+
+
+@pytest.mark.parametrize("sql,expected", LIMITS)
+def test_outer_limit_rewrite(sql, expected):
+    guarded = guard_select(sql, 100)
+    assert guarded == expected
+    # Yeniden yazılmış SQL tekrar guard'dan geçince değişmez
+    assert guard_select(guarded, 100) == guarded
+
+
+def test_parsed_limit_value():
+    assert parse_sql("select * from orders limit 50").limit == 50
+    assert parse_sql("select * from orders fetch first 7 rows only").limit == 7
+    assert parse_sql("select * from orders limit :n").limit is None
+    assert parse_sql("select * from (select * from orders limit 5) s").limit is None
+
+
+def test_extracts_tables_and_columns():
+    parsed = parse_sql(
+        "select o.order_id, c.company_name, freight from public.orders o "
+        "join customers as c on c.customer_id = o.customer_id where o.freight > 10"
+    )
+    assert parsed.tables == {"orders", "customers"}
+    assert parsed.columns == {
+        "orders.order_id", "customers.company_name", "customers.customer_id", "orders.customer_id",
+        "orders.freight", "freight",
+    }
+
+
+def test_cte_names_are_not_tables():
+    parsed = parse_sql("with recent as (select order_id from orders) select r.order_id from recent r")
+    assert parsed.tables == {"orders"}
+    assert parsed.cte_names == {"recent"}
+    assert "order_id" in parsed.columns
+
+
+def test_fingerprint_ignores_formatting_but_not_literals():
+    base = sql_fingerprint("select * from orders where ship_country = 'France' limit 10")
+    assert sql_fingerprint("SELECT *\n  FROM orders /* x */ WHERE ship_country = 'France' LIMIT 10;") == base
+    assert sql_fingerprint("select * from orders where ship_country = 'Spain' limit 10") != base
+    assert sql_fingerprint('select * from "orders" where ship_country = \'France\' limit 10') != base
@@ -0,0 +1,53 @@
+import os
+import threading
+from typing import Any, Optional
+
+from env import load_env
+
+load_env()
+
+# tiktoken ile token sayımı. Kodlama dosyası ilk kullanımda indirilir; indirilemezse
+# (ağ yok, paket yok) karakter/4 yaklaşımına düşülür ve tekrar denenmez.
+
+_encoding: Any = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def get_token_encoding_name() -> str:
+    return os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+
+
+def _get_encoding() -> Optional[Any]:
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(get_token_encoding_name())
+            except Exception:
+                _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Metnin yaklaşık token sayısı (tiktoken yoksa len/4).
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, (len(text) + 3) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Any) -> int:
+    # LangChain mesaj listesi; mesaj başına birkaç token'lık rol/ayraç payı eklenir
+    return sum(count_tokens(str(getattr(m, "content", m))) + 4 for m in messages)
+
+
+def is_exact_token_count() -> bool:
+    return _get_encoding() is not None
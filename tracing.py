@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from env import load_env
+
+load_env()
+
+# Akış boyunca yapılandırılmış span'ler: süre, token, satır sayısı, cache hit gibi alanlar taşır.
+# Span'ler bellekte son N kayıt olarak tutulur, istenirse JSON lines dosyasına yazılır ve
+# Prometheus metin formatında toplu metrik olarak sunulur (service.py /metrics).
+
+# Prometheus'ta toplanarak sayaç olarak sunulan sayısal span alanları
+COUNTER_ATTRS = ("prompt_tokens", "completion_tokens", "rows", "retries")
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def is_tracing_enabled() -> bool:
+    return os.getenv("TRACING_ENABLED", "true").lower() == "true"
+
+
+def get_trace_jsonl_path() -> Optional[str]:
+    return os.getenv("TRACE_JSONL_PATH") or None
+
+
+def get_trace_buffer_size() -> int:
+    try:
+        return int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
+    except ValueError:
+        return 1000
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration_ms", "status", "attrs")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration_ms = 0.0
+        self.status = "ok"
+        self.attrs = dict(attrs)
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def update(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class _NullSpan:
+    # Tracing kapalıyken çağıranların set()/update() çağrıları için boş nesne
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def update(self, **attrs: Any) -> None:
+        pass
+
+
+class TraceCollector:
+    """
+    Biten span'leri toplar: son N span (recent), span adına göre süre histogramı ve sayaçlar.
+    """
+
+    def __init__(self, buffer_size: Optional[int] = None, jsonl_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=buffer_size or get_trace_buffer_size())
+        self.jsonl_path = jsonl_path
+        self._jsonl_file = None
+        self._durations: Dict[str, List[float]] = {}  # [count, sum, bucket_0, bucket_1, ...]
+        self._errors: Dict[str, int] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._cache: Dict[Tuple[str, str], int] = {}
+
+    def record(self, span: Span) -> None:
+        data = span.to_dict()
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            self.recent.append(data)
+            hist = self._durations.setdefault(span.name, [0, 0.0] + [0] * len(DURATION_BUCKETS))
+            hist[0] += 1
+            hist[1] += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    hist[2 + i] += 1
+            if span.status != "ok":
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for attr in COUNTER_ATTRS:
+                value = span.attrs.get(attr)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    key = (span.name, attr)
+                    self._counters[key] = self._counters.get(key, 0) + value
+            if "cache_hit" in span.attrs:
+                key = (span.name, "hit" if span.attrs["cache_hit"] else "miss")
+                self._cache[key] = self._cache.get(key, 0) + 1
+            if self.jsonl_path:
+                if self._jsonl_file is None:
+                    self._jsonl_file = open(self.jsonl_path, "a", encoding="utf-8")
+                self._jsonl_file.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+                self._jsonl_file.flush()
+
+    def render_prometheus(self, prefix: str = "nl2sql") -> str:
+        """
+        Toplanan metrikleri Prometheus metin formatında döndürür.
+        """
+        lines: List[str] = []
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_span_duration_seconds histogram")
+            for name, hist in sorted(self._durations.items()):
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {hist[2 + i]}')
+                lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {hist[0]}')
+                lines.append(f'{prefix}_span_duration_seconds_sum{{span="{name}"}} {hist[1]:.6f}')
+                lines.append(f'{prefix}_span_duration_seconds_count{{span="{name}"}} {hist[0]}')
+            lines.append(f"# TYPE {prefix}_span_errors_total counter")
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'{prefix}_span_errors_total{{span="{name}"}} {count}')
+            for attr in COUNTER_ATTRS:
+                lines.append(f"# TYPE {prefix}_{attr}_total counter")
+                for (name, key), value in sorted(self._counters.items()):
+                    if key == attr:
+                        lines.append(f'{prefix}_{attr}_total{{span="{name}"}} {value:g}')
+            lines.append(f"# TYPE {prefix}_cache_lookups_total counter")
+            for (name, result), count in sorted(self._cache.items()):
+                lines.append(f'{prefix}_cache_lookups_total{{span="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def recent_spans(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self.recent)
+        return items[-limit:] if limit else items
+
+    def reset(self) -> None:
+        with self._lock:
+            self.recent.clear()
+            self._durations.clear()
+            self._errors.clear()
+            self._counters.clear()
+            self._cache.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._jsonl_file is not None:
+                self._jsonl_file.close()
+                self._jsonl_file = None
+
+
+_collector: Optional[TraceCollector] = None
+_collector_lock = threading.Lock()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def get_collector() -> TraceCollector:
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = TraceCollector(jsonl_path=get_trace_jsonl_path())
+        return _collector
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """
+    Bir akış adımını ölçer. İç içe span'ler aynı trace_id'yi ve parent_id'yi paylaşır
+    (asyncio görevlerine contextvars ile taşınır; yeni thread'ler kendi trace'ini başlatır).
+
+        with span("execute_select", timeout_ms=1000) as sp:
+            ...
+            sp.set("rows", len(rows))
+    """
+    if not is_tracing_enabled():
+        yield _NullSpan()
+        return
+    sp = Span(name, _current_span.get(), attrs)
+    token = _current_span.set(sp)
+    started = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.status = "error"
+        sp.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        sp.duration_ms = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        get_collector().record(sp)
+
+
+def start_span(name: str, **attrs: Any) -> Any:
+    """
+    Geçerli span'in altında bir span açar ama onu geçerli span yapmaz; yield'ler boyunca açık kalan
+    akışlar (generator) için. finish_span ile kapatılır.
+    """
+    if not is_tracing_enabled():
+        return _NullSpan()
+    return Span(name, _current_span.get(), attrs)
+
+
+def finish_span(sp: Any, error: Optional[BaseException] = None) -> None:
+    if not isinstance(sp, Span):
+        return
+    sp.duration_ms = (time.time() - sp.start) * 1000
+    if error is not None:
+        sp.status = "error"
+        sp.attrs.setdefault("error", f"{type(error).__name__}: {error}")
+    get_collector().record(sp)
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Fonksiyonu (sync veya async) bir span içinde çalıştıran dekoratör.
+    Gövde içinde current_span().set(...) ile alan eklenebilir.
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Any:
+    return _current_span.get() or _NullSpan()
+
+
+def render_prometheus() -> str:
+    return get_collector().render_prometheus()